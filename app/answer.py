@@ -1,33 +1,280 @@
+import contextlib
 import json
 from datetime import datetime
-from openai import OpenAI
-from .config import client, model
+import pandas as pd
+from openai import AsyncOpenAI
+from . import config
+from .config import client
+from .cache import cache_key, get_cached_response, store_response
+from .repair import recover_answers, validate_answers
+from .answer_store import get_answer_store
+from .survey_state import update_survey_state, mark_survey_changed
+from .survey import format_survey_questions
+from .prompt import create_prompt_without_answers
 
-def get_ai_response(prompt):
+def _lookup_cache(prompt, use_cache, call_info):
     """
-    Get response from OpenAI API.
+    Look up a prompt in the response cache.
+    
+    Returns:
+        tuple: (cache key or None if caching is off, cached (text, tokens) or None)
+    """
+    if not config.llm_cache_enabled:
+        return None, None
+    key = cache_key(config.model, prompt)
+    if not use_cache:
+        return key, None
+    cached = get_cached_response(key)
+    if call_info is not None:
+        counter = "cache_hits" if cached is not None else "cache_misses"
+        call_info[counter] = call_info.get(counter, 0) + 1
+    return key, cached
+
+
+def _record_usage(call_info, usage):
+    """Add the provider's cached prompt tokens from a usage object to call_info."""
+    if call_info is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    call_info["cached_tokens"] = call_info.get("cached_tokens", 0) + cached_tokens
+
+
+def get_ai_response(prompt, use_cache=True, call_info=None):
+    """
+    Get response from OpenAI API, served from the response cache when possible.
     
     Args:
         prompt (str): The prompt to send to the API
+        use_cache (bool): Read from the cache; False forces a fresh call that replaces the cached entry
+        call_info (dict): Optional dict that collects per-call cache hit/miss and cached token counts
         
     Returns:
-        str: The API response text
+        tuple: (API response text, total tokens used)
     """
+    key, cached = _lookup_cache(prompt, use_cache, call_info)
+    if cached is not None:
+        return cached
+
     response = client.chat.completions.create(
-        model=model,
+        model=config.model,
         messages=[{"role": "user", "content": prompt}]
     )
-    return response.choices[0].message.content, response.usage.total_tokens
+    response_text, total_tokens = response.choices[0].message.content, response.usage.total_tokens
+    _record_usage(call_info, response.usage)
+    if key is not None:
+        store_response(key, config.model, response_text, total_tokens)
+    return response_text, total_tokens
+
+def new_async_client():
+    """
+    Create an async OpenAI client for the running event loop.
+    
+    The connection pool of an async client belongs to the loop that opened it, and
+    every asyncio.run starts a new loop, so a client is never shared between runs.
+    Use it as "async with new_async_client() as async_client:" to close it with its loop.
+    
+    Returns:
+        AsyncOpenAI: A new client for the configured API
+    """
+    return AsyncOpenAI(api_key=config.api_key, base_url=config.api_base_url)
+
+async def get_ai_response_async(prompt, use_cache=True, call_info=None, async_client=None):
+    """
+    Get response from OpenAI API without blocking the event loop.
+    
+    Args:
+        prompt (str): The prompt to send to the API
+        use_cache (bool): Read from the cache; False forces a fresh call that replaces the cached entry
+        call_info (dict): Optional dict that collects per-call cache hit/miss and cached token counts
+        async_client (AsyncOpenAI): Client of the running event loop (default: a new client for this call)
+        
+    Returns:
+        tuple: (API response text, total tokens used)
+    """
+    key, cached = _lookup_cache(prompt, use_cache, call_info)
+    if cached is not None:
+        return cached
+
+    async with contextlib.AsyncExitStack() as stack:
+        if async_client is None:
+            async_client = await stack.enter_async_context(new_async_client())
+        response = await async_client.chat.completions.create(
+            model=config.model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+    response_text, total_tokens = response.choices[0].message.content, response.usage.total_tokens
+    _record_usage(call_info, response.usage)
+    if key is not None:
+        store_response(key, config.model, response_text, total_tokens)
+    return response_text, total_tokens
+
+# === Streaming responses ===
+class JsonArrayStreamParser:
+    """
+    Incrementally parse a streamed JSON array of answer objects.
+    
+    Text is fed in as it arrives; every top-level object is returned as soon
+    as its closing brace is seen. A ValueError is raised as soon as the stream
+    clearly is not a JSON array of objects, so the call can be aborted early.
+    """
+
+    def __init__(self, max_preamble=200):
+        self.max_preamble = max_preamble
+        self.started = False
+        self.closed = False
+        self._preamble = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item = []
+
+    def feed(self, text):
+        """
+        Consume the next piece of streamed text.
+        
+        Args:
+            text (str): Newly received text
+            
+        Returns:
+            list: Answer objects completed by this piece of text
+        """
+        items = []
+        for ch in text:
+            if self.closed:
+                break
+            if not self.started:
+                # Tolerate a short preamble such as a ```json code fence
+                if ch == "[":
+                    self.started = True
+                else:
+                    self._preamble += 1
+                    if self._preamble > self.max_preamble:
+                        raise ValueError("Response does not start with a JSON array")
+                continue
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._item = [ch]
+                elif ch == "]":
+                    self.closed = True
+                elif not (ch.isspace() or ch == ","):
+                    raise ValueError(f"Unexpected character {ch!r} between array items")
+                continue
+
+            self._item.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(json.loads("".join(self._item)))
+                    self._item = []
+        return items
+
+
+def get_ai_response_streaming(prompt, on_answer, call_info=None):
+    """
+    Stream a response from OpenAI API and hand over each answer as soon as it is complete.
+    
+    Args:
+        prompt (str): The prompt to send to the API
+        on_answer (callable): Called with each answer object as soon as it closes
+        call_info (dict): Optional dict that collects per-call cache hit/miss and cached token counts
+        
+    Returns:
+        tuple: (response text received, total tokens used or None, True if a complete array was parsed)
+    """
+    parser = JsonArrayStreamParser()
+    key, cached = _lookup_cache(prompt, True, call_info)
+    if cached is not None:
+        response_text, total_tokens = cached
+        try:
+            for item in parser.feed(response_text):
+                on_answer(item)
+        except ValueError as e:
+            print(f"Cached response is not a JSON array: {e}")
+        return response_text, total_tokens, parser.closed
+
+    stream = client.chat.completions.create(
+        model=config.model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+    parts = []
+    total_tokens = None
+    try:
+        for chunk in stream:
+            if chunk.usage is not None:
+                total_tokens = chunk.usage.total_tokens
+                _record_usage(call_info, chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            delta = chunk.choices[0].delta.content
+            parts.append(delta)
+            for item in parser.feed(delta):
+                on_answer(item)
+    except ValueError as e:
+        # Malformed stream: stop paying for the rest of it
+        print(f"Aborting streamed response early: {e}")
+        stream.close()
+        return "".join(parts), total_tokens, False
+
+    response_text = "".join(parts)
+    if key is not None and parser.closed:
+        store_response(key, config.model, response_text, total_tokens)
+    return response_text, total_tokens, parser.closed
 
 # === Answer processing ===
 
-def process_ai_response(response_text, prompt):
+def _parse_response(response_text):
+    """
+    Parse a response, falling back to local repair when it is not clean JSON.
+    
+    Returns:
+        tuple: (parsed objects, question IDs of unparseable objects, True if content was lost,
+            True if local repair was needed)
+    """
+    try:
+        parsed = json.loads(response_text)
+        return (parsed if isinstance(parsed, list) else [parsed]), [], False, False
+    except (json.JSONDecodeError, TypeError):
+        items, failed_ids, lost = recover_answers(response_text)
+        return items, failed_ids, lost, True
+
+
+def process_ai_response(response_text, prompt, call_info=None, survey_data=None, chunk_text=None, prompt_question_ids=None, reask_prompt=None,
+                        excluded_ids=None):
     """
     Process AI's response and convert to proper format.
     
+    Malformed responses are repaired locally first (code fences, surrounding prose,
+    trailing commas, truncation). When survey_data is given, answers are validated
+    against the survey and, if chunk_text is also given, only the questions whose
+    answers were invalid or lost are asked again with a reduced prompt. The whole
+    prompt is only resent when nothing could be salvaged.
+    
     Args:
         response_text (str): Raw response from AI
         prompt (str): Original prompt used to generate response
+        call_info (dict): Optional dict that collects per-call cache and recovery stats
+        survey_data (list): Survey question objects used to validate answers
+        chunk_text (str): Transcript chunk, needed to re-ask for failed questions
+        prompt_question_ids (list): Question IDs the prompt asked about (default: the whole survey)
+        reask_prompt (callable): Builds the re-ask prompt for a list of question IDs with the
+            same builder as the original prompt (default: a plain prompt without previous answers)
+        excluded_ids (list): Question IDs whose answers are dropped, such as human-edited questions
+            the prompt told the model to leave alone
         
     Returns:
         tuple: (new_answers, retry_count) or None if failed
@@ -35,62 +282,190 @@ def process_ai_response(response_text, prompt):
     retry = 0
     max_retries = 3
     current_response = response_text
-    while retry < max_retries:
-        try:
-            new_answers = json.loads(current_response)
-            print(f"New answers: {new_answers}")
-            return new_answers, retry
-        except json.JSONDecodeError as e:
-            if str(e) == "Expecting value: line 1 column 1 (char 0)":
-                print(f"Invalid JSON response, retrying API call... (attempt {retry+1})")
+    while True:
+        items, failed_ids, lost, repaired = _parse_response(current_response)
+        if items or failed_ids or not lost:
+            break
+        retry += 1
+        if retry >= max_retries:
+            print(f"Error processing AI response after {max_retries} attempts")
+            return None
+        print(f"Invalid JSON response, retrying API call... (attempt {retry})")
+        # Skip the cache so a bad cached response is replaced, not replayed
+        current_response, _ = get_ai_response(prompt, use_cache=False, call_info=call_info)
+
+    if survey_data is None:
+        new_answers = items
+    else:
+        new_answers, invalid_ids = validate_answers(items, survey_data)
+        failed_ids = failed_ids + invalid_ids
+
+        if chunk_text is not None and (failed_ids or lost):
+            # Re-ask only for the failed part; if some content was lost without an ID, that is
+            # every question of the original prompt not answered yet
+            answered_ids = {answer["question_id"] for answer in new_answers}
+            asked_ids = set(prompt_question_ids) if prompt_question_ids is not None else None
+            reask_questions = [
+                question for question in survey_data
+                if question["id"] in failed_ids
+                or (lost and question["id"] not in answered_ids and (asked_ids is None or question["id"] in asked_ids))
+            ]
+            reask_answers = _reask_questions(reask_questions, chunk_text, call_info, reask_prompt)
+            if reask_answers is not None:
                 retry += 1
-                if retry < max_retries:
-                    current_response, _ = get_ai_response(prompt)
-                else:
-                    print(f"Error processing AI response after {max_retries} attempts: {e}")
-                    return None
-            else:
-                print(f"Error processing AI response: {e}")
-                return None
+                new_answers = new_answers + reask_answers
+            if call_info is not None:
+                call_info["reasked_questions"] = len(reask_questions)
+
+        if call_info is not None:
+            call_info["invalid_items"] = len(failed_ids)
+
+    if excluded_ids:
+        # Human edits are never overwritten, even when the model answers a question it was told to skip
+        excluded = set(excluded_ids)
+        kept = [answer for answer in new_answers if str(answer.get("question_id", "")).strip() not in excluded]
+        if len(kept) < len(new_answers):
+            print(f"Dropping {len(new_answers) - len(kept)} answer(s) to excluded questions")
+        new_answers = kept
 
+    if call_info is not None:
+        call_info["repaired"] = repaired
+    print(f"New answers: {new_answers}")
+    return new_answers, retry
+
+
+def _reask_questions(questions, chunk_text, call_info=None, reask_prompt=None):
+    """
+    Ask again for a subset of questions with a reduced prompt.
+    
+    Returns:
+        list: Valid answers for those questions, or None if there was nothing to ask
+    """
+    if not questions:
+        return None
+    if reask_prompt is not None:
+        # Same builder as the original prompt: layout, previous answers and human-edit exclusions
+        prompt = reask_prompt([question["id"] for question in questions])
+    else:
+        survey_questions = format_survey_questions(questions)
+        prompt = create_prompt_without_answers(survey_questions, chunk_text) if survey_questions else None
+    if prompt is None:
+        return None
+    print(f"Re-asking {len(questions)} question(s) with invalid or missing answers...")
+    response_text, _ = get_ai_response(prompt, call_info=call_info)
+    items, _, _, _ = _parse_response(response_text)
+    valid, _ = validate_answers(items, questions)
+    return valid
 
 
-def update_answers_file(new_answers, source):
+def update_answers_file(new_answers, source, session_id=None):
     """
-    Create or update the answers.json file with new answers.
+    Add new answers to the session's answer store.
     
     Args:
         new_answers (list): List of new answers from AI
+        source (str): "ai" or "human"
+        session_id (str): Session or run ID (default: the shared default session)
+        
+    Returns:
+        list: Question IDs (as strings, like the survey's IDs) whose stored answer changed
     """
     try:
-        # Load existing answers or create new dict
-        try:
-            with open("data/answers.json", "r") as f:
-                answers = json.load(f)
-        except FileNotFoundError:
-            answers = {}
-        
-        # Update with new answers
+        store = get_answer_store(session_id)
+        stored = store.get_all()
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        records = {}
         for item in new_answers:
-            qid = item["question_id"]
+            # Human edits pass the DataFrame index (e.g. 5), AI answers the survey's string ID ("5")
+            qid = str(item["question_id"]).strip()
             if source == "ai":
                 certainty = item["certainty"]
             else:
                 certainty = "high"
-            answers[qid] = {
+            record = {
                 "answer": item["answer"],
                 "certainty": certainty,
                 "text field": item.get("text field", ""),
                 "source": source,
-                "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "last_updated": timestamp
             }
+            # Skip answers identical to the stored ones
+            previous = stored.get(qid)
+            if previous is not None and all(previous[key] == record[key] for key in ("answer", "certainty", "text field", "source")):
+                continue
+            records[qid] = record
         
-        # Save updated answers
-        with open("data/answers.json", "w") as f:
-            json.dump(answers, f, indent=2)
+        # Only the changed records are written, never the whole answer set
+        store.apply(records)
+        return list(records)
             
     except Exception as e:
         print(f"Error updating answers file: {e}")
+        return []
+
+def load_answers(session_id=None):
+    """
+    Get the current answers of a session from the answer store.
+    
+    Args:
+        session_id (str): Session or run ID (default: the shared default session)
+        
+    Returns:
+        dict: Answers keyed by question ID
+    """
+    return get_answer_store(session_id).get_all()
+
+def reset_answers(session_id=None):
+    """Delete all stored answers of a session."""
+    get_answer_store(session_id).reset()
+
+ANSWER_COLUMNS = ['answer', 'certainty', 'text_field', 'source']
+
+def apply_answers_batch(df, new_answers, source):
+    """
+    Apply a list of answers to the tracking DataFrame in one operation.
+    
+    The answers are aligned to the DataFrame index at once; only questions whose
+    answer, certainty, notes or source actually changed are written, all with the
+    same timestamp.
+    
+    Args:
+        df (pd.DataFrame): Existing DataFrame with survey questions and answer columns
+        new_answers (list): List of new answers
+        source (str): "ai" or "human"
+        
+    Returns:
+        tuple: (updated DataFrame, list of question IDs whose answer changed)
+    """
+    if not new_answers:
+        return df, []
+    
+    batch = pd.DataFrame({
+        'answer': [answer["answer"] for answer in new_answers],
+        'certainty': [answer["certainty"] if source == "ai" else "high" for answer in new_answers],
+        'text_field': [answer.get("text field", "") for answer in new_answers],
+        'source': source
+    }, index=pd.to_numeric(pd.Index([str(answer["question_id"]) for answer in new_answers]), errors="coerce"))
+    
+    # Later answers to the same question win; unknown question IDs are ignored
+    batch = batch[~batch.index.duplicated(keep="last") & batch.index.isin(df.index)]
+    current = df.loc[batch.index, ANSWER_COLUMNS]
+    changed_ids = [
+        qid for qid, old, new in zip(batch.index, current.itertuples(index=False), batch.itertuples(index=False))
+        if tuple(old) != tuple(new)
+    ]
+    if not changed_ids:
+        return df, []
+    
+    changed = batch.loc[changed_ids]
+    for column in ANSWER_COLUMNS:
+        df.loc[changed_ids, column] = changed[column]
+    df.loc[changed_ids, 'last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for qid, certainty in zip(changed_ids, changed['certainty']):
+        update_survey_state(df, qid, certainty)
+    mark_survey_changed(df)
+    
+    return df, changed_ids
 
 def update_answers_dataframe(df, new_answers, source):
     """
@@ -99,22 +474,10 @@ def update_answers_dataframe(df, new_answers, source):
     Args:
         df (pd.DataFrame): Existing DataFrame with survey questions and answer columns
         new_answers (list): List of new answers
+        source (str): "ai" or "human"
         
     Returns:
         pd.DataFrame: Updated DataFrame
     """
-    # Update the DataFrame with new answers
-    for answer in new_answers:
-        qid = float(answer["question_id"]) 
-        if source == "ai":
-            certainty = answer["certainty"]
-        else:
-            certainty = "high"
-        if qid in df.index:
-            df.at[qid, 'answer'] = answer["answer"]
-            df.at[qid, 'certainty'] = certainty
-            df.at[qid, 'text_field'] = answer.get("text field", "")
-            df.at[qid, 'source'] = source
-            df.at[qid, 'last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    return df
\ No newline at end of file
+    df, _ = apply_answers_batch(df, new_answers, source)
+    return df
@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+import threading
+
+# === Answer store ===
+def _normalize_records(records):
+    """Key answer records by string question ID, the form both backends store them under."""
+    return {str(qid).strip(): record for qid, record in records.items()}
+
+
+class AnswerStore:
+    """
+    Answers backed by an append-only journal with an in-memory materialized state.
+    
+    Every update appends one line to the journal instead of rewriting the whole
+    answers file. The journal is periodically compacted into an atomically written
+    snapshot in the original data/answers.json format.
+    """
+
+    def __init__(self, snapshot_path="data/answers.json", journal_path=None, compact_every=200):
+        """
+        Args:
+            snapshot_path (str): Path of the JSON snapshot
+            journal_path (str): Path of the journal (default: next to the snapshot)
+            compact_every (int): Number of journal entries after which the journal is compacted
+        """
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal.jsonl"
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._answers = {}
+        self._journal_entries = 0
+        self._load()
+
+    def _load(self):
+        """Rebuild the in-memory state from the snapshot and the journal."""
+        torn = False
+        try:
+            with open(self.snapshot_path, "r") as f:
+                self._answers = _normalize_records(json.load(f))
+        except FileNotFoundError:
+            self._answers = {}
+
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn last line from a crash mid-write: everything before it is intact.
+                        # Compact right away so new entries are not appended after the torn line.
+                        torn = True
+                        break
+                    self._answers.update(_normalize_records(entry["answers"]))
+                    self._journal_entries += 1
+        except FileNotFoundError:
+            pass
+        if torn:
+            self._compact()
+
+    def get_all(self):
+        """
+        Get the current answers without touching the disk.
+        
+        Returns:
+            dict: Shallow copy of the answers keyed by question ID
+        """
+        with self._lock:
+            return dict(self._answers)
+
+    def apply(self, records):
+        """
+        Store new or updated answers.
+        
+        Args:
+            records (dict): Answer records keyed by question ID (stored under its string form)
+        """
+        if not records:
+            return
+        records = _normalize_records(records)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps({"answers": records}) + "\n")
+                f.flush()
+            self._answers.update(records)
+            self._journal_entries += 1
+            if self._journal_entries >= self.compact_every:
+                self._compact()
+
+    def compact(self):
+        """Write the current state to the snapshot and start a new, empty journal."""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a half-written snapshot
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._answers, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_entries = 0
+
+    def reset(self):
+        """Delete all answers, on disk and in memory."""
+        with self._lock:
+            for path in (self.snapshot_path, self.journal_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._answers = {}
+            self._journal_entries = 0
+
+
+class SqliteAnswerStore:
+    """
+    Answers of one session stored in a shared SQLite database in WAL mode.
+    
+    Many sessions (Streamlit users, evaluation runs) can share the database file;
+    each store only reads and writes the rows of its own session. The session's
+    answers are also kept in memory so readers never query the database.
+    """
+
+    def __init__(self, db_path, session_id):
+        """
+        Args:
+            db_path (str): Path of the SQLite database
+            session_id (str): Session or run ID the answers belong to
+        """
+        self.db_path = db_path
+        self.session_id = session_id
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS answers (
+                    session_id TEXT NOT NULL,
+                    question_id TEXT NOT NULL,
+                    answer TEXT,
+                    certainty TEXT,
+                    text_field TEXT,
+                    source TEXT,
+                    last_updated TEXT,
+                    PRIMARY KEY (session_id, question_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_session_updated ON answers(session_id, last_updated)")
+            rows = conn.execute(
+                "SELECT question_id, answer, certainty, text_field, source, last_updated FROM answers WHERE session_id = ?",
+                (session_id,)
+            ).fetchall()
+        self._answers = {
+            qid: {
+                "answer": json.loads(answer),
+                "certainty": certainty,
+                "text field": text_field,
+                "source": source,
+                "last_updated": last_updated
+            }
+            for qid, answer, certainty, text_field, source, last_updated in rows
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get_all(self):
+        """
+        Get the current answers of this session without touching the disk.
+        
+        Returns:
+            dict: Shallow copy of the answers keyed by question ID
+        """
+        with self._lock:
+            return dict(self._answers)
+
+    def apply(self, records):
+        """
+        Store new or updated answers.
+        
+        Args:
+            records (dict): Answer records keyed by question ID (stored under its string form)
+        """
+        if not records:
+            return
+        records = _normalize_records(records)
+        rows = [
+            (self.session_id, qid, json.dumps(record["answer"]), record["certainty"],
+             record["text field"], record["source"], record["last_updated"])
+            for qid, record in records.items()
+        ]
+        with self._lock:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._answers.update(records)
+
+    def compact(self):
+        """Fold the write-ahead log back into the database file."""
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def reset(self):
+        """Delete all answers of this session."""
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM answers WHERE session_id = ?", (self.session_id,))
+            self._answers = {}
+
+
+DEFAULT_SESSION = "default"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_answer_store(session_id=None):
+    """
+    Get the answer store of a session, loading it on first use.
+    
+    Args:
+        session_id (str): Session or run ID (default: the shared default session)
+        
+    Returns:
+        SqliteAnswerStore or AnswerStore: The session's answer store, depending on config.answer_store_backend
+    """
+    from .config import answer_store_backend, answer_db_path, answer_journal_compact_every
+    session_id = session_id or DEFAULT_SESSION
+    with _stores_lock:
+        store = _stores.get(session_id)
+        if store is None:
+            if answer_store_backend == "journal":
+                # The default session keeps the original data/answers.json location
+                if session_id == DEFAULT_SESSION:
+                    snapshot_path = "data/answers.json"
+                else:
+                    snapshot_path = f"data/sessions/{session_id}/answers.json"
+                store = AnswerStore(snapshot_path, compact_every=answer_journal_compact_every)
+            else:
+                store = SqliteAnswerStore(answer_db_path, session_id)
+            _stores[session_id] = store
+        return store
@@ -1,40 +1,475 @@
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
 import os
+import shutil
+import subprocess
+import tempfile
+import time
 from .config import client
+from .prompt import estimate_tokens
 import re
 
+TRANSCRIPT_DIR = "data/recordings/transcripts"
+TRANSCRIPT_INDEX = f"{TRANSCRIPT_DIR}/index.json"
+HASH_BLOCK_SIZE = 1024 * 1024
+SENTENCE_PATTERN = r'([.!?]+)'
+SILENCE_PATTERN = re.compile(r"silence_(start|end): (-?[0-9.]+)")
+WORD_PATTERN = re.compile(r"\w+")
+# A sentence opens a new speaker turn if it starts on a new line, with a dialogue dash or with a "Name:" label
+SPEAKER_TURN_PATTERN = re.compile(r"^[ \t]*(?:\n|[-\u2013\u2014]\s|[A-Z][\w'-]*(?: [A-Z0-9][\w'-]*){0,2}:\s)")
+
+# === Recording deduplication ===
+def save_audio_stream(source, file_path):
+    """
+    Stream an uploaded recording to disk, hashing it on the way.
+    
+    Args:
+        source: File-like object opened in binary mode
+        file_path (str): Destination path
+    
+    Returns:
+        str: SHA-256 hex digest of the recording content
+    """
+    digest = hashlib.sha256()
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "wb") as f:
+        while True:
+            block = source.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            f.write(block)
+    return digest.hexdigest()
+
+
+def hash_audio_file(file_path):
+    """
+    Compute the SHA-256 content hash of a recording already on disk.
+    
+    Args:
+        file_path (str): Path to the audio file
+    
+    Returns:
+        str: SHA-256 hex digest of the recording content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_transcript_index():
+    """Load the content hash -> transcript file index."""
+    try:
+        with open(TRANSCRIPT_INDEX, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _register_transcript(content_hash, file_name):
+    """Record which transcript file belongs to a recording's content hash."""
+    index = _load_transcript_index()
+    index[content_hash] = f"{file_name}.txt"
+    # Write to a temporary file first so a crash never leaves a half-written index
+    tmp_path = TRANSCRIPT_INDEX + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, TRANSCRIPT_INDEX)
+
+
+def lookup_transcript(content_hash):
+    """
+    Find the transcript of a previously transcribed recording.
+    
+    Args:
+        content_hash (str): SHA-256 hex digest of the recording content
+    
+    Returns:
+        str: Transcribed text, or None if this recording has not been seen before
+    """
+    txt_name = _load_transcript_index().get(content_hash)
+    if not txt_name:
+        return None
+    try:
+        with open(f"{TRANSCRIPT_DIR}/{txt_name}", "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+# === Silence-based segmentation ===
+def ffmpeg_available():
+    """Check whether ffmpeg and ffprobe are on PATH."""
+    return shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+
+def probe_duration(file_path):
+    """
+    Get the duration of a recording with ffprobe.
+    
+    Args:
+        file_path (str): Path to the audio file
+    
+    Returns:
+        float: Duration in seconds
+    """
+    output = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", file_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip())
+
+
+def detect_silences(file_path, noise_db=-35, min_silence=0.5):
+    """
+    Find silent stretches in a recording with ffmpeg's silencedetect filter.
+    
+    Args:
+        file_path (str): Path to the audio file
+        noise_db (float): Volume in dB below which audio counts as silence
+        min_silence (float): Minimum length of a silence in seconds
+    
+    Returns:
+        list: (start, end) tuples in seconds
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", file_path,
+         "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"],
+        capture_output=True, text=True, check=True
+    )
+    silences = []
+    start = None
+    for kind, value in SILENCE_PATTERN.findall(result.stderr):
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def plan_segments(duration, silences, max_seconds, overlap_seconds=0.0):
+    """
+    Choose cut points so that no segment is longer than max_seconds.
+    
+    Each cut is placed in the middle of the last silence before the limit. When
+    there is no such silence the segment is cut hard at the limit, and both sides
+    get overlap_seconds of extra audio so no word is lost at the cut.
+    
+    Args:
+        duration (float): Length of the recording in seconds
+        silences (list): (start, end) tuples from detect_silences
+        max_seconds (float): Maximum segment length in seconds
+        overlap_seconds (float): Extra audio around hard cuts
+    
+    Returns:
+        list: (start, end) tuples in seconds, covering the whole recording in order
+    """
+    midpoints = sorted((start + end) / 2 for start, end in silences)
+    segments = []
+    start = 0.0
+    lead = 0.0  # Extra audio before start when the previous cut was a hard cut
+    while duration - start > max_seconds:
+        limit = start + max_seconds
+        # Ignore silences in the first quarter so segments do not get very short
+        cuts = [point for point in midpoints if start + max_seconds / 4 < point <= limit]
+        if cuts:
+            segments.append((start - lead, cuts[-1]))
+            start, lead = cuts[-1], 0.0
+        else:
+            segments.append((start - lead, min(duration, limit + overlap_seconds)))
+            start, lead = limit, overlap_seconds
+    segments.append((start - lead, duration))
+    return segments
+
+
+def cut_segment(file_path, start, end, output_path):
+    """Copy the audio between start and end (seconds) into a separate file without re-encoding."""
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-to", f"{end:.3f}",
+         "-i", file_path, "-vn", "-c:a", "copy", output_path],
+        check=True
+    )
+
+
+def _words(text):
+    """Lowercase words of a text, ignoring punctuation."""
+    return WORD_PATTERN.findall(text.lower())
+
+
+def remove_boundary_overlap(previous_text, next_text, max_words=30):
+    """
+    Drop the start of a segment transcript that repeats the end of the previous one.
+    
+    Args:
+        previous_text (str): Transcript of the previous segment
+        next_text (str): Transcript of the next segment
+        max_words (int): Longest repeated word sequence to look for
+    
+    Returns:
+        str: next_text without the repeated words
+    """
+    previous_words = _words(previous_text)[-max_words:]
+    next_matches = list(WORD_PATTERN.finditer(next_text))[:max_words]
+    next_words = [match.group().lower() for match in next_matches]
+    for size in range(min(len(previous_words), len(next_words)), 1, -1):
+        if previous_words[-size:] == next_words[:size]:
+            rest = next_text[next_matches[size - 1].end():]
+            # Also drop the punctuation that followed the repeated words
+            return rest.lstrip(" ,.;:!?")
+    return next_text
+
+
+def iter_segment_transcripts(file_path, timings=None):
+    """
+    Transcribe a recording segment by segment and yield the pieces in order.
+    
+    The recording is cut at silences into segments of at most segment_max_seconds,
+    which are transcribed concurrently. Each piece is yielded as soon as it and all
+    earlier pieces are done. Words repeated across a hard cut, where the segments
+    share overlap audio, are removed; at a silence cut a repeated word was really spoken twice.
+    
+    Args:
+        file_path (str): Path to the audio file
+        timings (list): Optional list that receives one timing dict per segment
+    
+    Yields:
+        str: Transcript of the next segment
+    """
+    # Import here to get the current dynamic values
+    from .config import (segment_max_seconds, segment_silence_db, segment_min_silence_seconds,
+                         segment_overlap_seconds, max_concurrent_transcriptions)
+
+    duration = probe_duration(file_path)
+    silences = detect_silences(file_path, segment_silence_db, segment_min_silence_seconds)
+    segments = plan_segments(duration, silences, segment_max_seconds, segment_overlap_seconds)
+    print(f"🔪 Cut {duration:.0f}s recording into {len(segments)} segments")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def transcribe(index):
+            start, end = segments[index]
+            segment_path = os.path.join(tmp_dir, f"segment_{index:04d}.m4a")
+            cut_segment(file_path, start, end, segment_path)
+            request_start = time.time()
+            with open(segment_path, "rb") as audio_file:
+                transcription = client.audio.transcriptions.create(
+                    model="gpt-4o-transcribe",
+                    file=audio_file
+                )
+            timing = {
+                "segment": index + 1,
+                "start": round(start, 2),
+                "end": round(end, 2),
+                "bytes": os.path.getsize(segment_path),
+                "transcription_seconds": round(time.time() - request_start, 2)
+            }
+            return transcription.text, timing
+
+        executor = ThreadPoolExecutor(max_workers=max(1, max_concurrent_transcriptions))
+        try:
+            futures = [executor.submit(transcribe, index) for index in range(len(segments))]
+            previous_text = ""
+            for index, future in enumerate(futures):
+                text, timing = future.result()
+                if previous_text and segments[index][0] < segments[index - 1][1]:
+                    text = remove_boundary_overlap(previous_text, text)
+                previous_text = text
+                if timings is not None:
+                    timings.append(timing)
+                print(f"   🎙️ Segment {timing['segment']}/{len(segments)} transcribed in {timing['transcription_seconds']:.1f}s")
+                yield text
+        finally:
+            # Drop segments not started yet if the consumer stops early (e.g. a cancelled job)
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _should_segment(file_path):
+    """Decide whether a recording is long enough to be transcribed in segments."""
+    # Import here to get the current dynamic values
+    from .config import segment_max_seconds
+    if not ffmpeg_available():
+        return False
+    try:
+        return probe_duration(file_path) > segment_max_seconds
+    except (subprocess.CalledProcessError, ValueError) as e:
+        print(f"Could not read recording duration, transcribing in one request: {e}")
+        return False
+
+
+def _save_transcript(file_name, content_hash, text, timings=None):
+    """Save a transcript (and per-segment timings) and register it under the recording's hash."""
+    os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
+    txt_path = f"{TRANSCRIPT_DIR}/{file_name}.txt"
+    with open(txt_path, 'w', encoding='utf-8') as txt_file:
+        txt_file.write(text)
+    if timings:
+        with open(f"{TRANSCRIPT_DIR}/{file_name}.segments.json", 'w', encoding='utf-8') as f:
+            json.dump(timings, f, indent=2)
+    _register_transcript(content_hash, file_name)
+
+
 # === Recording Processing ===
-def process_audio_file(file_name, file_extension):
+def stream_audio_transcript(file_name, file_extension, content_hash=None):
+    """
+    Transcribe an audio file and yield the transcript piece by piece as it becomes available.
+    
+    The pieces concatenate to the full transcript, which is saved to a text file once
+    complete. Recordings whose content was transcribed before are served from the
+    transcript index; long recordings are yielded segment by segment.
+    
+    Args:
+        file_name (str): Name of the audio file (without extension)
+        file_extension (str): File extension (m4a, mp4, etc.)
+        content_hash (str): SHA-256 of the recording, computed from the file if not given
+    
+    Yields:
+        str: Next piece of the transcript
+    """
+    file_path = f"data/recordings/{file_name}.{file_extension}"
+    if content_hash is None:
+        content_hash = hash_audio_file(file_path)
+
+    cached_transcript = lookup_transcript(content_hash)
+    if cached_transcript is not None:
+        print(f"Reusing transcript for {file_name}.{file_extension} (content already transcribed)")
+        yield cached_transcript
+        return
+
+    if _should_segment(file_path):
+        # Long recording: transcribe silence-bounded segments in parallel
+        timings = []
+        pieces = []
+        for text in iter_segment_transcripts(file_path, timings):
+            text = text.strip()
+            if not text:
+                continue
+            piece = (" " if pieces else "") + text
+            pieces.append(piece)
+            yield piece
+        _save_transcript(file_name, content_hash, "".join(pieces), timings)
+        return
+
+    with open(file_path, "rb") as audio_file:
+        transcription = client.audio.transcriptions.create(
+            model="gpt-4o-transcribe",
+            file=audio_file
+        )
+    # Save transcription to text file
+    _save_transcript(file_name, content_hash, transcription.text)
+    yield transcription.text
+
+
+def process_audio_file(file_name, file_extension, content_hash=None):
     """
     Process a single audio file and return its transcription.
     Also saves the transcription to a text file.
+    Recordings whose content was transcribed before are served from the transcript index.
+    Recordings longer than config.segment_max_seconds are transcribed in segments when ffmpeg is available.
     
     Args:
         file_name (str): Name of the audio file (without extension)
         file_extension (str): File extension (m4a, mp4, etc.)
-        
+        content_hash (str): SHA-256 of the recording, computed from the file if not given
+    
     Returns:
         str: Transcribed text
     """
     try:
-        file_path = f"data/recordings/{file_name}.{file_extension}"
-        
-        with open(file_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                model="gpt-4o-transcribe",
-                file=audio_file
-            )
-            # Save transcription to text file
-            txt_path = "data/recordings/transcripts/"+file_name+'.txt'
-            with open(txt_path, 'w', encoding='utf-8') as txt_file:
-                txt_file.write(transcription.text)
-
-            return transcription.text
+        return "".join(stream_audio_transcript(file_name, file_extension, content_hash))
     except Exception as e:
         print(f"Error processing audio file {file_name}.{file_extension}: {e}")
         return None
 
 
+def _split_sentences(text, final):
+    """
+    Split text into sentences that end with their punctuation.
+    
+    Args:
+        text (str): Text to split
+        final (bool): True if no more text follows; otherwise the unfinished end is left over
+    
+    Returns:
+        tuple: (list of sentences, leftover text that may continue in the next piece)
+    """
+    # Find sentence endings but keep the original text structure
+    parts = re.split(SENTENCE_PATTERN, text)
+    pairs = (len(parts) - 1) // 2
+    if not final and parts[-1] == "" and pairs > 0:
+        # The punctuation at the very end may continue in the next piece
+        pairs -= 1
+    
+    # Reconstruct sentences with their punctuation and original spacing
+    sentences = []
+    for i in range(pairs):
+        sentence = parts[2 * i] + parts[2 * i + 1]  # text + punctuation
+        if sentence.strip():  # Only add non-empty sentences
+            sentences.append(sentence)
+    
+    leftover = "".join(parts[2 * pairs:])
+    if final:
+        # Add any remaining text
+        if leftover.strip():
+            sentences.append(leftover)
+        leftover = ""
+    return sentences, leftover
+
+
+def _chunk_size_source(size, overlap, sizer):
+    """Return a function giving (size, overlap) of the next chunk, from the sizer if there is one."""
+    if sizer is None:
+        return lambda position: (size, overlap)
+    return sizer.next_chunk
+
+
+def iter_chunks_by_sentences(pieces, sentences_per_chunk=10, overlap_sentences=2, sizer=None):
+    """
+    Chunk a transcript that arrives in pieces, yielding each chunk as soon as it is complete.
+    
+    Produces exactly the chunks chunk_transcription_by_sentences produces for the
+    concatenated pieces.
+    
+    Args:
+        pieces (iterable): Transcript pieces in order, e.g. from stream_audio_transcript
+        sentences_per_chunk (int): Number of sentences per chunk
+        overlap_sentences (int): Number of sentences to overlap between chunks
+        sizer (ChunkSizer): Optional adaptive sizer that decides the size of each chunk
+    
+    Yields:
+        str: Next text chunk
+    """
+    next_size = _chunk_size_source(sentences_per_chunk, overlap_sentences, sizer)
+    sentences_per_chunk, overlap_sentences = next_size(0)
+    sentences = []
+    leftover = ""
+    start = 0
+    for piece in pieces:
+        new_sentences, leftover = _split_sentences(leftover + piece, final=False)
+        sentences.extend(new_sentences)
+        # A chunk is only known not to be the last one once a sentence follows it
+        while start + sentences_per_chunk < len(sentences):
+            yield ''.join(sentences[start:start + sentences_per_chunk])
+            end = start + sentences_per_chunk
+            sentences_per_chunk, overlap_sentences = next_size(end)
+            start += max(1, end - start - overlap_sentences)
+    
+    new_sentences, _ = _split_sentences(leftover, final=True)
+    sentences.extend(new_sentences)
+    while start < len(sentences):
+        # Join without adding extra punctuation to preserve original formatting
+        yield ''.join(sentences[start:start + sentences_per_chunk])
+        
+        # Stop if we've reached the end
+        end = start + sentences_per_chunk
+        if end >= len(sentences):
+            break
+        sentences_per_chunk, overlap_sentences = next_size(end)
+        start += max(1, end - start - overlap_sentences)
+
+
 def chunk_transcription_by_sentences(transcript, sentences_per_chunk=10, overlap_sentences=2):
     """
     Split a transcript into chunks with a specified number of sentences each.
@@ -44,39 +479,158 @@ def chunk_transcription_by_sentences(transcript, sentences_per_chunk=10, overlap
         transcript (str): The transcribed text to chunk
         sentences_per_chunk (int): Number of sentences per chunk 
         overlap_sentences (int): Number of sentences to overlap between chunks (default: 0)
-        
+    
     Returns:
         list: List of text chunks
     """
-    # Find sentence endings but keep the original text structure
-    sentence_pattern = r'([.!?]+)'
-    parts = re.split(sentence_pattern, transcript)
+    return list(iter_chunks_by_sentences([transcript], sentences_per_chunk, overlap_sentences))
+
+
+def _split_long_sentence(sentence, token_budget):
+    """
+    Split a sentence that exceeds the token budget at word boundaries.
     
-    # Reconstruct sentences with their punctuation and original spacing
-    sentences = []
-    for i in range(0, len(parts)-1, 2):
-        if i+1 < len(parts):
-            sentence = parts[i] + parts[i+1]  # text + punctuation
-            if sentence.strip():  # Only add non-empty sentences
-                sentences.append(sentence)
-    
-    # Add any remaining text
-    if len(parts) % 2 == 1 and parts[-1].strip():
-        sentences.append(parts[-1])
-    
-    # Group sentences into chunks with overlap
-    chunks = []
-    step_size = max(1, sentences_per_chunk - overlap_sentences)
-    
-    for i in range(0, len(sentences), step_size):
-        chunk_sentences = sentences[i:i + sentences_per_chunk]
-        if chunk_sentences:
-            # Join without adding extra punctuation to preserve original formatting
-            chunk_text = ''.join(chunk_sentences)
-            chunks.append(chunk_text)
-        
-        # Stop if we've reached the end
-        if i + sentences_per_chunk >= len(sentences):
-            break
+    Args:
+        sentence (str): Sentence to split
+        token_budget (int): Maximum estimated tokens per part
+    
+    Returns:
+        list: Parts that concatenate to the original sentence
+    """
+    parts = []
+    current = ""
+    for word in re.findall(r"\s*\S+\s*|\s+", sentence):
+        if current and estimate_tokens(current + word) > token_budget:
+            parts.append(current)
+            current = ""
+        current += word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _iter_token_sentences(pieces, token_budget):
+    """
+    Yield the sentences of a transcript arriving in pieces, none longer than the token budget.
+    
+    Text without sentence punctuation is cut at a word boundary once it exceeds the budget,
+    so transcripts with little punctuation still stream instead of piling up until the end.
+    
+    Args:
+        pieces (iterable): Transcript pieces in order
+        token_budget (int): Maximum estimated tokens per sentence
+    
+    Yields:
+        str: Next sentence or sentence part
+    """
+    leftover = ""
+    for piece in pieces:
+        sentences, leftover = _split_sentences(leftover + piece, final=False)
+        if estimate_tokens(leftover) > token_budget:
+            # Keep the last (possibly unfinished) word for the next piece
+            cut = leftover.rstrip().rfind(" ") + 1
+            if cut > 0:
+                sentences.append(leftover[:cut])
+                leftover = leftover[cut:]
+        for sentence in sentences:
+            yield from _split_long_sentence(sentence, token_budget)
+    sentences, _ = _split_sentences(leftover, final=True)
+    for sentence in sentences:
+        yield from _split_long_sentence(sentence, token_budget)
+
+
+def iter_chunks_by_tokens(pieces, token_budget=400, overlap_tokens=60, prefer_speaker_turns=True, speaker_turn_fill=0.75, sizer=None):
+    """
+    Chunk a transcript that arrives in pieces by packing whole sentences up to a token budget.
+    
+    Uses the local estimate_tokens estimate, so chunks have a predictable size in tokens
+    however long the sentences are. The last sentences of a chunk, up to overlap_tokens,
+    are repeated at the start of the next one.
+    
+    Args:
+        pieces (iterable): Transcript pieces in order, e.g. from stream_audio_transcript
+        token_budget (int): Maximum estimated tokens per chunk
+        overlap_tokens (int): Maximum estimated tokens repeated from the previous chunk
+        prefer_speaker_turns (bool): Close a chunk early at a speaker turn once it is speaker_turn_fill full
+        speaker_turn_fill (float): Fraction of the budget a chunk must reach before breaking at a turn
+    
+    Yields:
+        str: Next text chunk
+    """
+    next_size = _chunk_size_source(token_budget, overlap_tokens, sizer)
+    token_budget, overlap_tokens = next_size(0)
+    token_budget = max(1, token_budget)
+    current = []  # (sentence, tokens) pairs of the open chunk
+    current_tokens = 0
+    new_sentences = 0  # sentences in the open chunk that are not overlap
+    position = 0  # tokens of the transcript chunked so far, without overlap
+    for sentence in _iter_token_sentences(pieces, token_budget):
+        tokens = estimate_tokens(sentence)
+        full = current_tokens + tokens > token_budget
+        turn = (prefer_speaker_turns
+                and current_tokens >= token_budget * speaker_turn_fill
+                and SPEAKER_TURN_PATTERN.match(sentence) is not None)
+        if new_sentences and (full or turn):
+            yield ''.join(text for text, _ in current)
+            token_budget, overlap_tokens = next_size(position)
+            token_budget = max(1, token_budget)
+            
+            # Carry the trailing sentences over, leaving room for the next sentence
+            carried = []
+            carried_tokens = 0
+            for text, text_tokens in reversed(current):
+                if carried_tokens + text_tokens > min(overlap_tokens, token_budget - tokens):
+                    break
+                carried.insert(0, (text, text_tokens))
+                carried_tokens += text_tokens
+            current, current_tokens, new_sentences = carried, carried_tokens, 0
+        current.append((sentence, tokens))
+        current_tokens += tokens
+        new_sentences += 1
+        position += tokens
+    
+    if new_sentences:
+        yield ''.join(text for text, _ in current)
+
+
+def transcript_units(transcript):
+    """
+    Measure a transcript in the units of the configured chunking mode.
+    
+    Args:
+        transcript (str): Full transcript text
     
-    return chunks
+    Returns:
+        int: Number of sentences, or estimated tokens in "tokens" mode
+    """
+    # Import here to get the current dynamic values
+    from .config import chunking_mode
+    if chunking_mode == "tokens":
+        return estimate_tokens(transcript)
+    return len(_split_sentences(transcript, final=True)[0])
+
+
+def iter_transcript_chunks(pieces, session_id=None, total_units=None):
+    """
+    Chunk a transcript arriving in pieces with the chunking mode set in config.
+    
+    With adaptive_chunking on, each chunk is sized from the measured latency of the
+    chunks processed before it, so the chunks must be consumed one at a time.
+    
+    Args:
+        pieces (iterable): Transcript pieces in order, e.g. from stream_audio_transcript
+        session_id (str): Session or run ID the chunks are processed under
+        total_units (int): Transcript length from transcript_units, if known
+    
+    Yields:
+        str: Next text chunk
+    """
+    # Import here to get the current dynamic values
+    from .config import chunking_mode, n_sentences, n_overlap, chunk_token_budget, chunk_overlap_tokens, chunk_prefer_speaker_turns, chunk_speaker_turn_fill
+    from .chunk_sizing import start_chunk_sizing
+    if chunking_mode == "tokens":
+        sizer = start_chunk_sizing(session_id, "tokens", chunk_token_budget, chunk_overlap_tokens, total_units)
+        return iter_chunks_by_tokens(pieces, chunk_token_budget, chunk_overlap_tokens,
+                                     chunk_prefer_speaker_turns, chunk_speaker_turn_fill, sizer)
+    sizer = start_chunk_sizing(session_id, "sentences", n_sentences, n_overlap, total_units)
+    return iter_chunks_by_sentences(pieces, n_sentences, n_overlap, sizer)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from . import config
+
+# Process-wide hit/miss counters, shared by the sync and async clients
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+# One open connection per thread and cache path; "with conn" only commits, it never closes
+_local = threading.local()
+
+# === Response cache ===
+def cache_key(model, prompt):
+    """
+    Build the cache key for a request.
+    
+    Requests are sent with the API's default sampling and response format, so the
+    model and prompt identify them completely. Streamed and regular calls share a
+    key because both store the same final response text.
+    
+    Args:
+        model (str): Model name
+        prompt (str): Full prompt text
+        
+    Returns:
+        str: SHA-256 hex digest identifying the request
+    """
+    payload = json.dumps({"model": model, "prompt": prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect():
+    """Get this thread's connection to the cache database, creating the database on first use."""
+    path = config.llm_cache_path
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                total_tokens INTEGER,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        connections[path] = conn
+    return conn
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_cached_response(key):
+    """
+    Look up a cached response.
+    
+    Args:
+        key (str): Cache key from cache_key()
+        
+    Returns:
+        tuple: (response text, total tokens) or None on a miss
+    """
+    try:
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT response, total_tokens, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and time.time() - row[2] > config.llm_cache_max_age_days * 86400:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+    except sqlite3.Error as e:
+        print(f"Error reading LLM cache: {e}")
+        row = None
+
+    _count("hits" if row is not None else "misses")
+    return (row[0], row[1]) if row is not None else None
+
+
+def store_response(key, model, response_text, total_tokens):
+    """
+    Save a response to the cache and evict old entries.
+    
+    Args:
+        key (str): Cache key from cache_key()
+        model (str): Model name
+        response_text (str): Response text returned by the API
+        total_tokens (int): Tokens used by the original call
+    """
+    if not response_text:
+        return
+    now = time.time()
+    size = len(response_text.encode("utf-8"))
+    try:
+        with _connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, response_text, total_tokens, size, now, now)
+            )
+            _evict(conn)
+    except sqlite3.Error as e:
+        print(f"Error writing LLM cache: {e}")
+
+
+def _evict(conn):
+    """Drop expired entries, then least recently used ones until under the size limit."""
+    conn.execute(
+        "DELETE FROM responses WHERE created_at < ?",
+        (time.time() - config.llm_cache_max_age_days * 86400,)
+    )
+    max_bytes = config.llm_cache_max_size_mb * 1024 * 1024
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    if total <= max_bytes:
+        return
+    excess = total - max_bytes
+    freed = 0
+    doomed = []
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+        doomed.append((key,))
+        freed += size
+        if freed >= excess:
+            break
+    conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+
+def cache_stats():
+    """
+    Get the cache hit/miss counters for this process.
+    
+    Returns:
+        dict: Counts of cache hits and misses
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def clear_cache():
+    """Remove every cached response."""
+    with _connect() as conn:
+        conn.execute("DELETE FROM responses")
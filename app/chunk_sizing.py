@@ -0,0 +1,225 @@
+import collections
+import statistics
+import threading
+from datetime import datetime
+from .evaluation import log_sizing
+
+# Chunk sizers of the transcripts being processed, keyed by session_id
+_sizers = {}
+_sizers_lock = threading.Lock()
+
+
+# === Adaptive chunk sizing ===
+class ChunkSizer:
+    """
+    Size of the next chunk, adapted to the measured rtt, tokens and retries of previous chunks.
+    
+    Fits rtt = overhead + seconds_per_unit * size over the last calls and picks the next size
+    so one call takes target_rtt seconds ("latency"), or so the rest of the transcript fits in
+    what is left of total_seconds ("total"). Sizes are in the units of the chunking mode:
+    sentences, or estimated tokens. Every decision is written to evaluation/log_sizing.jsonl.
+    """
+
+    def __init__(self, session_id, unit, size, overlap, min_size, max_size, target="latency",
+                 target_rtt=20.0, total_seconds=None, total_units=None, max_call_tokens=None,
+                 max_step=1.5, retry_shrink=0.75, window=10):
+        """
+        Args:
+            session_id (str): Session or run ID whose chunk log rows are observed
+            unit (str): "sentences" or "tokens"
+            size (int): Initial chunk size
+            overlap (int): Initial overlap; its ratio to size is kept as the size changes
+            min_size (int): Smallest chunk size
+            max_size (int): Largest chunk size
+            target (str): "latency" or "total"
+            target_rtt (float): Seconds per call to aim for in "latency" mode
+            total_seconds (float): Seconds of AI calls for the whole transcript in "total" mode
+            total_units (int): Size of the whole transcript, needed for "total" mode
+            max_call_tokens (int): Largest total_tokens per call to aim for (default: no limit)
+            max_step (float): Largest factor by which one decision may grow or shrink the size
+            retry_shrink (float): Factor applied to the size per retry of the last call
+            window (int): Number of recent calls the latency model is fitted on
+        """
+        self.session_id = session_id
+        self.unit = unit
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target = target
+        self.target_rtt = target_rtt
+        self.total_seconds = total_seconds
+        self.total_units = total_units
+        self.max_call_tokens = max_call_tokens
+        self.max_step = max_step
+        self.retry_shrink = retry_shrink
+        self.overlap_ratio = overlap / size if size else 0
+        self.size = self._clamp(size)
+        self.observations = collections.deque(maxlen=window)  # (size, rtt, total_tokens)
+        self.issued = {}  # chunk_number -> size of chunks not observed yet
+        self.chunk_number = 0
+        self.spent_seconds = 0.0
+        self.pending_retries = 0
+        self.lock = threading.Lock()
+
+    def _clamp(self, size):
+        return int(min(self.max_size, max(self.min_size, round(size))))
+
+    def _fit(self):
+        """Fit overhead and seconds per unit on the recent calls; None without observations."""
+        sizes = [size for size, _, _ in self.observations]
+        rtts = [rtt for _, rtt, _ in self.observations]
+        if not sizes:
+            return None
+        mean_size = statistics.mean(sizes)
+        mean_rtt = statistics.mean(rtts)
+        if len(set(sizes)) > 1:
+            covariance = sum((s - mean_size) * (r - mean_rtt) for s, r in zip(sizes, rtts))
+            variance = sum((s - mean_size) ** 2 for s in sizes)
+            per_unit = covariance / variance
+            overhead = mean_rtt - per_unit * mean_size
+            if per_unit > 0 and overhead >= 0:
+                return overhead, per_unit
+        # Not enough spread in sizes (or a noisy fit): assume rtt grows in proportion to size
+        return 0.0, mean_rtt / mean_size if mean_size else 0.0
+
+    def _decide(self, position):
+        """Pick the next size; returns (size, reason)."""
+        model = self._fit()
+        if model is None:
+            return self.size, "no observations yet"
+        overhead, per_unit = model
+        if per_unit <= 0:
+            return self.size, "rtt does not grow with size"
+
+        wanted = None
+        reason = None
+        remaining_units = (self.total_units - position) if self.total_units is not None else None
+        if self.target == "total" and self.total_seconds and remaining_units is not None and remaining_units > 0:
+            # Smallest size whose calls for the rest of the transcript fit in the time left
+            seconds_left = self.total_seconds - self.spent_seconds
+            advance = max(1e-6, 1 - self.overlap_ratio)
+            spare = seconds_left * advance / remaining_units - per_unit
+            if spare > 0:
+                wanted = overhead / spare if overhead > 0 else self.min_size
+            else:
+                wanted = self.max_size
+            reason = f"{seconds_left:.0f}s left for {remaining_units} {self.unit}"
+        if wanted is None:
+            wanted = (self.target_rtt - overhead) / per_unit
+            reason = f"target rtt {self.target_rtt}s"
+
+        if self.max_call_tokens:
+            tokens = [(size, total) for size, _, total in self.observations if total]
+            if tokens:
+                tokens_per_unit = sum(total for _, total in tokens) / sum(size for size, _, _ in tokens)
+                if tokens_per_unit > 0 and wanted * tokens_per_unit > self.max_call_tokens:
+                    wanted = self.max_call_tokens / tokens_per_unit
+                    reason += f", capped at {self.max_call_tokens} tokens per call"
+
+        if self.pending_retries:
+            # Invalid responses get more likely with size, so a retry always shrinks the next chunk
+            wanted = min(wanted, self.size) * self.retry_shrink ** self.pending_retries
+            reason += f", shrunk after {self.pending_retries} retries"
+            self.pending_retries = 0
+
+        # Limit the step so one slow call cannot swing the size across its whole range
+        wanted = min(self.size * self.max_step, max(self.size / self.max_step, wanted))
+        return self._clamp(wanted), reason
+
+    def next_chunk(self, position=0):
+        """
+        Decide the size of the next chunk; called by the chunker before it cuts each chunk.
+        
+        Args:
+            position (int): Units of the transcript already chunked, excluding overlap
+        
+        Returns:
+            tuple: (chunk size, overlap) in the units of the chunking mode
+        """
+        with self.lock:
+            self.chunk_number += 1
+            previous = self.size
+            self.size, reason = self._decide(position)
+            overlap = min(int(round(self.size * self.overlap_ratio)), self.size - 1)
+            self.issued[self.chunk_number] = self.size
+            log_sizing({
+                "timestamp": datetime.now().isoformat(),
+                "session_id": self.session_id,
+                "chunk_number": self.chunk_number,
+                "unit": self.unit,
+                "target": self.target,
+                "previous_size": previous,
+                "size": self.size,
+                "overlap": overlap,
+                "position": position,
+                "observed_calls": len(self.observations),
+                "spent_seconds": round(self.spent_seconds, 1),
+                "reason": reason
+            })
+            return self.size, max(0, overlap)
+
+    def observe(self, chunk_number, row):
+        """
+        Record the chunk log row of a processed chunk.
+        
+        Args:
+            chunk_number (int): Chunk number (1-indexed) the row belongs to
+            row (dict): Row written by log_chunk, with rtt, retry and total_tokens
+        """
+        with self.lock:
+            size = self.issued.pop(chunk_number, None)
+            if size is None:
+                return
+            self.spent_seconds += row.get("rtt", 0)
+            self.pending_retries += row.get("retry", 0)
+            # Cached responses and chunks without an AI call say nothing about the latency of a real call
+            if row.get("skipped") or row.get("held") or (row.get("cache_hits") and not row.get("cache_misses")):
+                return
+            self.observations.append((size, row.get("rtt", 0), row.get("total_tokens")))
+
+
+def start_chunk_sizing(session_id, unit, size, overlap, total_units=None):
+    """
+    Create the chunk sizer of a transcript if adaptive chunking is enabled.
+    
+    Args:
+        session_id (str): Session or run ID the chunks are processed under
+        unit (str): "sentences" or "tokens"
+        size (int): Configured chunk size, used for the first chunk
+        overlap (int): Configured overlap
+        total_units (int): Size of the whole transcript if known, for the "total" target
+    
+    Returns:
+        ChunkSizer: The new sizer, or None if adaptive chunking is off
+    """
+    # Import here to get the current dynamic values
+    from .config import (adaptive_chunking, adaptive_target, adaptive_target_rtt, adaptive_total_seconds,
+                         adaptive_sentence_bounds, adaptive_token_bounds, adaptive_max_call_tokens,
+                         adaptive_max_step, adaptive_retry_shrink, adaptive_window)
+    if not adaptive_chunking:
+        return None
+    min_size, max_size = adaptive_sentence_bounds if unit == "sentences" else adaptive_token_bounds
+    if adaptive_target == "total" and total_units is None:
+        print("⚠️ Transcript length unknown while streaming, adaptive chunking falls back to the target rtt")
+    sizer = ChunkSizer(
+        session_id, unit, size, overlap, min_size, max_size, adaptive_target,
+        adaptive_target_rtt, adaptive_total_seconds, total_units, adaptive_max_call_tokens,
+        adaptive_max_step, adaptive_retry_shrink, adaptive_window
+    )
+    with _sizers_lock:
+        _sizers[session_id] = sizer
+    return sizer
+
+
+def observe_chunk(session_id, chunk_number, row):
+    """
+    Pass a chunk log row to the chunk sizer of its session, if there is one.
+    
+    Args:
+        session_id (str): Session or run ID the chunk belongs to
+        chunk_number (int): Chunk number (1-indexed)
+        row (dict): Row written by log_chunk
+    """
+    with _sizers_lock:
+        sizer = _sizers.get(session_id)
+    if sizer is not None:
+        sizer.observe(chunk_number, row)
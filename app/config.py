@@ -4,9 +4,121 @@ import os
 
 # Initialize OpenAI client
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY_survey"))
+# SURVEY_API_BASE_URL points the clients at another OpenAI-compatible server,
+# e.g. the offline mock in evaluation/mock_api_server.py (http://127.0.0.1:8765/v1)
+api_base_url = os.getenv("SURVEY_API_BASE_URL") or None
+api_key = os.getenv("OPENAI_API_KEY_survey") or ("offline" if api_base_url else None)
+client = OpenAI(api_key=api_key, base_url=api_base_url)
+# Async clients are created per event loop by app.answer.new_async_client
 model="o4-mini-2025-04-16"
 
 # Chunking Settings
 n_sentences = 12
-n_overlap = 2
\ No newline at end of file
+n_overlap = 2
+# "sentences": fixed n_sentences/n_overlap per chunk; "tokens": pack sentences up to a token budget
+chunking_mode = "sentences"
+chunk_token_budget = 400
+chunk_overlap_tokens = 60
+# Close a chunk at a speaker turn once it is this full, instead of in the middle of an answer
+chunk_prefer_speaker_turns = True
+chunk_speaker_turn_fill = 0.75
+
+# Adaptive Chunk Sizing Settings
+# Resize each chunk from the rtt, total_tokens and retries of the chunks before it
+# (decisions are logged to evaluation/log_sizing.jsonl)
+adaptive_chunking = False
+adaptive_target = "latency"       # "latency": adaptive_target_rtt per call; "total": adaptive_total_seconds per transcript
+adaptive_target_rtt = 20.0        # Seconds per AI call
+adaptive_total_seconds = 600.0    # Seconds of AI calls per transcript (needs the transcript length)
+adaptive_sentence_bounds = (4, 24)     # Chunk size bounds in "sentences" mode
+adaptive_token_bounds = (150, 1200)    # Chunk size bounds in "tokens" mode
+adaptive_max_call_tokens = None   # Keep the total_tokens of a call below this (None = no limit)
+adaptive_max_step = 1.5           # Largest grow/shrink factor of one decision
+adaptive_retry_shrink = 0.75      # Size factor per retry of the previous call
+adaptive_window = 10              # Recent calls the latency model is fitted on
+
+# Concurrency Settings
+# Maximum number of chunks sent to the API at the same time.
+# 1 keeps the original one-chunk-per-rerun flow.
+max_concurrent_chunks = 1
+
+# LLM Response Cache Settings
+# Set SURVEY_LLM_CACHE=off (or llm_cache_enabled = False) to always call the API
+llm_cache_enabled = os.getenv("SURVEY_LLM_CACHE", "on").lower() != "off"
+llm_cache_path = "data/cache/llm_responses.sqlite"
+llm_cache_max_size_mb = 200
+llm_cache_max_age_days = 30
+
+# Streaming Settings
+# Apply each answer as soon as it arrives instead of waiting for the full response
+stream_responses = False
+
+# Relevance Prefilter Settings
+# Only send the questions a chunk is likely to address; uncertain questions are always kept
+relevance_filter = False
+relevance_min_score = 0.15
+relevance_min_questions = 5
+
+# Chunk Relevance Gate Settings
+# Score each chunk against the survey vocabulary before the AI call (scores are logged per chunk):
+# "off" sends every chunk, "skip" drops chunks scoring below chunk_gate_min_score,
+# "merge" holds them back and sends them together with the next chunk (held text left when the
+# transcript ends, or when the saturation policy skips the next chunk, is sent on its own)
+chunk_gate = "off"
+chunk_gate_min_score = 0.2
+chunk_gate_max_merge = 2  # Most low-scoring chunks held back in a row before sending anyway
+
+# Saturation Settings
+# With a policy set, questions answered with high certainty or edited by a human leave the
+# active set and prompts only ask about the active questions. Once no question is active, or no
+# answer changed for saturation_patience chunks in a row, the remaining chunks are "skip"ped or
+# only checked against the existing answers ("conflict_check"). "off" always sends the full survey.
+saturation_policy = "off"
+saturation_patience = 3  # Unchanged chunks in a row before the survey counts as saturated (0 = never)
+
+# Previous Answers Context Settings
+# Maximum estimated tokens of previous answers carried into follow-up prompts (None = no limit)
+previous_answers_token_budget = 2000
+
+# Prompt Layout Settings
+# "classic": original prompts; "stable_prefix": instructions + full survey first, per-chunk data last,
+# so the provider can serve the prefix from its prompt cache
+prompt_layout = "classic"
+
+# Answer Store Settings
+# "sqlite": every session's answers in one WAL-mode database
+# "journal": one append-only journal + answers.json snapshot per session
+answer_store_backend = "sqlite"
+answer_db_path = "data/answers.sqlite"
+# Number of journal entries after which the snapshot is rewritten and the journal truncated
+answer_journal_compact_every = 200
+
+# Evaluation Log Settings
+# Directory of log_chunks.jsonl, log_sizing.jsonl, log_render.jsonl and evaluation_results.jsonl;
+# sweep runs each get their own directory
+evaluation_log_dir = "evaluation"
+# Fraction of survey page reruns whose render time is logged to log_render.jsonl
+# (0 = off; every widget interaction reruns the page, so keep it low outside of profiling)
+render_log_sample_rate = 0.0
+
+# Background Job Settings
+# Number of interviews whose chunks can be processed at the same time in one server process
+max_background_jobs = 4
+# Seconds a finished, failed or cancelled job stays reachable (e.g. for a browser refresh) before
+# it is evicted; jobs the page has already shown as finished are dropped right away
+job_retention_seconds = 3600
+
+# Survey Page Settings
+# Questions shown per page in each column; only the visible page is rendered on a rerun
+questions_per_page = 20
+
+# Audio Segmentation Settings
+# Recordings longer than segment_max_seconds are cut at silences and the segments
+# transcribed in parallel. Needs ffmpeg and ffprobe on PATH; without them the whole
+# recording is sent in one request.
+segment_max_seconds = 600
+segment_silence_db = -35
+segment_min_silence_seconds = 0.5
+# Overlap added around cuts where no silence was found; the repeated words are removed when stitching
+segment_overlap_seconds = 1.0
+max_concurrent_transcriptions = 4
@@ -1,27 +1,93 @@
+import contextlib
 import os
 import json
+import random
 import statistics
+import threading
+from .answer_store import get_answer_store
+
+# Serializes writes to the chunk log, which backfill_total_chunks rewrites in place
+_chunk_log_lock = threading.Lock()
+
+def _evaluation_path(file_name):
+    """Path of an evaluation output file in the current log directory."""
+    # Import here to get the current dynamic values
+    from .config import evaluation_log_dir
+    return os.path.join(evaluation_log_dir, file_name)
+
+def _append_jsonl(file_path, row, lock=None):
+    """Append a row to a JSONL file, creating its directory if needed."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with lock or contextlib.nullcontext(), open(file_path, "a", encoding='utf-8') as f:
+        f.write(json.dumps(row, ensure_ascii=False) + "\n")
 
 def log_chunk(row: dict):
-    file_path = "evaluation/log_chunks.jsonl"
+    _append_jsonl(_evaluation_path("log_chunks.jsonl"), row, _chunk_log_lock)
+
+def backfill_total_chunks(session_id, total_chunks):
+    """
+    Fill in the total of chunks logged while it was still unknown.
     
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    Chunks streamed from a generator are logged with run IDs ending in "_?"; once
+    the generator is exhausted their run IDs get the final total.
     
-    # Append the row to the JSONL file
-    with open(file_path, "a", encoding='utf-8') as f:
-        f.write(json.dumps(row, ensure_ascii=False) + "\n")
-        f.flush()  # Ensure data is written immediately
+    Args:
+        session_id (str): Session or run ID the chunks were processed under
+        total_chunks (int): Final number of chunks
+    
+    Returns:
+        int: Number of rows updated
+    """
+    file_path = _evaluation_path("log_chunks.jsonl")
+    updated = 0
+    with _chunk_log_lock:
+        if not os.path.exists(file_path):
+            return 0
+        with open(file_path, "r", encoding='utf-8') as f:
+            lines = f.readlines()
+        for i, line in enumerate(lines):
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            run_id = row.get("run_id", "")
+            if row.get("session_id") == session_id and run_id.endswith("_?"):
+                row["run_id"] = f"{run_id[:-1]}{total_chunks}"
+                lines[i] = json.dumps(row, ensure_ascii=False) + "\n"
+                updated += 1
+        if updated:
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, file_path)
+    return updated
+
+def log_render(row: dict):
+    """Log the render time of a survey rerun, for the sampled fraction of reruns."""
+    # Import here to get the current dynamic values
+    from .config import render_log_sample_rate
+    if render_log_sample_rate <= 0 or random.random() >= render_log_sample_rate:
+        return
+    _append_jsonl(_evaluation_path("log_render.jsonl"), row)
 
-def summarize_all_chunks(n_sentences, n_overlap, total_chunks):
+def log_sizing(row: dict):
+    _append_jsonl(_evaluation_path("log_sizing.jsonl"), row)
+
+def summarize_all_chunks(n_sentences, n_overlap, total_chunks, session_id=None):
     """
     Calculate trimmed mean of rtt, trimmed mean * total_chunks, trimmed mean of retry,
     and sum of total_tokens from log_chunks.jsonl, and save to evaluation_results.jsonl.
+    Chunks skipped or held back by the relevance gate or the saturation policy are counted
+    but left out of the rtt. With a session_id, only that session's chunks are summarized,
+    so sessions sharing a log directory do not mix.
     """
-    file_path = "evaluation/log_chunks.jsonl"
+    file_path = _evaluation_path("log_chunks.jsonl")
     rtts = []
     retries = []
     total_tokens = []
+    gated_chunks = 0
+    saturated_chunks = 0
+    conflict_check_chunks = 0
     # Read all rows
     if os.path.exists(file_path):
         with open(file_path, "r", encoding='utf-8') as f:
@@ -34,7 +100,16 @@ def summarize_all_chunks(n_sentences, n_overlap, total_chunks):
                 try:
                     row = json.loads(line)
                     # Only include rows for this total_chunks run
+                    if session_id is not None and row.get("session_id") != session_id:
+                        continue
                     if row.get("run_id", "").startswith(f"S{n_sentences}_O{n_overlap}"):
+                        if row.get("saturated"):
+                            saturated_chunks += 1
+                        if row.get("skipped") or row.get("held"):
+                            gated_chunks += 1
+                            continue
+                        if row.get("prompt_mode") == "conflict_check":
+                            conflict_check_chunks += 1
                         rtts.append(row.get("rtt", 0))
                         retries.append(row.get("retry", 0))
                         # total_tokens may not be present in all rows
@@ -64,6 +139,9 @@ def summarize_all_chunks(n_sentences, n_overlap, total_chunks):
         trimmed = data_sorted[trim: n - trim]
         return statistics.mean(trimmed)
 
+    # Import here to get the current dynamic values
+    from .config import saturation_policy, saturation_patience
+
     rtt_trimmed_mean = trimmed_mean(rtts)
     total_retries = sum(retries)
     total_tokens_sum = sum(total_tokens) if total_tokens else None
@@ -73,26 +151,29 @@ def summarize_all_chunks(n_sentences, n_overlap, total_chunks):
         "n_overlap": n_overlap,
         "total_chunks": total_chunks,
         "rtt_trimmed_mean": round(rtt_trimmed_mean, 1),
-        "rtt_trimmed_mean_times_total_chunks": round(rtt_trimmed_mean * total_chunks, 1),
+        "rtt_trimmed_mean_times_total_chunks": round(rtt_trimmed_mean * (total_chunks - gated_chunks), 1),
         "total_retries": total_retries,
-        "total_tokens_sum": total_tokens_sum
+        "total_tokens_sum": total_tokens_sum,
+        "gated_chunks": gated_chunks,
+        "saturation_policy": saturation_policy,
+        "saturation_patience": saturation_patience,
+        "saturated_chunks": saturated_chunks,
+        "conflict_check_chunks": conflict_check_chunks
     }
-    result_path = "evaluation/evaluation_results.jsonl"
+    result_path = _evaluation_path("evaluation_results.jsonl")
     os.makedirs(os.path.dirname(result_path), exist_ok=True)
     with open(result_path, "a") as f:
         f.write(json.dumps(result) + "\n")
 
 
-def evaluate_ai_answers(n_sentences, n_overlap):
+def evaluate_ai_answers(n_sentences, n_overlap, session_id=None):
     # Inputs
-    ai_path = "data/answers.json"
     human_path = "evaluation/answers_human.json"
     questions_ignore = ["7", "8", "13"]
     questions_blank = ["9", "19", "20", "24", "25"]
     qids_to_check = ["1", "2", "3", "4", "5", "6", "10", "11", "12", "14", "15", "16", "17", "18", "21", "22", "23"]
     
-    with open(ai_path) as f:
-        ai = json.load(f)
+    ai = get_answer_store(session_id).get_all()
     with open(human_path, encoding='utf-8') as f:
         human = json.load(f)
 
@@ -124,7 +205,7 @@ def evaluate_ai_answers(n_sentences, n_overlap):
 
 
     # Read existing results to find the most recent row for this configuration
-    result_path = "evaluation/evaluation_results.jsonl"
+    result_path = _evaluation_path("evaluation_results.jsonl")
     os.makedirs(os.path.dirname(result_path), exist_ok=True)
     
     existing_data = None
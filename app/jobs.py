@@ -0,0 +1,282 @@
+import itertools
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from .main_workflow import process_single_chunk, process_chunks_concurrently, has_held_chunk, flush_held_chunk, reset_chunk_state
+from .answer import load_answers, apply_answers_batch
+from .answer_store import get_answer_store
+from .survey_state import get_survey_state, copy_survey_state
+from .evaluation import summarize_all_chunks, evaluate_ai_answers, backfill_total_chunks
+
+# Job table shared by every Streamlit session in this server process, so jobs
+# keep running and stay reachable after a browser refresh; finished jobs are
+# evicted by forget_job or after job_retention_seconds
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# === Background chunk processing ===
+def _get_executor():
+    """Create the worker pool on first use."""
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            from .config import max_background_jobs
+            _executor = ThreadPoolExecutor(max_workers=max_background_jobs, thread_name_prefix="chunk-job")
+        return _executor
+
+
+def _evict_finished_jobs():
+    """Drop jobs that finished more than job_retention_seconds ago; call with _jobs_lock held."""
+    # Import here to get the current dynamic values
+    from .config import job_retention_seconds
+    cutoff = time.time() - job_retention_seconds
+    expired = [
+        job_id for job_id, job in _jobs.items()
+        if job["status"] not in ACTIVE_STATUSES and job["finished_at"] is not None and job["finished_at"] < cutoff
+    ]
+    for job_id in expired:
+        del _jobs[job_id]
+
+
+def submit_chunk_job(chunks, df, survey_data, session_id, metadata=None):
+    """
+    Queue the processing of all chunks of a transcript as a background job.
+    
+    Args:
+        chunks (iterable): Transcript chunks to process; a generator (e.g. from
+            iter_chunks_by_sentences) is consumed in the worker, so transcription and
+            extraction overlap
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        survey_data: Survey data for formatting questions
+        session_id (str): Session whose answers the job reads and updates
+        metadata (dict): Extra values to keep with the job (e.g. survey name, audio ID)
+    
+    Returns:
+        str: Job ID
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "session_id": session_id,
+        "survey_data": survey_data,
+        "df": df.copy(),
+        # Unknown until a chunk generator is exhausted
+        "total_chunks": len(chunks) if hasattr(chunks, "__len__") else None,
+        "completed_chunks": 0,
+        "changed_ids": [],
+        "error": None,
+        "created_at": time.time(),
+        "finished_at": None,
+        "metadata": metadata or {},
+        "cancel_event": threading.Event(),
+    }
+    with _jobs_lock:
+        _evict_finished_jobs()
+        _jobs[job_id] = job
+    _get_executor().submit(_run_chunk_job, job, chunks)
+    return job_id
+
+
+def _snapshot(df):
+    """Copy a DataFrame together with its survey state."""
+    snapshot = df.copy()
+    copy_survey_state(df, snapshot)
+    return snapshot
+
+
+def _publish(job, df, changed_ids=None):
+    """
+    Make the worker's current answers visible to readers of the job.
+    
+    Answers are applied to the worker's DataFrame in place, so readers get a copy
+    swapped in under the lock and never see a batch that is only half applied.
+    """
+    snapshot = _snapshot(df)
+    with _jobs_lock:
+        job["df"] = snapshot
+        if changed_ids is not None:
+            job["changed_ids"] = changed_ids
+
+
+def _run_chunk_job(job, chunks):
+    """Worker: process the chunks of one job, checking for cancellation between chunks."""
+    from .config import n_sentences, n_overlap, max_concurrent_chunks
+
+    job["status"] = "running"
+    batch_size = max(1, max_concurrent_chunks)
+    chunk_iter = iter(chunks)
+    received = []
+    # Only the worker writes to this DataFrame; readers see the snapshots in job["df"]
+    working = _snapshot(job["df"])
+    try:
+        index = 0
+        while True:
+            if job["cancel_event"].is_set():
+                job["status"] = "cancelled"
+                print(f"⏹️ Job {job['id']} cancelled after {index} chunks")
+                return
+
+            # Waits for transcription when chunks come from a generator
+            received.extend(itertools.islice(chunk_iter, batch_size))
+            if index >= len(received):
+                break
+            total_chunks = job["total_chunks"] or "?"
+
+            before = working["last_updated"].copy()
+            end = len(received)
+            if batch_size > 1:
+                working = process_chunks_concurrently(
+                    received, working, job["survey_data"], batch_size,
+                    start_index=index, end_index=end, session_id=job["session_id"], total_chunks=total_chunks
+                )
+            else:
+                # Publish answers streamed in during the call so the UI can show them right away
+                working = process_single_chunk(
+                    received[index], index + 1, total_chunks, working, job["survey_data"],
+                    on_answer=lambda answer, df: _publish(job, df), session_id=job["session_id"]
+                )
+            changed = working["last_updated"].ne(before) & working["last_updated"].notna()
+            _publish(job, working, list(working.index[changed]))
+            index = end
+            job["completed_chunks"] = index
+
+        total_chunks = len(received)
+        if received and has_held_chunk(job["session_id"]):
+            # Text the relevance gate held back from the last chunks while the total was unknown,
+            # sent and logged as one more chunk
+            total_chunks += 1
+            before = working["last_updated"].copy()
+            working = flush_held_chunk(total_chunks, total_chunks if job["total_chunks"] else "?", working, job["survey_data"],
+                                       on_answer=lambda answer, df: _publish(job, df), session_id=job["session_id"])
+            changed = working["last_updated"].ne(before) & working["last_updated"].notna()
+            _publish(job, working, list(working.index[changed]))
+        if job["total_chunks"] is None:
+            # Chunks logged while the generator was still running get the final total
+            backfill_total_chunks(job["session_id"], total_chunks)
+        job["total_chunks"] = job["completed_chunks"] = total_chunks
+        get_answer_store(job["session_id"]).compact()
+        job["status"] = "done"
+        try:
+            summarize_all_chunks(n_sentences, n_overlap, total_chunks, job["session_id"])
+            evaluate_ai_answers(n_sentences, n_overlap, job["session_id"])
+        except Exception as e:
+            print(f"⚠️ Job {job['id']} finished but evaluation failed: {e}")
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+        traceback.print_exc()
+    finally:
+        # Held-back text of a cancelled or failed job must not reach a later transcript
+        reset_chunk_state(job["session_id"])
+        job["finished_at"] = time.time()
+
+
+def get_job(job_id):
+    """
+    Look up a job.
+    
+    Args:
+        job_id (str): Job ID from submit_chunk_job
+    
+    Returns:
+        dict: The job record, or None if the job does not exist
+    """
+    with _jobs_lock:
+        _evict_finished_jobs()
+        return _jobs.get(job_id)
+
+
+def forget_job(job_id):
+    """
+    Remove a job that is no longer active from the job table.
+    
+    Args:
+        job_id (str): Job ID from submit_chunk_job
+    
+    Returns:
+        bool: True if the job was removed
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None or job["status"] in ACTIVE_STATUSES:
+            return False
+        del _jobs[job_id]
+        return True
+
+
+def cancel_job(job_id):
+    """
+    Ask a job to stop after the chunk it is currently processing.
+    
+    Args:
+        job_id (str): Job ID from submit_chunk_job
+    
+    Returns:
+        bool: True if the job was still active
+    """
+    job = get_job(job_id)
+    if job is None or job["status"] not in ACTIVE_STATUSES:
+        return False
+    job["cancel_event"].set()
+    return True
+
+
+def job_dataframe(job_id):
+    """
+    Get a copy of a job's DataFrame with the session's human edits applied on top.
+    
+    Human edits saved while the job runs are written to the answer store, not to
+    the job's DataFrame, so they are merged back in here. The merged copy is reused
+    until the job's answers or the human edits change, and edited rows keep the time
+    of the edit, so answer versions (and the HTML and export caches keyed by them)
+    stay the same between polls.
+    
+    Args:
+        job_id (str): Job ID from submit_chunk_job
+    
+    Returns:
+        pd.DataFrame: Current answers of the job, or None if the job does not exist
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    with _jobs_lock:
+        # A complete snapshot published by the worker, never changed after that
+        source_df = job["df"]
+    human_records = {
+        qid: record for qid, record in load_answers(job["session_id"]).items()
+        if record["source"] == "human"
+    }
+    signature = (
+        id(source_df), get_survey_state(source_df).version,
+        tuple(sorted((qid, record["last_updated"]) for qid, record in human_records.items()))
+    )
+    merged = job.get("merged")
+    if merged is not None and merged[0] == signature:
+        return merged[1]
+
+    df = source_df.copy()
+    copy_survey_state(source_df, df)
+    if human_records:
+        human_answers = [
+            {"question_id": qid, "answer": record["answer"], "text field": record["text field"]}
+            for qid, record in human_records.items()
+        ]
+        df, changed_ids = apply_answers_batch(df, human_answers, "human")
+        if changed_ids:
+            # Keep the time of the edit, not the time of this merge
+            edited_at = {}
+            for qid, record in human_records.items():
+                try:
+                    edited_at[float(qid)] = record["last_updated"]
+                except ValueError:
+                    pass
+            df.loc[changed_ids, "last_updated"] = [edited_at.get(float(qid)) for qid in changed_ids]
+    job["merged"] = (signature, df)
+    return df
@@ -1,12 +1,19 @@
-from .config import client, model
-from .survey import process_survey_excel, format_survey_questions
-from .prompt import create_prompt_without_answers, create_prompt_with_answers
-from .answer import process_ai_response, update_answers_file, update_answers_dataframe, get_ai_response
+from .survey import process_survey_excel, format_survey_questions, get_human_edited_ids, get_compiled_survey, get_active_question_ids
+from .prompt import create_prompt_without_answers, create_prompt_with_answers, create_prompt_stable_prefix, create_conflict_check_prompt, format_previous_answers, estimate_tokens
+from .answer import process_ai_response, update_answers_file, load_answers, apply_answers_batch, get_ai_response, get_ai_response_async, get_ai_response_streaming, new_async_client
 from .evaluation import log_chunk
-import json
-import os
+from .chunk_sizing import observe_chunk
+from .repair import validate_answer
+from .relevance import select_relevant_questions, score_chunk
+from .audio import remove_boundary_overlap
+import asyncio
 import time
 
+# Low-relevance chunk text held back to be sent with the next chunk, keyed by session_id
+_held_chunks = {}
+# Number of processed chunks in a row that changed no answer, keyed by session_id
+_unchanged_chunks = {}
+
 def prepare_survey(excel_name):
     """
     Prepare a survey for use by processing Excel file and formatting questions for prompts.
@@ -14,7 +21,7 @@ def prepare_survey(excel_name):
     
     Args:
         excel_name (str): Name of the Excel file (without extension)
-        
+    
     Returns:
         tuple: (raw survey data as list of question objects, DataFrame ready for answers)
     """
@@ -33,76 +40,407 @@ def prepare_survey(excel_name):
         return None, None
 
 
-def process_single_chunk(chunk_text, chunk_number, total_chunks, df, survey_data):
+def load_previous_answers(session_id=None):
     """
-    Process a single chunk of transcript text.
+    Get the answers collected so far from the answer store.
+    
+    Args:
+        session_id (str): Session or run ID (default: the shared default session)
+    
+    Returns:
+        dict: Previous answers keyed by question ID, or None if no answers exist yet
+    """
+    return load_answers(session_id) or None
+
+
+def select_chunk_questions(chunk_text, survey_data, previous_answers, call_info=None):
+    """
+    Select the questions a chunk's prompt asks about.
+    
+    Args:
+        chunk_text (str): The transcript chunk to process
+        survey_data: Survey data
+        previous_answers (dict): Previous answers keyed by question ID, or None
+        call_info (dict): Optional dict that collects prompt stats for the chunk log
+    
+    Returns:
+        list: Selected question IDs, or None for the whole survey
+    """
+    # Import here to get the current dynamic values
+    from .config import relevance_filter, relevance_min_score, relevance_min_questions, saturation_policy
+
+    # Only carry the questions this chunk is likely to address
+    question_ids = None
+    if relevance_filter:
+        question_ids = select_relevant_questions(survey_data, chunk_text, relevance_min_score, relevance_min_questions)
+
+    # Settled questions (high certainty or human-edited) are no longer asked about
+    if saturation_policy != "off" and previous_answers:
+        active_ids = get_active_question_ids(survey_data, previous_answers)
+        if question_ids is not None:
+            active = set(active_ids)
+            active_ids = [qid for qid in question_ids if qid in active]
+        question_ids = active_ids
+        if call_info is not None:
+            call_info["active_questions"] = len(active_ids)
+    return question_ids
+
+
+def build_chunk_prompt(chunk_text, survey_data, previous_answers, call_info=None, conflict_check=False, question_ids=None):
+    """
+    Build the prompt for a single chunk.
     
     Args:
         chunk_text (str): The transcript chunk to process
-        chunk_number (int): Current chunk number (1-indexed)
-        total_chunks (int): Total number of chunks
-        df (pd.DataFrame): DataFrame with survey questions and answer columns
         survey_data: Survey data for formatting questions
-        
+        previous_answers (dict): Previous answers keyed by question ID, or None
+        call_info (dict): Optional dict that collects prompt stats for the chunk log
+        conflict_check (bool): Only recheck the existing AI answers (used once the survey is saturated)
+        question_ids (list): Ask about these questions instead of selecting them with select_chunk_questions
+            (used to re-ask part of a prompt)
+    
     Returns:
-        pd.DataFrame: Updated DataFrame with new answers from this chunk
+        str: Complete prompt, or None if the survey questions could not be formatted
     """
     # Import here to get the current dynamic values
-    from .config import n_sentences, n_overlap
+    from .config import previous_answers_token_budget, prompt_layout
 
-    print(f"\n📄 Processing chunk {chunk_number}/{total_chunks}")
+    if call_info is not None:
+        # Chunk size by the same local estimate the token chunker packs to
+        call_info["chunk_tokens"] = estimate_tokens(chunk_text)
+
+    if conflict_check:
+        return _build_conflict_check_prompt(chunk_text, survey_data, previous_answers, call_info, question_ids)
 
+    if question_ids is None:
+        question_ids = select_chunk_questions(chunk_text, survey_data, previous_answers, call_info)
+    if question_ids is not None and call_info is not None:
+        call_info["prompt_questions"] = len(question_ids)
 
-    # Format survey questions
-    survey_questions = format_survey_questions(survey_data)
+    # Format survey questions; the stable-prefix layout always carries the full survey
+    stable_prefix = prompt_layout == "stable_prefix"
+    if stable_prefix:
+        survey_questions = format_survey_questions(survey_data, exclude_human_edited=False)
+    else:
+        survey_questions = format_survey_questions(survey_data, question_ids, answers=previous_answers)
     if not survey_questions:
         print("Failed to format questions")
-        return df
+        return None
     
-    # Check for existing answers and create prompt for this chunk
-    if os.path.exists("data/answers.json"):
-        # Get previous answers as string
-        with open("data/answers.json", "r") as f:
-            previous_answers = json.load(f)
-        previous_answers_str = ""
-        for qid, answer_data in previous_answers.items():
-            if answer_data['source'] == "ai":
-                previous_answers_str += f"{qid}: {answer_data['answer']} (certainty: {answer_data['certainty']})"
-                if answer_data['text field']:
-                    previous_answers_str += f" - \"{answer_data['text field']}\"\n"
+    # Get previous answers for the selected questions as string, within the token budget
+    previous_answers_str = ""
+    if previous_answers is not None:
+        previous_answers_str, context_tokens = format_previous_answers(
+            previous_answers, question_ids, previous_answers_token_budget
+        )
+        if call_info is not None:
+            call_info["context_tokens"] = context_tokens
 
+    if stable_prefix:
+        # Human edits and the relevance selection go in the tail so the prefix never changes
+        return create_prompt_stable_prefix(
+            survey_questions, chunk_text, previous_answers_str,
+            excluded_ids=get_human_edited_ids(survey_data, previous_answers), focus_ids=question_ids
+        )
+    if previous_answers is not None:
         # Generate follow-up prompt for this chunk
-        prompt = create_prompt_with_answers(survey_questions, previous_answers_str, chunk_text)
+        return create_prompt_with_answers(survey_questions, previous_answers_str, chunk_text)
+    # Generate initial prompt for this chunk
+    return create_prompt_without_answers(survey_questions, chunk_text)
+
+
+def _build_conflict_check_prompt(chunk_text, survey_data, previous_answers, call_info=None, question_ids=None):
+    """Build a prompt that only rechecks the existing AI answers (of question_ids, if given); None if there are none."""
+    # Import here to get the current dynamic values
+    from .config import previous_answers_token_budget
+
+    answered_ids = _conflict_check_ids(previous_answers, question_ids)
+    answered_questions = format_survey_questions(survey_data, answered_ids, answers=previous_answers)
+    if not answered_questions:
+        print("No AI answers to check")
+        return None
+    previous_answers_str, context_tokens = format_previous_answers(
+        previous_answers, answered_ids, previous_answers_token_budget
+    )
+    if call_info is not None:
+        call_info["prompt_mode"] = "conflict_check"
+        call_info["prompt_questions"] = len(answered_ids)
+        call_info["context_tokens"] = context_tokens
+    return create_conflict_check_prompt(answered_questions, previous_answers_str, chunk_text)
+
+
+def _conflict_check_ids(previous_answers, question_ids=None):
+    """IDs of the AI answers a conflict-check prompt carries."""
+    return [
+        qid for qid, record in (previous_answers or {}).items()
+        if record['source'] == "ai" and (question_ids is None or qid in question_ids)
+    ]
+
+
+def prepare_chunk_prompt(chunk_text, survey_data, previous_answers, call_info=None, conflict_check=False):
+    """
+    Build the prompt of a chunk together with what process_ai_response needs to re-ask part of it.
+    
+    Args:
+        chunk_text (str): The transcript chunk to process
+        survey_data: Survey data for formatting questions
+        previous_answers (dict): Previous answers keyed by question ID, or None
+        call_info (dict): Optional dict that collects prompt stats for the chunk log
+        conflict_check (bool): Only recheck the existing AI answers
+    
+    Returns:
+        tuple: (prompt or None, question IDs in the prompt or None for the whole survey,
+            function building a prompt for a subset of those questions with the same builder)
+    """
+    if conflict_check:
+        question_ids = _conflict_check_ids(previous_answers)
     else:
-        # Generate initial prompt for this chunk
-        prompt = create_prompt_without_answers(survey_questions, chunk_text)
+        question_ids = select_chunk_questions(chunk_text, survey_data, previous_answers, call_info)
+    prompt = build_chunk_prompt(chunk_text, survey_data, previous_answers, call_info, conflict_check, question_ids)
+
+    def reask_prompt(reask_ids):
+        return build_chunk_prompt(chunk_text, survey_data, previous_answers, None, conflict_check, reask_ids)
+
+    return prompt, question_ids, reask_prompt
+
+
+def check_saturation(chunk_number, survey_data, previous_answers, session_id=None):
+    """
+    Check whether further chunks are unlikely to change the survey.
     
-    # Get AI response for this chunk
-    retry = 0
-    ai_start = time.time()
-    response_text, total_tokens = get_ai_response(prompt)
-    ai_duration = time.time() - ai_start
-    print(f"   🤖 Chunk {chunk_number} AI response received in {ai_duration:.2f}s")
+    The survey is saturated once no question is active any more, or once no answer
+    changed for saturation_patience processed chunks in a row. Nothing counts as
+    saturated before the first answer exists.
     
-    # Process response and update tracking for this chunk
-    result = process_ai_response(response_text, prompt)
+    Args:
+        chunk_number (int): Current chunk number (1-indexed); chunk 1 starts a new count
+        survey_data: Survey data
+        previous_answers (dict): Previous answers keyed by question ID, or None
+        session_id (str): Session or run ID the chunk belongs to
+    
+    Returns:
+        str: Reason the survey is saturated, or None if it is not (or the policy is off)
+    """
+    # Import here to get the current dynamic values
+    from .config import saturation_policy, saturation_patience
+    if saturation_policy == "off":
+        return None
+    if chunk_number == 1:
+        _unchanged_chunks.pop(session_id, None)
+    if not previous_answers:
+        return None
+    if not get_active_question_ids(survey_data, previous_answers):
+        return "no active questions"
+    unchanged = _unchanged_chunks.get(session_id, 0)
+    if saturation_patience and unchanged >= saturation_patience:
+        return f"no answer changed in {unchanged} chunks"
+    return None
+
+
+def reset_chunk_state(session_id=None):
+    """Forget the held-back text and unchanged-chunk count of a session, e.g. once its survey is reset."""
+    _held_chunks.pop(session_id, None)
+    _unchanged_chunks.pop(session_id, None)
+
+
+def _record_answer_changes(session_id, changed):
+    """Count processed chunks in a row that changed no answer, for check_saturation."""
+    if changed:
+        _unchanged_chunks[session_id] = 0
+    else:
+        _unchanged_chunks[session_id] = _unchanged_chunks.get(session_id, 0) + 1
+
+
+def _saturated_chunk(chunk_number, total_chunks, survey_data, previous_answers, session_id=None, can_skip=True):
+    """
+    Apply the saturation policy to a chunk.
+    
+    Args:
+        can_skip (bool): False for text gate_chunk held back, which is sent even once the survey is saturated
+    
+    Returns:
+        tuple: (True if the chunk is skipped, saturation reason or None)
+    """
+    # Import here to get the current dynamic values
+    from .config import saturation_policy
+    reason = check_saturation(chunk_number, survey_data, previous_answers, session_id)
+    if reason is None or (saturation_policy == "skip" and not can_skip):
+        return False, None
+    if saturation_policy == "skip":
+        return True, reason
+    print(f"   🔎 Chunk {chunk_number} only checked for conflicts, survey saturated ({reason})")
+    return False, reason
+
+
+def _skip_saturated_chunk(chunk_number, total_chunks, reason, session_id=None):
+    """
+    Skip a chunk because the survey is saturated.
+    
+    Text gate_chunk held back before the survey saturated is not dropped: it is handed
+    back to be sent in place of the skipped chunk. Otherwise the chunk is logged as skipped.
+    
+    Returns:
+        tuple: (held-back text to send, or None if the chunk is only skipped; its gate details)
+    """
+    held_text, gate_info = _pop_held_chunk(session_id)
+    if held_text and chunk_number > 1:
+        print(f"   ↩️ Chunk {chunk_number} skipped, survey saturated ({reason}); sending the text held back before it")
+        gate_info["saturated"] = reason
+        return held_text, gate_info
+    print(f"   ⏭️ Chunk {chunk_number} skipped, survey saturated ({reason})")
+    _log_gated_chunk(chunk_number, total_chunks, {"skipped": True, "saturated": reason}, session_id)
+    return None, {}
+
+
+def _chunk_run_id(chunk_number, total_chunks):
+    """Run ID of a chunk in the chunk log, from the chunking settings and its position."""
+    # Import here to get the current dynamic values
+    from .config import n_sentences, n_overlap
+    return f"S{n_sentences}_O{n_overlap}_{chunk_number}_{total_chunks}"
+
+
+def gate_chunk(chunk_text, chunk_number, survey_data, session_id=None, total_chunks=None):
+    """
+    Decide whether a chunk is worth an AI call from its relevance to the survey vocabulary.
+    
+    In "merge" mode a low-scoring chunk is held back and sent in front of the next one
+    (without the sentences they overlap in). The last chunk is never held back; when the
+    total is not known yet, flush_held_chunk sends what is left once the transcript ends.
+    
+    Args:
+        chunk_text (str): The transcript chunk
+        chunk_number (int): Current chunk number (1-indexed); chunk 1 drops text held from an earlier transcript
+        survey_data: Survey data the chunk is scored against
+        session_id (str): Session or run ID the chunk belongs to
+        total_chunks: Total number of chunks, or "?" while chunks are still streaming in
+    
+    Returns:
+        tuple: (text to send, or None if the chunk is skipped or held back; dict of gate details for the chunk log)
+    """
+    # Import here to get the current dynamic values
+    from .config import chunk_gate, chunk_gate_min_score, chunk_gate_max_merge
+    if chunk_gate == "off":
+        return chunk_text, {}
+
+    held_text, held_count = _held_chunks.pop(session_id, ("", 0))
+    if held_text and chunk_number > 1:
+        chunk_text = held_text.rstrip() + " " + remove_boundary_overlap(held_text, chunk_text, max_words=200).lstrip()
+    else:
+        held_count = 0
+
+    score, judged = score_chunk(survey_data, chunk_text)
+    gate_info = {"relevance_score": round(score, 3)}
+    if held_count:
+        gate_info["merged_chunks"] = held_count
+    if score >= chunk_gate_min_score:
+        return chunk_text, gate_info
+
+    if chunk_gate == "merge":
+        if held_count >= chunk_gate_max_merge or chunk_number == total_chunks:
+            return chunk_text, gate_info
+        _held_chunks[session_id] = (chunk_text, held_count + 1)
+        gate_info["held"] = True
+        print(f"   ⏭️ Chunk {chunk_number} scored {score:.2f}, holding it for the next chunk")
+        return None, gate_info
+    if not judged:
+        # Too few words to judge (e.g. a short reply), keep it to be safe
+        return chunk_text, gate_info
+    gate_info["skipped"] = True
+    print(f"   ⏭️ Chunk {chunk_number} scored {score:.2f}, skipping the AI call")
+    return None, gate_info
+
+
+def has_held_chunk(session_id=None):
+    """True if gate_chunk holds back text of the session that flush_held_chunk would send."""
+    return session_id in _held_chunks
+
+
+def _pop_held_chunk(session_id=None):
+    """Take the text gate_chunk holds back for a session, with the gate details it is sent with."""
+    held_text, held_count = _held_chunks.pop(session_id, ("", 0))
+    return held_text, {"merged_chunks": held_count, "flushed": True}
+
+
+def flush_held_chunk(chunk_number, total_chunks, df, survey_data, on_answer=None, session_id=None):
+    """
+    Send the text gate_chunk still holds back once the last chunk of a transcript was processed.
+    
+    Needed when chunks stream in and the total was not known while they were gated;
+    does nothing if no text is held back. The text is sent and logged as one more chunk
+    after the last one, so callers check has_held_chunk first and count it in the total.
+    
+    Args:
+        chunk_number (int): Number the held-back text is logged under (one past the last chunk)
+        total_chunks: Total number of chunks, or "?" if it is not known yet
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        survey_data: Survey data for formatting questions
+        on_answer (callable): Called with (answer, df) for every answer applied while streaming
+        session_id (str): Session or run ID whose answers are read and updated
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with the answers from the held-back text
+    """
+    held_text, gate_info = _pop_held_chunk(session_id)
+    if not held_text:
+        return df
+    print(f"   ↩️ Sending the last {gate_info['merged_chunks']} held-back chunk(s) of the transcript")
+    return process_single_chunk(held_text, chunk_number, total_chunks, df, survey_data, on_answer, session_id,
+                                gate_info=gate_info)
+
+
+def _log_gated_chunk(chunk_number, total_chunks, gate_info, session_id=None):
+    """Log a chunk that was skipped or held back by gate_chunk, without an AI call."""
+    row = {
+        "run_id": _chunk_run_id(chunk_number, total_chunks),
+        "session_id": session_id,
+        "rtt": 0.0,
+        "retry": 0}
+    row.update(gate_info)
+    log_chunk(row)
+    observe_chunk(session_id, chunk_number, row)
+
+
+def apply_chunk_result(result, chunk_number, total_chunks, ai_duration, total_tokens, df, call_info=None, answers_applied=False, session_id=None, applied_changed_ids=None):
+    """
+    Store the answers of a processed chunk and log its performance.
+    
+    Args:
+        result (tuple): Output of process_ai_response, or None if processing failed
+        chunk_number (int): Current chunk number (1-indexed)
+        total_chunks (int): Total number of chunks, or "?" while chunks are still streaming in
+        ai_duration (float): Seconds spent waiting for the AI response
+        total_tokens (int): Tokens used by the AI call, or None if unknown
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        call_info (dict): Per-call details collected during the chunk, such as cache hits
+        answers_applied (bool): True if the answers were already stored while streaming
+        session_id (str): Session or run ID the answers belong to
+        applied_changed_ids (list): Question IDs whose answer changed while streaming (with answers_applied)
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with new answers from this chunk
+    """
+    retry = 0
     if result is not None:
         new_answers, retry = result
+        changed = len(applied_changed_ids or [])
         if new_answers:
-            update_answers_file(new_answers, "ai")
-            df = update_answers_dataframe(df, new_answers, "ai")
-            print(f"   ✅ Chunk {chunk_number} added {len(new_answers)} new/updated answers")
+            if not answers_applied:
+                update_answers_file(new_answers, "ai", session_id)
+                df, changed_ids = apply_answers_batch(df, new_answers, "ai")
+                changed = len(changed_ids)
+                print(f"   ✅ Chunk {chunk_number} added {len(new_answers)} new/updated answers ({changed} changed)")
+            else:
+                print(f"   ✅ Chunk {chunk_number} added {len(new_answers)} new/updated answers ({changed} changed)")
         else:
             print(f"   ℹ️ Chunk {chunk_number} produced no new answers")
+        _record_answer_changes(session_id, changed)
     else:
         print(f"   ❌ Chunk {chunk_number} failed to process after retries")
-        new_answers = []
         retry = 3  # Max retries reached
     
-    run_id = f"S{n_sentences}_O{n_overlap}_{chunk_number}_{total_chunks}"
-
     row = {
-        "run_id": run_id,
+        "run_id": _chunk_run_id(chunk_number, total_chunks),
+        "session_id": session_id,
         "rtt": round(ai_duration, 1),
         "retry": retry}
     
@@ -110,10 +448,250 @@ def process_single_chunk(chunk_text, chunk_number, total_chunks, df, survey_data
     if total_tokens is not None:
         row["total_tokens"] = total_tokens
     
+    # Response cache hit/miss counters for this chunk
+    if call_info:
+        row.update(call_info)
+    
     log_chunk(row)
+    observe_chunk(session_id, chunk_number, row)
+
+    return df
+
+
+def process_single_chunk(chunk_text, chunk_number, total_chunks, df, survey_data, on_answer=None, session_id=None, gate_info=None):
+    """
+    Process a single chunk of transcript text.
+    
+    Args:
+        chunk_text (str): The transcript chunk to process
+        chunk_number (int): Current chunk number (1-indexed)
+        total_chunks (int): Total number of chunks, or "?" while chunks are still streaming in
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        survey_data: Survey data for formatting questions
+        on_answer (callable): Called with (answer, df) for every answer applied while streaming
+        session_id (str): Session or run ID whose answers are read and updated
+        gate_info (dict): Gate details of text that already passed gate_chunk; the chunk is neither
+            gated again nor skipped as saturated
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with new answers from this chunk
+    """
+    # Import here to get the current dynamic values
+    from .config import stream_responses
+
+    print(f"\n📄 Processing chunk {chunk_number}/{total_chunks}")
+
+    previous_answers = load_previous_answers(session_id)
+    skipped, saturated = _saturated_chunk(chunk_number, total_chunks, survey_data, previous_answers, session_id,
+                                          can_skip=gate_info is None)
+    if skipped:
+        chunk_text, gate_info = _skip_saturated_chunk(chunk_number, total_chunks, saturated, session_id)
+        if chunk_text is None:
+            return df
+        saturated = None
+
+    if gate_info is None:
+        chunk_text, gate_info = gate_chunk(chunk_text, chunk_number, survey_data, session_id, total_chunks)
+        if chunk_text is None:
+            _log_gated_chunk(chunk_number, total_chunks, gate_info, session_id)
+            return df
+
+    call_info = dict(gate_info)
+    if saturated:
+        call_info["saturated"] = saturated
+    prompt, question_ids, reask_prompt = prepare_chunk_prompt(chunk_text, survey_data, previous_answers, call_info, bool(saturated))
+    if prompt is None:
+        return df
+    # Answers to human-edited questions are dropped; the stable-prefix layout still lists them
+    excluded_ids = get_human_edited_ids(survey_data, previous_answers)
+
+    if stream_responses:
+        return _process_chunk_streaming(prompt, chunk_text, chunk_number, total_chunks, df, survey_data, on_answer, call_info, session_id,
+                                        question_ids, reask_prompt, excluded_ids)
+    
+    # Get AI response for this chunk
+    ai_start = time.time()
+    response_text, total_tokens = get_ai_response(prompt, call_info=call_info)
+    ai_duration = time.time() - ai_start
+    print(f"   🤖 Chunk {chunk_number} AI response received in {ai_duration:.2f}s")
+    
+    # Process response and update tracking for this chunk
+    result = process_ai_response(response_text, prompt, call_info, survey_data, chunk_text, question_ids, reask_prompt, excluded_ids)
+    return apply_chunk_result(result, chunk_number, total_chunks, ai_duration, total_tokens, df, call_info, session_id=session_id)
+
+
+def _process_chunk_streaming(prompt, chunk_text, chunk_number, total_chunks, df, survey_data, on_answer=None, call_info=None, session_id=None,
+                             question_ids=None, reask_prompt=None, excluded_ids=None):
+    """
+    Process a chunk with a streamed response, storing each answer as soon as it arrives.
+    
+    Falls back to a regular call when the stream is malformed or cut off.
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with new answers from this chunk
+    """
+    streamed_answers = []
+    changed_ids = set()
+    compiled = get_compiled_survey(survey_data)
+    excluded = set(excluded_ids or [])
+
+    def apply_answer(item):
+        answer, reason = validate_answer(item, compiled.by_id, compiled.option_maps)
+        if answer is None:
+            print(f"   ⚠️ Skipping invalid streamed answer ({reason}): {item}")
+            return
+        if answer["question_id"] in excluded:
+            print(f"   ⚠️ Skipping streamed answer to an excluded question: {item}")
+            return
+        nonlocal df
+        update_answers_file([answer], "ai", session_id)
+        df, answer_changed_ids = apply_answers_batch(df, [answer], "ai")
+        changed_ids.update(answer_changed_ids)
+        streamed_answers.append(answer)
+        if on_answer is not None:
+            on_answer(answer, df)
+
+    if call_info is None:
+        call_info = {}
+    ai_start = time.time()
+    response_text, total_tokens, complete = get_ai_response_streaming(prompt, apply_answer, call_info)
+    ai_duration = time.time() - ai_start
+    print(f"   🤖 Chunk {chunk_number} AI response streamed in {ai_duration:.2f}s")
+
+    if complete:
+        result = (streamed_answers, 0)
+        return apply_chunk_result(result, chunk_number, total_chunks, ai_duration, total_tokens, df, call_info,
+                                  answers_applied=True, session_id=session_id, applied_changed_ids=list(changed_ids))
+
+    # Incomplete or malformed stream: ask again without streaming
+    print(f"   🔁 Chunk {chunk_number} stream was incomplete, retrying without streaming")
+    response_text, retry_tokens = get_ai_response(prompt, use_cache=False, call_info=call_info)
+    ai_duration = time.time() - ai_start
+    if retry_tokens is not None:
+        total_tokens = (total_tokens or 0) + retry_tokens
+    result = process_ai_response(response_text, prompt, call_info, survey_data, chunk_text, question_ids, reask_prompt, excluded_ids)
+    if result is not None:
+        result = (result[0], result[1] + 1)
+    return apply_chunk_result(result, chunk_number, total_chunks, ai_duration, total_tokens, df, call_info, session_id=session_id)
+
+
+# === Concurrent chunk processing ===
+async def _extract_chunk(chunk_text, chunk_number, total_chunks, survey_data, previous_answers, semaphore, gate_info=None, conflict_check=False,
+                         async_client=None):
+    """
+    Send one chunk to the AI once a slot in the semaphore is free.
+    
+    Returns:
+        tuple: (process_ai_response result or None, AI duration in seconds, total tokens or None, call info)
+    """
+    async with semaphore:
+        print(f"\n📄 Dispatching chunk {chunk_number}/{total_chunks}")
+        call_info = dict(gate_info or {})
+        prompt, question_ids, reask_prompt = prepare_chunk_prompt(chunk_text, survey_data, previous_answers, call_info, conflict_check)
+        if prompt is None:
+            return None, 0.0, None, call_info
+
+        ai_start = time.time()
+        try:
+            response_text, total_tokens = await get_ai_response_async(prompt, call_info=call_info, async_client=async_client)
+        except Exception as e:
+            print(f"   ❌ Chunk {chunk_number} AI request failed: {e}")
+            return None, time.time() - ai_start, None, call_info
+        ai_duration = time.time() - ai_start
+        print(f"   🤖 Chunk {chunk_number} AI response received in {ai_duration:.2f}s")
+
+        # Retries inside process_ai_response use the blocking client, keep them off the event loop
+        try:
+            result = await asyncio.to_thread(process_ai_response, response_text, prompt, call_info, survey_data, chunk_text,
+                                             question_ids, reask_prompt, get_human_edited_ids(survey_data, previous_answers))
+        except Exception as e:
+            # A failed retry must not abort the other chunks of the batch
+            print(f"   ❌ Chunk {chunk_number} response processing failed: {e}")
+            return None, ai_duration, total_tokens, call_info
+        return result, ai_duration, total_tokens, call_info
 
+
+async def process_chunks_async(chunks, df, survey_data, max_in_flight=None, start_index=0, session_id=None, end_index=None, total_chunks=None):
+    """
+    Process all chunks concurrently and merge their answers in chunk order.
+    
+    Every chunk is prompted with the answers that existed when the run started.
+    Merging in chunk order means later chunks overwrite earlier ones, the same
+    way they do when chunks are processed one at a time.
+    
+    Args:
+        chunks (list): Transcript chunks to process
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        survey_data: Survey data for formatting questions
+        max_in_flight (int): Maximum number of concurrent API calls (default: config value)
+        start_index (int): Index of the first chunk to process; earlier chunks are skipped
+        session_id (str): Session or run ID whose answers are read and updated
+        end_index (int): Index after the last chunk to process (default: all remaining chunks)
+        total_chunks: Total number of chunks for the log, or "?" while chunks are still
+            streaming in (default: len(chunks))
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with new answers from all chunks
+    """
+    if max_in_flight is None:
+        from .config import max_concurrent_chunks
+        max_in_flight = max_concurrent_chunks
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+    previous_answers = load_previous_answers(session_id)
+    if total_chunks is None:
+        total_chunks = len(chunks)
+
+    # Gate the chunks in order first, so held-back text reaches the right next chunk;
+    # saturation is judged from the answers the batch starts with
+    sent = []
+    for i in range(start_index, len(chunks) if end_index is None else end_index):
+        skipped, saturated = _saturated_chunk(i + 1, total_chunks, survey_data, previous_answers, session_id)
+        if skipped:
+            chunk_text, gate_info = _skip_saturated_chunk(i + 1, total_chunks, saturated, session_id)
+            if chunk_text is not None:
+                sent.append((i, chunk_text, gate_info, False))
+            continue
+        chunk_text, gate_info = gate_chunk(chunks[i], i + 1, survey_data, session_id, total_chunks)
+        if chunk_text is None:
+            _log_gated_chunk(i + 1, total_chunks, gate_info, session_id)
+            continue
+        if saturated:
+            gate_info["saturated"] = saturated
+        sent.append((i, chunk_text, gate_info, bool(saturated)))
+
+    # One client per call: its connection pool is bound to this event loop
+    async with new_async_client() as async_client:
+        results = await asyncio.gather(*[
+            _extract_chunk(chunk_text, i + 1, total_chunks, survey_data, previous_answers, semaphore, gate_info, conflict_check,
+                           async_client)
+            for i, chunk_text, gate_info, conflict_check in sent
+        ])
+
+    for (i, _, _, _), (result, ai_duration, total_tokens, call_info) in zip(sent, results):
+        df = apply_chunk_result(result, i + 1, total_chunks, ai_duration, total_tokens, df, call_info, session_id=session_id)
     return df
 
+
+def process_chunks_concurrently(chunks, df, survey_data, max_in_flight=None, start_index=0, session_id=None, end_index=None, total_chunks=None):
+    """
+    Blocking entry point for process_chunks_async, usable from scripts and Streamlit.
+    
+    Args:
+        chunks (list): Transcript chunks to process
+        df (pd.DataFrame): DataFrame with survey questions and answer columns
+        survey_data: Survey data for formatting questions
+        max_in_flight (int): Maximum number of concurrent API calls (default: config value)
+        start_index (int): Index of the first chunk to process; earlier chunks are skipped
+        session_id (str): Session or run ID whose answers are read and updated
+        end_index (int): Index after the last chunk to process (default: all remaining chunks)
+        total_chunks: Total number of chunks for the log, or "?" while chunks are still
+            streaming in (default: len(chunks))
+    
+    Returns:
+        pd.DataFrame: Updated DataFrame with new answers from all chunks
+    """
+    return asyncio.run(process_chunks_async(chunks, df, survey_data, max_in_flight, start_index, session_id, end_index, total_chunks))
+
 # Example code to run the functions
 # survey_questions, df = prepare_survey("survey_1")
 # df = process_recording("recording3", survey_questions, df)
\ No newline at end of file
@@ -1,3 +1,65 @@
+# === Token estimation ===
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in a text without calling a tokenizer.
+    
+    Uses the common rule of thumb of about four characters per token.
+    
+    Args:
+        text (str): Any text
+        
+    Returns:
+        int: Estimated token count
+    """
+    return (len(text) + 3) // 4
+
+
+# === Previous answers context ===
+def format_previous_answers(previous_answers, question_ids=None, token_budget=None):
+    """
+    Format previous AI answers for a follow-up prompt, within a token budget.
+    
+    Only answers to the given questions are included. When they do not all fit,
+    the most recently updated answers are kept.
+    
+    Args:
+        previous_answers (dict): Previous answers keyed by question ID
+        question_ids (list): Only include answers to these questions (default: all)
+        token_budget (int): Maximum estimated tokens for the whole context (default: no limit)
+        
+    Returns:
+        tuple: (formatted previous answers, estimated tokens used)
+    """
+    if question_ids is not None:
+        question_ids = {str(qid) for qid in question_ids}
+    
+    lines = {}
+    for qid, answer_data in previous_answers.items():
+        if answer_data['source'] != "ai":
+            continue
+        if question_ids is not None and str(qid) not in question_ids:
+            continue
+        line = f"{qid}: {answer_data['answer']} (certainty: {answer_data['certainty']})"
+        if answer_data['text field']:
+            line += f" - \"{answer_data['text field']}\""
+        lines[qid] = line + "\n"
+    
+    # Fill the budget with the most recently updated answers first
+    newest_first = sorted(lines, key=lambda qid: previous_answers[qid].get('last_updated', ''), reverse=True)
+    kept = set()
+    tokens_used = 0
+    for qid in newest_first:
+        line_tokens = estimate_tokens(lines[qid])
+        if token_budget is not None and tokens_used + line_tokens > token_budget:
+            continue
+        kept.add(qid)
+        tokens_used += line_tokens
+    
+    # Keep the original question order in the prompt
+    previous_answers_str = "".join(line for qid, line in lines.items() if qid in kept)
+    return previous_answers_str, tokens_used
+
+
 
 # === Prompts creation ===
 def create_prompt_without_answers(survey_questions, transcript):
@@ -103,4 +165,140 @@ output example:
     "text field": ""
   }}
 ]
-"""
\ No newline at end of file
+"""
+
+def create_conflict_check_prompt(answered_questions, previous_answers, transcript):
+    """
+    Create a short prompt that only rechecks existing answers against a new transcript.
+    
+    Used once the survey is saturated: unanswered questions are left out, so the model
+    can only correct or extend what is already answered.
+    
+    Args:
+        answered_questions (str): Formatted survey questions that have an AI answer
+        previous_answers (str): Previous answers formatted as string
+        transcript (str): New interview transcript
+    
+    Returns:
+        str: Complete prompt
+    """
+    return f"""The following transcript is a later part of an interview between a social worker and a youth participant interested in participating in the leaving care program. The survey questions below have already been answered (see PREVIOUS ANSWERS). Only check whether the new transcript conflicts with or adds to these answers.
+
+- If the new transcript contains conflicting information, update the previous answer according to the current transcript.
+- If the new transcript contains additional/new information, update the previous answer by adding the new information while keeping the previous answer.
+- Otherwise, do not output the question.
+
+important:
+- Answers to single or multiple choice questions should be in a list, using the listed options.
+- Output ONLY the updated answers, with question_id, answer, certainty (low, medium, high) and text field.
+- If nothing needs to be updated, output an empty array [].
+- Do not make up information, follow the transcript.
+- Format your response as a JSON array, nothing else.
+
+SURVEY QUESTIONS:
+{answered_questions}
+
+PREVIOUS ANSWERS:
+{previous_answers}
+
+NEW TRANSCRIPT:
+{transcript}
+"""
+
+# === Stable-prefix prompts ===
+def create_stable_prompt_prefix(survey_questions):
+    """
+    Create the static part of a stable-prefix prompt.
+    
+    The prefix only depends on the full survey, so it is byte-identical for every
+    chunk of an interview and can be served from the provider's prompt cache.
+    
+    Args:
+        survey_questions (str): All survey questions, formatted without human-edit exclusions
+        
+    Returns:
+        str: Prompt prefix
+    """
+    return f"""The following transcript is an interview between a social worker and a youth participant interested in participating in the leaving care program. You are provided with the survey (see SURVEY QUESTIONS). The survey may have been partially answered before (see PREVIOUS ANSWERS) based on earlier parts of the interview. You will fill out or update the answers to the survey based on the new transcript.
+
+Here is the structure to answer a question:
+1. Answer: Base the answer according to the guidance provided in the parentheses. For text questions, try to cover all the relavant information for this question.
+2. Certainty (low, medium, high)
+3. Text field: All single/multiple choice questions must have a concise text reasoning, but make sure you cover all the relevant information related to the question. If not choice-based, leave blank.
+
+If there are previous answers, first recheck them against the new transcript to detect any potential conflicts or new information.
+- If the new transcript contains conflicting information, update the previous answer according to the current transcript. 
+- If the new transcript contains additional/new information, update the previous answer by adding the new information while keeping the previous answer.
+- If the new answer is similar to the previous answer, no need to update.
+
+Then, find answers in the new transcript for questions not answered previously:
+- Only fill out the answer if the transcript has clearly addressed the question.
+
+important:
+- Answers to single or multiple choice questions should be in a list. 
+- Only answer the questions that are clearly addressed in the transcript.
+- Never answer the questions listed under EXCLUDED QUESTIONS.
+- If FOCUS QUESTIONS are listed, only answer those questions.
+- Output ONLY for the updated answers and newly answered questions. 
+- Do not make up information, follow the transcript.
+- Format your response as a JSON array, nothing else.
+
+output example:
+[
+  {{
+    "question_id": "5",
+    "answer": ["housing", "education"],
+    "certainty": "high",
+    "text field": "support in finding an apartment is urgent. Prefer first-hand contract"
+  }},
+  {{
+    "question_id": "10",
+    "answer": "lonely and depressed, having trouble to sleep and hard to find time for friends",
+    "certainty": "medium",
+    "text field": ""
+  }}
+]
+
+SURVEY QUESTIONS:
+{survey_questions}
+"""
+
+def create_stable_prompt_tail(transcript, previous_answers="", excluded_ids=None, focus_ids=None):
+    """
+    Create the per-chunk part of a stable-prefix prompt.
+    
+    Args:
+        transcript (str): New interview transcript
+        previous_answers (str): Previous answers formatted as string
+        excluded_ids (list): Question IDs that must not be answered (e.g. edited by a human)
+        focus_ids (list): Question IDs this chunk is likely to address (default: all questions)
+        
+    Returns:
+        str: Prompt tail
+    """
+    tail = ""
+    if excluded_ids:
+        tail += f"\nEXCLUDED QUESTIONS:\n{', '.join(excluded_ids)}\n"
+    if focus_ids is not None:
+        tail += f"\nFOCUS QUESTIONS:\n{', '.join(focus_ids)}\n"
+    tail += f"\nPREVIOUS ANSWERS:\n{previous_answers or 'None'}\n"
+    tail += f"\nNEW TRANSCRIPT:\n{transcript}\n"
+    return tail
+
+def create_prompt_stable_prefix(survey_questions, transcript, previous_answers="", excluded_ids=None, focus_ids=None):
+    """
+    Create a prompt with a byte-stable prefix and all per-chunk data at the tail.
+    
+    Args:
+        survey_questions (str): All survey questions, formatted without human-edit exclusions
+        transcript (str): New interview transcript
+        previous_answers (str): Previous answers formatted as string
+        excluded_ids (list): Question IDs that must not be answered (e.g. edited by a human)
+        focus_ids (list): Question IDs this chunk is likely to address (default: all questions)
+        
+    Returns:
+        str: Complete prompt
+    """
+    return create_stable_prompt_prefix(survey_questions) + create_stable_prompt_tail(
+        transcript, previous_answers, excluded_ids, focus_ids
+    )
@@ -0,0 +1,159 @@
+import math
+import re
+from .survey import get_compiled_survey
+
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+SUFFIXES = ("ing", "ies", "ed", "es", "ly", "s")
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "all", "any", "can", "had", "her", "was",
+    "one", "our", "out", "has", "have", "him", "his", "how", "its", "may", "who", "did", "yes",
+    "get", "got", "what", "when", "where", "which", "with", "would", "could", "should", "that",
+    "this", "there", "their", "they", "them", "then", "than", "from", "into", "about", "your",
+    "yours", "does", "been", "being", "were", "will", "just", "like", "some", "other",
+    "more", "very", "also", "know", "think", "yeah", "okay", "well", "really", "thing", "person",
+    "participant", "question", "answer", "describe", "please", "want",
+}
+
+# === Relevance index ===
+def _stem(word):
+    """Strip a common English suffix so that e.g. 'apartments' matches 'apartment'."""
+    for suffix in SUFFIXES:
+        if len(word) - len(suffix) >= 4 and word.endswith(suffix):
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text):
+    """
+    Split text into normalised content terms.
+    
+    Args:
+        text (str): Any text
+    
+    Returns:
+        set: Lowercase, stemmed terms without stopwords
+    """
+    terms = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        if len(word) >= 3 and word not in STOPWORDS:
+            terms.add(_stem(word))
+    return terms
+
+
+def build_relevance_index(survey_data):
+    """
+    Build a lexical index of the survey from question text, field tag and options.
+    
+    Args:
+        survey_data (list): List of survey questions
+    
+    Returns:
+        dict: {"terms": {question ID: set of terms}, "idf": {term: weight}}
+    """
+    terms = {}
+    document_frequency = {}
+    for question in survey_data:
+        question_terms = tokenize(" ".join([question["question"], question["field"]] + question["options"]))
+        terms[question["id"]] = question_terms
+        for term in question_terms:
+            document_frequency[term] = document_frequency.get(term, 0) + 1
+
+    total = max(1, len(survey_data))
+    idf = {term: math.log(1 + total / count) for term, count in document_frequency.items()}
+    return {"terms": terms, "idf": idf}
+
+
+def get_relevance_index(survey_data):
+    """
+    Get the relevance index for a survey, building it on first use.
+    
+    The index is kept on the compiled survey, so it lives as long as the survey's
+    compiled form; question lists without one get a fresh index every call.
+    
+    Args:
+        survey_data (list): List of survey questions
+    
+    Returns:
+        dict: Relevance index from build_relevance_index
+    """
+    compiled = get_compiled_survey(survey_data)
+    if compiled.relevance_index is None:
+        compiled.relevance_index = build_relevance_index(survey_data)
+    return compiled.relevance_index
+
+
+def score_questions(index, chunk_text):
+    """
+    Score every question against a transcript chunk.
+    
+    The score is the IDF-weighted share of a question's terms that appear in the chunk.
+    
+    Args:
+        index (dict): Relevance index from build_relevance_index
+        chunk_text (str): The transcript chunk
+    
+    Returns:
+        dict: Score between 0 and 1 per question ID
+    """
+    chunk_terms = tokenize(chunk_text)
+    idf = index["idf"]
+    scores = {}
+    for qid, question_terms in index["terms"].items():
+        total_weight = sum(idf[term] for term in question_terms)
+        matched_weight = sum(idf[term] for term in question_terms & chunk_terms)
+        scores[qid] = matched_weight / total_weight if total_weight else 0.0
+    return scores
+
+
+def select_relevant_questions(survey_data, chunk_text, min_score=0.15, min_questions=5, min_terms=3):
+    """
+    Select the questions a transcript chunk is likely to address.
+    
+    Recall comes first: a question is kept whenever the index cannot judge it.
+    That is the case for questions with fewer than min_terms indexable terms and,
+    when the chunk itself has fewer than min_terms content terms, for every question.
+    The min_questions best-scoring questions are always kept.
+    
+    Args:
+        survey_data (list): List of survey questions
+        chunk_text (str): The transcript chunk
+        min_score (float): Minimum relevance score for a question to be kept
+        min_questions (int): Number of top-scoring questions always kept
+        min_terms (int): Minimum number of terms needed to trust a score
+    
+    Returns:
+        list: Selected question IDs in survey order
+    """
+    if len(tokenize(chunk_text)) < min_terms:
+        return [question["id"] for question in survey_data]
+
+    index = get_relevance_index(survey_data)
+    scores = score_questions(index, chunk_text)
+    top_ids = set(sorted(scores, key=scores.get, reverse=True)[:min_questions])
+    return [
+        question["id"] for question in survey_data
+        if scores[question["id"]] >= min_score
+        or len(index["terms"][question["id"]]) < min_terms
+        or question["id"] in top_ids
+    ]
+
+
+def score_chunk(survey_data, chunk_text, min_terms=3):
+    """
+    Score how much a transcript chunk is about the survey at all.
+    
+    The score is the best question score from score_questions, so small talk that shares
+    no terms with any question, field or option scores 0.
+    
+    Args:
+        survey_data (list): List of survey questions
+        chunk_text (str): The transcript chunk
+        min_terms (int): Minimum number of content terms needed to trust the score
+    
+    Returns:
+        tuple: (score between 0 and 1, False if the chunk has too few terms to be judged)
+    """
+    if len(tokenize(chunk_text)) < min_terms:
+        return 0.0, False
+    scores = score_questions(get_relevance_index(survey_data), chunk_text)
+    return max(scores.values(), default=0.0), True
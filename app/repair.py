@@ -0,0 +1,213 @@
+import json
+import re
+from .survey import get_compiled_survey
+
+CERTAINTY_LEVELS = ("low", "medium", "high")
+CHOICE_TYPES = ("single choice", "multiple choice")
+FENCE_PATTERN = re.compile(r"```[a-zA-Z]*")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+QUESTION_ID_PATTERN = re.compile(r'"question_id"\s*:\s*"?([^",}\s]+)')
+
+# === Local JSON recovery ===
+def extract_array_text(response_text):
+    """
+    Strip code fences and prose around the JSON array in a response.
+    
+    Args:
+        response_text (str): Raw response from AI
+    
+    Returns:
+        str: Text from the opening bracket onwards, or None if the response has no JSON at all.
+            Anything after the closing bracket is ignored by split_array_items.
+    """
+    text = FENCE_PATTERN.sub("", response_text or "")
+    start = text.find("[")
+    if start == -1:
+        # A bare object or a list of objects without brackets
+        start = text.find("{")
+        if start == -1:
+            return None
+        return "[" + text[start:]
+    return text[start:]
+
+
+def split_array_items(array_text):
+    """
+    Split a JSON array into the raw text of its top-level objects.
+    
+    Args:
+        array_text (str): Text starting with the opening bracket of the array
+    
+    Returns:
+        tuple: (list of raw object strings, text of a trailing object cut off mid-way or "")
+    """
+    items = []
+    depth = 0
+    in_string = False
+    escape = False
+    item_start = None
+    for i, ch in enumerate(array_text[1:], start=1):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                item_start = i
+            depth += 1
+        elif ch == "[":
+            depth += 1
+        elif ch in "}]":
+            if depth == 0:
+                break  # closing bracket of the array itself
+            depth -= 1
+            if depth == 0 and ch == "}":
+                items.append(array_text[item_start:i + 1])
+                item_start = None
+    truncated = array_text[item_start:] if item_start is not None else ""
+    return items, truncated
+
+
+def parse_item(raw_item):
+    """
+    Parse one answer object, fixing trailing commas if needed.
+    
+    Args:
+        raw_item (str): Raw text of a single JSON object
+    
+    Returns:
+        dict: Parsed object, or None if it cannot be repaired
+    """
+    for candidate in (raw_item, TRAILING_COMMA_PATTERN.sub(r"\1", raw_item)):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def recover_answers(response_text):
+    """
+    Salvage as many answer objects as possible from a malformed response.
+    
+    Args:
+        response_text (str): Raw response from AI
+    
+    Returns:
+        tuple: (list of parsed objects, list of question IDs whose objects could not be parsed,
+            True if some content was lost without a recognisable question ID)
+    """
+    array_text = extract_array_text(response_text)
+    if array_text is None:
+        return [], [], True
+
+    raw_items, truncated = split_array_items(array_text)
+    items = []
+    unparsed = []
+    for raw_item in raw_items:
+        item = parse_item(raw_item)
+        if item is not None:
+            items.append(item)
+        else:
+            unparsed.append(raw_item)
+    # An object cut off mid-way is never completed locally: a partial answer is worse than none
+    if truncated:
+        unparsed.append(truncated)
+
+    failed_ids = []
+    lost = False
+    for raw_item in unparsed:
+        match = QUESTION_ID_PATTERN.search(raw_item)
+        if match:
+            failed_ids.append(match.group(1))
+        else:
+            lost = True
+    return items, failed_ids, lost
+
+
+# === Schema validation ===
+def _match_option(value, options, option_map=None):
+    """Return the survey option matching value, ignoring case and surrounding spaces."""
+    wanted = str(value).strip().lower()
+    if option_map is not None:
+        return option_map.get(wanted)
+    for option in options:
+        if option.strip().lower() == wanted:
+            return option
+    return None
+
+
+def validate_answer(item, questions_by_id, option_maps=None):
+    """
+    Check an answer object against the survey and normalise it.
+    
+    Args:
+        item: Parsed answer object
+        questions_by_id (dict): Survey question objects keyed by question ID string
+        option_maps (dict): Lowercase option -> option maps keyed by question ID (default: scan the options)
+    
+    Returns:
+        tuple: (normalised answer dict or None, reason string if invalid)
+    """
+    if not isinstance(item, dict):
+        return None, "not an object"
+    qid = str(item.get("question_id", "")).strip()
+    question = questions_by_id.get(qid)
+    if question is None:
+        return None, f"unknown question_id {qid!r}"
+    if "answer" not in item:
+        return None, "missing answer"
+
+    certainty = str(item.get("certainty", "")).strip().lower()
+    if certainty not in CERTAINTY_LEVELS:
+        return None, f"invalid certainty {item.get('certainty')!r}"
+
+    answer = item["answer"]
+    if question["type"] in CHOICE_TYPES and question["options"] != [""]:
+        selections = answer if isinstance(answer, list) else [answer]
+        option_map = option_maps.get(qid) if option_maps is not None else None
+        matched = [_match_option(value, question["options"], option_map) for value in selections]
+        if None in matched:
+            return None, f"answer not in options for question {qid}"
+        if question["type"] == "single choice" and len(matched) > 1:
+            return None, f"several answers for single choice question {qid}"
+        answer = matched
+
+    return {
+        "question_id": qid,
+        "answer": answer,
+        "certainty": certainty,
+        "text field": item.get("text field") or ""
+    }, None
+
+
+def validate_answers(items, survey_data):
+    """
+    Validate a list of answer objects against the survey.
+    
+    Args:
+        items (list): Parsed answer objects
+        survey_data (list): Survey question objects
+    
+    Returns:
+        tuple: (list of valid normalised answers, list of question IDs with invalid answers)
+    """
+    compiled = get_compiled_survey(survey_data)
+    questions_by_id = compiled.by_id
+    valid = []
+    failed_ids = []
+    for item in items:
+        answer, reason = validate_answer(item, questions_by_id, compiled.option_maps)
+        if answer is not None:
+            valid.append(answer)
+            continue
+        print(f"   ⚠️ Invalid answer dropped ({reason}): {item}")
+        qid = str(item.get("question_id", "")).strip() if isinstance(item, dict) else ""
+        if qid in questions_by_id:
+            failed_ids.append(qid)
+    return valid, failed_ids
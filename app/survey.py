@@ -1,91 +1,297 @@
 import pandas as pd
+import hashlib
 import json
+import os
+import pickle
 from pathlib import Path
 import streamlit as st
+from .survey_state import use_categorical_columns
+
+COMPILED_SURVEY_DIR = "data/surveys/compiled"
+# Bump when CompiledSurvey changes so old pickles are rebuilt instead of loaded
+COMPILED_SURVEY_VERSION = 2
+
+# Compiled surveys keyed by workbook hash, and by id(survey_data) for lookups from the question list
+_compiled_by_hash = {}
+_compiled_by_list = {}
+# Content hash of the workbook each survey JSON file was last written from
+_json_written_from = {}
+
+# === Compiled survey ===
+class CompiledSurvey:
+    """
+    Everything derived from a survey workbook that does not change between sessions.
+    
+    Holds the question list, an empty answer DataFrame, ID and option lookup
+    maps and the pre-rendered prompt line of every question, so prompts are
+    assembled by joining cached fragments.
+    """
+
+    def __init__(self, survey, df):
+        """
+        Args:
+            survey (list): Survey questions in JSON format
+            df (pd.DataFrame): DataFrame with survey and (empty) answer columns
+        """
+        self.survey = survey
+        self.df = df
+        self.ids = [question["id"] for question in survey]
+        self.by_id = {question["id"]: question for question in survey}
+        # DataFrame index values (and list_human_edit entries) are numeric, prompt IDs are strings
+        self.id_by_number = {}
+        for qid in self.ids:
+            try:
+                self.id_by_number[float(qid)] = qid
+            except ValueError:
+                pass
+        self.option_maps = {
+            question["id"]: {option.strip().lower(): option for option in question["options"]}
+            for question in survey
+        }
+        self.prompt_lines = {question["id"]: _format_question_line(question) for question in survey}
+        # Lexical relevance index, built on first use by app.relevance
+        self.relevance_index = None
+
+
+def _format_question_line(question):
+    """Render the prompt line of a single question."""
+    line = f"{question['id']}: [{question['field']}] {question['question']} ({question['type']}"
+    if question['options'] != ['']:
+        return line + f": {', '.join(question['options'])})\n"
+    return line + ")\n"
+
+
+def hash_survey_file(file_path):
+    """
+    Compute the SHA-256 content hash of a survey workbook.
+    
+    Args:
+        file_path (str): Path to the Excel file
+    
+    Returns:
+        str: SHA-256 hex digest of the workbook content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def compile_survey(survey, df=None):
+    """
+    Build a compiled survey and register it for lookups by question list.
+    
+    Args:
+        survey (list): Survey questions in JSON format
+        df (pd.DataFrame): DataFrame with survey and answer columns (default: none)
+    
+    Returns:
+        CompiledSurvey: The compiled survey
+    """
+    compiled = CompiledSurvey(survey, df)
+    _compiled_by_list[id(survey)] = compiled
+    return compiled
+
+
+def get_compiled_survey(survey_data):
+    """
+    Get the compiled form of a question list.
+    
+    Surveys loaded by process_survey_excel are looked up; any other list (such as a
+    subset of questions to re-ask) is compiled on the fly without being kept.
+    
+    Args:
+        survey_data (list): List of survey questions
+    
+    Returns:
+        CompiledSurvey: Compiled survey whose question list is survey_data
+    """
+    compiled = _compiled_by_list.get(id(survey_data))
+    if compiled is not None and compiled.survey is survey_data:
+        return compiled
+    return CompiledSurvey(survey_data, None)
+
+
+def _load_compiled_survey(content_hash):
+    """Load a compiled survey from memory or from its pickle, or return None."""
+    compiled = _compiled_by_hash.get(content_hash)
+    if compiled is not None:
+        return compiled
+    path = f"{COMPILED_SURVEY_DIR}/{content_hash}.v{COMPILED_SURVEY_VERSION}.pkl"
+    try:
+        with open(path, "rb") as f:
+            compiled = pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError):
+        return None
+    _compiled_by_list[id(compiled.survey)] = compiled
+    _compiled_by_hash[content_hash] = compiled
+    return compiled
+
+
+def _save_compiled_survey(content_hash, compiled):
+    """Keep a compiled survey in memory and pickle it (written atomically, also across sweep workers)."""
+    _compiled_by_hash[content_hash] = compiled
+    os.makedirs(COMPILED_SURVEY_DIR, exist_ok=True)
+    path = f"{COMPILED_SURVEY_DIR}/{content_hash}.v{COMPILED_SURVEY_VERSION}.pkl"
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _write_survey_json(output_path, survey):
+    """
+    Write the survey JSON unless the file already holds the same content.
+    
+    Parallel sweep workers all prepare the same survey, so the file is written to a
+    per-process temporary file and swapped in atomically; readers never see it half written.
+    """
+    content = json.dumps(survey, indent=2, ensure_ascii=False)
+    try:
+        if output_path.read_text(encoding='utf-8') == content:
+            return
+    except (FileNotFoundError, UnicodeDecodeError):
+        pass
+    tmp_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, output_path)
+
 
 # === Survey Processing ===
 def process_survey_excel(excel_name):
     """
     Process Excel survey file into JSON and DataFrame.
     
+    The workbook is only parsed the first time its content is seen; later uploads
+    of the same file load the compiled survey cached by content hash.
+    
     Args:
         excel_name (str): Name of the Excel file (without extension)
-        
+    
     Returns:
         tuple: (list of survey questions in JSON format, DataFrame with survey and answer columns)
     """
     try:
-        # Read Excel file
-        df = pd.read_excel("data/surveys/"+excel_name+".xlsx", engine="openpyxl")
+        excel_path = "data/surveys/"+excel_name+".xlsx"
+        content_hash = hash_survey_file(excel_path)
+        compiled = _load_compiled_survey(content_hash)
         
-        # Create JSON format
-        survey = []
-        for _, row in df.iterrows():
-            id = str(row["QuestionID"]).strip()
-            question = str(row["Question"]).strip()
-            q_type = str(row["Type"]).strip().lower()
-            field = str(row["Field"]).strip()
-            options = str(row["Options"]).strip() if pd.notna(row["Options"]) else ""
+        if compiled is None:
+            # Read Excel file
+            df = pd.read_excel(excel_path, engine="openpyxl")
             
-            q_obj = {
-                "field": field,
-                "id": id,
-                "question": question,
-                "type": q_type,
-                "options": [opt.strip() for opt in options.split(";")] if options else [""]
-            }
+            # Create JSON format
+            survey = []
+            for row in df[["QuestionID", "Question", "Type", "Field", "Options"]].itertuples(index=False):
+                options = str(row.Options).strip() if pd.notna(row.Options) else ""
+                survey.append({
+                    "field": str(row.Field).strip(),
+                    "id": str(row.QuestionID).strip(),
+                    "question": str(row.Question).strip(),
+                    "type": str(row.Type).strip().lower(),
+                    "options": [opt.strip() for opt in options.split(";")] if options else [""]
+                })
             
-            survey.append(q_obj)
+            # Prepare DataFrame
+            df.set_index('QuestionID', inplace=True)
+            
+            # Add answer-related columns
+            answer_columns = ['answer', 'certainty', 'text_field', 'source', 'last_updated']
+            for col in answer_columns:
+                df[col] = None
+            use_categorical_columns(df)
+            
+            compiled = compile_survey(survey, df)
+            _save_compiled_survey(content_hash, compiled)
+            print(f"Compiled survey {excel_name}.xlsx ({len(survey)} questions)")
+        else:
+            print(f"Loaded compiled survey for {excel_name}.xlsx ({len(compiled.survey)} questions)")
         
-        # Save survey to local JSON file
+        # Save survey to local JSON file, unless it was already written from this workbook content;
+        # a changed workbook uploaded under the same name gets its JSON rewritten
         output_path = Path("data/surveys/"+excel_name).with_suffix('.json')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(survey, f, indent=2, ensure_ascii=False)
+        if _json_written_from.get(str(output_path)) != content_hash or not output_path.exists():
+            _write_survey_json(output_path, compiled.survey)
+            _json_written_from[str(output_path)] = content_hash
         
-        # Prepare DataFrame
-        df.set_index('QuestionID', inplace=True)
-        
-        # Add answer-related columns
-        answer_columns = ['answer', 'certainty', 'text_field', 'source', 'last_updated']
-        for col in answer_columns:
-            df[col] = None
-            
-        return survey, df
+        # Every session gets its own copy of the answer DataFrame
+        return compiled.survey, compiled.df.copy()
         
     except Exception as e:
         print(f"Error processing Excel file: {e}")
         return None, None
 
-def format_survey_questions(survey_data):
+def get_human_edited_ids(survey_data, answers=None):
     """
-    Format survey questions for use in prompts.
+    Get the IDs of questions a human has edited.
     
     Args:
         survey_data (list): List of survey questions
-        
+        answers (dict): Stored answers keyed by question ID; answers with source "human" count
+            as edited, which also works outside the Streamlit script thread
+    
     Returns:
-        str: Formatted survey questions
+        list: Question IDs (as in survey_data) edited by a human
     """
-    questions_text = ""
-    
     # Check if we're in a Streamlit context
     try:
         # Try to access session state - if it fails, we're not in Streamlit
         human_edited_list = st.session_state.get("list_human_edit", [])
     except (AttributeError, RuntimeError):
-        # Not in Streamlit context - include all questions
+        # Not in Streamlit context - no human edits
         human_edited_list = []
     
-    for question in survey_data:
-        # Only include questions that haven't been human-edited
-        # Convert question ID to float to match the data type in list_human_edit
-        question_id_float = float(question['id'])
-        if question_id_float not in human_edited_list:
-            questions_text += f"{question['id']}: [{question['field']}] {question['question']} ({question['type']}"
-            if question['options'] != ['']:
-                questions_text += f": {', '.join(question['options'])})\n"
-            else:
-                questions_text += ")\n"
+    if not human_edited_list and not answers:
+        return []
+    
+    # list_human_edit holds DataFrame index values; map them to question IDs once
+    compiled = get_compiled_survey(survey_data)
+    edited = {compiled.id_by_number.get(float(qid)) for qid in human_edited_list}
+    edited.update(str(qid) for qid, record in (answers or {}).items() if record['source'] == "human")
+    return [qid for qid in compiled.ids if qid in edited]
+
+
+def get_active_question_ids(survey_data, answers=None):
+    """
+    Get the IDs of questions still worth asking about.
+    
+    Questions answered with high certainty or edited by a human leave the active set.
+    
+    Args:
+        survey_data (list): List of survey questions
+        answers (dict): Stored answers keyed by question ID
     
-    return questions_text
+    Returns:
+        list: Active question IDs in survey order
+    """
+    compiled = get_compiled_survey(survey_data)
+    settled = set(get_human_edited_ids(survey_data, answers))
+    settled.update(str(qid) for qid, record in (answers or {}).items() if record['certainty'] == "high")
+    return [qid for qid in compiled.ids if qid not in settled]
+
 
+def format_survey_questions(survey_data, question_ids=None, exclude_human_edited=True, answers=None):
+    """
+    Format survey questions for use in prompts.
+    
+    Args:
+        survey_data (list): List of survey questions
+        question_ids (list): Only include these question IDs (default: all questions)
+        exclude_human_edited (bool): Leave out questions a human has already edited
+        answers (dict): Stored answers, used to find human edits outside the Streamlit session
+    
+    Returns:
+        str: Formatted survey questions
+    """
+    compiled = get_compiled_survey(survey_data)
+    excluded_ids = set(get_human_edited_ids(survey_data, answers)) if exclude_human_edited else set()
+    if question_ids is not None:
+        question_ids = set(question_ids)
+    
+    # Only include questions that haven't been human-edited
+    return "".join(
+        compiled.prompt_lines[qid] for qid in compiled.ids
+        if (question_ids is None or qid in question_ids) and qid not in excluded_ids
+    )
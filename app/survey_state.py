@@ -0,0 +1,180 @@
+import bisect
+import itertools
+import weakref
+import pandas as pd
+
+CERTAINTY_CATEGORIES = ["low", "medium", "high"]
+SOURCE_CATEGORIES = ["ai", "human"]
+
+# Survey states keyed by id(df); the weak reference guards against id reuse without keeping old frames alive
+_states = {}
+# Process-wide source of version stamps, so a stamp identifies one state of one DataFrame's answers
+_versions = itertools.count(1)
+
+# === Survey state ===
+class SurveyState:
+    """
+    Progress counters and ordered answered/unanswered question IDs of a survey DataFrame.
+    
+    Built once from the DataFrame and then updated per answer by update_answers_dataframe,
+    so the progress bar and the question columns never filter or sort the whole frame.
+    """
+
+    def __init__(self, df=None):
+        """
+        Args:
+            df (pd.DataFrame): Survey DataFrame to build the state from (default: empty state)
+        """
+        self.certainty = {}
+        self.counts = {level: 0 for level in CERTAINTY_CATEGORIES}
+        self.counts["unanswered"] = 0
+        self.answered = []
+        self.unanswered = []
+        self.version = next(_versions)
+        if df is not None:
+            for qid, certainty in zip(df.index, df['certainty']):
+                certainty = None if pd.isna(certainty) else certainty
+                self.certainty[qid] = certainty
+                self.counts[certainty or "unanswered"] += 1
+                (self.answered if certainty else self.unanswered).append(qid)
+            self.answered.sort()
+            self.unanswered.sort()
+
+    def update(self, qid, certainty):
+        """
+        Record the new certainty of a question.
+        
+        Args:
+            qid: Question ID as in the DataFrame index
+            certainty (str): New certainty level, or None if the question is unanswered
+        """
+        if qid not in self.certainty:
+            return
+        old = self.certainty[qid]
+        if old == certainty:
+            return
+        self.certainty[qid] = certainty
+        self.counts[old or "unanswered"] -= 1
+        self.counts[certainty or "unanswered"] += 1
+        if bool(old) != bool(certainty):
+            source, target = (self.unanswered, self.answered) if certainty else (self.answered, self.unanswered)
+            del source[bisect.bisect_left(source, qid)]
+            bisect.insort(target, qid)
+
+    def progress_data(self):
+        """
+        Get the distribution of questions by certainty level.
+        
+        Returns:
+            dict: Dictionary with counts and percentages for each certainty level
+        """
+        total_questions = len(self.certainty)
+        progress_data = {'total': total_questions}
+        for level in ("high", "medium", "low", "unanswered"):
+            count = self.counts[level]
+            progress_data[level] = {
+                'count': count,
+                'percentage': (count / total_questions) * 100 if total_questions > 0 else 0
+            }
+        return progress_data
+
+    def copy(self):
+        """Return an independent copy of the state."""
+        state = SurveyState()
+        state.certainty = dict(self.certainty)
+        state.counts = dict(self.counts)
+        state.answered = list(self.answered)
+        state.unanswered = list(self.unanswered)
+        state.version = self.version
+        return state
+
+
+def _registered_state(df):
+    """Return the state registered for this exact DataFrame object, or None."""
+    entry = _states.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return None
+
+
+def _register_state(df, state):
+    """Register a state for a DataFrame and drop the entry when the DataFrame is garbage collected."""
+    key = id(df)
+
+    def forget(ref):
+        # Only drop the entry if it still belongs to the collected DataFrame
+        if _states.get(key, (None,))[0] is ref:
+            del _states[key]
+
+    _states[key] = (weakref.ref(df, forget), state)
+    return state
+
+
+def get_survey_state(df):
+    """
+    Get the survey state of a DataFrame, building it on first use.
+    
+    Args:
+        df (pd.DataFrame): Survey DataFrame
+    
+    Returns:
+        SurveyState: State kept in sync with the DataFrame by update_answers_dataframe
+    """
+    state = _registered_state(df)
+    if state is None:
+        state = _register_state(df, SurveyState(df))
+    return state
+
+
+def update_survey_state(df, qid, certainty):
+    """
+    Update the state of a DataFrame after an answer was written, if it has one.
+    
+    Args:
+        df (pd.DataFrame): Survey DataFrame that was updated
+        qid: Question ID as in the DataFrame index
+        certainty (str): New certainty level of the question
+    """
+    state = _registered_state(df)
+    if state is not None:
+        state.update(qid, certainty)
+
+
+def mark_survey_changed(df):
+    """
+    Give the state of a DataFrame a new version stamp after its answers changed.
+    
+    Args:
+        df (pd.DataFrame): Survey DataFrame that was updated
+    """
+    state = _registered_state(df)
+    if state is not None:
+        state.version = next(_versions)
+
+
+def copy_survey_state(source_df, target_df):
+    """
+    Give a copy of a DataFrame the same state without rebuilding it.
+    
+    Args:
+        source_df (pd.DataFrame): Original DataFrame
+        target_df (pd.DataFrame): Copy of source_df with the same answers
+    """
+    state = _registered_state(source_df)
+    if state is not None:
+        _register_state(target_df, state.copy())
+
+
+def use_categorical_columns(df):
+    """
+    Store the certainty and source columns as categoricals to reduce memory per session.
+    
+    Args:
+        df (pd.DataFrame): Survey DataFrame with answer columns
+    
+    Returns:
+        pd.DataFrame: The same DataFrame with categorical certainty and source columns
+    """
+    df['certainty'] = pd.Categorical(df['certainty'], categories=CERTAINTY_CATEGORIES)
+    df['source'] = pd.Categorical(df['source'], categories=SOURCE_CATEGORIES)
+    return df
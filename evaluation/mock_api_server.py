@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Offline stand-in for the OpenAI chat-completions and transcription endpoints.
+Usage: python mock_api_server.py [port] [speed]
+
+Chat completions are replayed from the LLM response cache (data/cache/llm_responses.sqlite),
+keyed by model and prompt exactly like app/cache.py. Latency is sampled from the recorded
+rtt/total_tokens pairs in evaluation/log_chunks.jsonl, seeded by the request so the same
+prompt always gets the same delay. Transcriptions are replayed from the transcript index
+by the SHA-256 of the uploaded audio.
+
+Point the app at it with:
+    SURVEY_API_BASE_URL=http://127.0.0.1:8765/v1
+
+Examples:
+    python mock_api_server.py              # Port 8765, recorded latency
+    python mock_api_server.py 8765 0.1     # Ten times faster than recorded
+"""
+
+import email
+import email.policy
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app.config
+from app.cache import cache_key, get_cached_response
+from app.audio import lookup_transcript
+from app.prompt import estimate_tokens
+
+# Responses for prompts that were never recorded: no answers
+MISSING_RESPONSE = "[]"
+# Seconds per MB of audio when a transcription has no recorded timing
+TRANSCRIPTION_SECONDS_PER_MB = 2.0
+# Number of recorded calls with the closest total_tokens that a delay is drawn from
+NEAREST_CALLS = 10
+
+
+# === Latency model ===
+class LatencyModel:
+    """
+    Empirical latency of the AI calls recorded in a chunk log.
+    
+    A delay is drawn from the recorded calls whose total_tokens are closest to the
+    replayed response, so long answers keep taking longer than short ones.
+    """
+
+    def __init__(self, log_path="evaluation/log_chunks.jsonl", speed=1.0):
+        """
+        Args:
+            log_path (str): Chunk log written by log_chunk
+            speed (float): Factor applied to every delay (0 = no delay)
+        """
+        self.speed = speed
+        self.calls = []  # (total_tokens, rtt) of real AI calls
+        if os.path.exists(log_path):
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    # Cached, skipped and held chunks made no real call
+                    if row.get("skipped") or row.get("held") or (row.get("cache_hits") and not row.get("cache_misses")):
+                        continue
+                    if row.get("rtt") and row.get("total_tokens"):
+                        self.calls.append((row["total_tokens"], row["rtt"]))
+        self.calls.sort()
+        print(f"⏱️ Latency model built from {len(self.calls)} recorded calls in {log_path}")
+
+    def sample(self, seed, total_tokens=None):
+        """
+        Draw the delay of one call.
+        
+        Args:
+            seed (str): Request key; the same key always gets the same delay
+            total_tokens (int): Tokens of the replayed response, if known
+        
+        Returns:
+            float: Delay in seconds
+        """
+        if not self.calls or not self.speed:
+            return 0.0
+        rng = random.Random(seed)
+        candidates = self.calls
+        if total_tokens:
+            candidates = sorted(self.calls, key=lambda call: abs(call[0] - total_tokens))[:NEAREST_CALLS]
+        return rng.choice(candidates)[1] * self.speed
+
+
+# === Server ===
+class MockApiServer(ThreadingHTTPServer):
+    """HTTP server holding the latency model and the request counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, MockApiHandler)
+        self.latency = latency
+        self.stats = {"chat_calls": 0, "replayed": 0, "missing": 0, "total_tokens": 0,
+                      "transcriptions": 0, "simulated_seconds": 0.0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, **increments):
+        with self.stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def snapshot(self):
+        """Return a copy of the request counters."""
+        with self.stats_lock:
+            return dict(self.stats)
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """Handles the subset of the OpenAI API the app uses."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(self.server.snapshot())
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.endswith("/chat/completions"):
+            self._chat_completion(json.loads(body))
+        elif self.path.endswith("/audio/transcriptions"):
+            self._transcription(body)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def _chat_completion(self, request):
+        prompt = request["messages"][-1]["content"]
+        key = cache_key(request["model"], prompt)
+        cached = get_cached_response(key)
+        if cached is not None:
+            response_text, total_tokens = cached
+            self.server.count(replayed=1)
+        else:
+            response_text = MISSING_RESPONSE
+            total_tokens = None
+            self.server.count(missing=1)
+        prompt_tokens = estimate_tokens(prompt)
+        if not total_tokens:
+            total_tokens = prompt_tokens + estimate_tokens(response_text)
+        completion_tokens = max(0, total_tokens - prompt_tokens)
+        usage = {"prompt_tokens": total_tokens - completion_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": total_tokens}
+
+        delay = self.server.latency.sample(key, total_tokens)
+        self.server.count(chat_calls=1, total_tokens=total_tokens, simulated_seconds=delay)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if request.get("stream"):
+            self._stream_completion(completion_id, request["model"], response_text, usage, delay)
+            return
+        time.sleep(delay)
+        self._send_json({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": response_text},
+                         "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def _stream_completion(self, completion_id, model, response_text, usage, delay):
+        """Send the response as server-sent events spread over the sampled delay."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        pieces = [response_text[i:i + 40] for i in range(0, len(response_text), 40)] or [""]
+
+        def event(choices, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": model, "choices": choices, "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for piece in pieces:
+            time.sleep(delay / len(pieces))
+            event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _transcription(self, body):
+        # Parse the multipart upload with the standard library email parser
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = email.message_from_bytes(header + body, policy=email.policy.default)
+        audio = b""
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                audio = part.get_payload(decode=True) or b""
+        text = lookup_transcript(hashlib.sha256(audio).hexdigest())
+        if text is None:
+            self.server.count(missing=1)
+            text = ""
+        delay = len(audio) / (1024 * 1024) * TRANSCRIPTION_SECONDS_PER_MB * self.server.latency.speed
+        self.server.count(transcriptions=1, simulated_seconds=delay)
+        time.sleep(delay)
+        self._send_json({"text": text})
+
+
+def start_mock_server(port=0, speed=1.0, log_path="evaluation/log_chunks.jsonl"):
+    """
+    Start the mock API server in a background thread.
+    
+    Args:
+        port (int): Port to listen on (0 = any free port)
+        speed (float): Factor applied to every sampled delay
+        log_path (str): Chunk log the latency model is built from
+    
+    Returns:
+        MockApiServer: Running server; its base URL is http://127.0.0.1:<server_port>/v1
+    """
+    # Replay every recording, however old
+    app.config.llm_cache_max_age_days = 365 * 100
+    server = MockApiServer(("127.0.0.1", port), LatencyModel(log_path, speed))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) >= 2 else 8765
+    speed = float(sys.argv[2]) if len(sys.argv) >= 3 else 1.0
+    server = start_mock_server(port, speed)
+    print(f"🧪 Mock API listening on http://127.0.0.1:{server.server_port}/v1 (speed x{speed})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
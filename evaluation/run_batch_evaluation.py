@@ -1,54 +1,130 @@
 #!/usr/bin/env python3
 """
 Batch evaluation script to run all parameter combinations automatically.
+Usage: python run_batch_evaluation.py [rounds] [workers] [max_concurrent] [use_cache]
+
+Configurations run in parallel worker processes. Each run gets its own answer store
+session and its own log directory under evaluation/sweeps/<sweep_id>/, so runs never
+share answers or chunk logs. All result rows are collected in
+evaluation/evaluation_results.jsonl.
+
+Examples:
+    python run_batch_evaluation.py              # 1 round, 4 workers, sequential chunks per run
+    python run_batch_evaluation.py 3 8          # 3 rounds of every combination on 8 workers
+    python run_batch_evaluation.py 3 8 2 on     # 2 concurrent chunks per run, reuse cached AI responses
 """
 
-import subprocess
+import json
+import os
+import shutil
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from datetime import datetime
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app.config
+from app.main_workflow import prepare_survey
+from run_evaluation import run_evaluation
 
 # Parameter combinations
 n_sentences_list = [20, 16, 12, 8, 4]
 n_overlap_list = [0, 2, 4]
 
-def run_batch_evaluation():
-    # Calculate total evaluations excluding skipped ones
-    total_evaluations = 0
-    for n_sentences in n_sentences_list:
-        for n_overlap in n_overlap_list:
-            if n_sentences != n_overlap:  # Count only non-skipped evaluations
-                total_evaluations += 1
+transcript_path = r"C:\LocalFiles\surveytool\data\recordings\transcripts\recording_20250719_2342.txt"
+survey_path = r"C:\LocalFiles\surveytool\test_files\survey_2_evalution.xlsx"
+
+
+def _run_configuration(task):
+    """
+    Run one configuration in a worker process, with its own answers and log directory.
     
-    current_evaluation = 0
+    Args:
+        task (tuple): (n_sentences, n_overlap, round_number, sweep_id, transcript_path, survey_path, max_concurrent, use_cache)
     
-    print(f"🚀 Starting batch evaluation with {total_evaluations} parameter combinations")
+    Returns:
+        tuple: (run name, session ID, result row from run_evaluation or None)
+    """
+    n_sentences, n_overlap, round_number, sweep_id, transcript, survey, max_concurrent, use_cache = task
+    name = f"S{n_sentences}_O{n_overlap}_R{round_number}"
+    session_id = f"sweep_{sweep_id}_{name}"
+    log_dir = os.path.join("evaluation", "sweeps", sweep_id, name)
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Repeated rounds measure the API, not the response cache
+    app.config.llm_cache_enabled = use_cache
+    with open(os.path.join(log_dir, "run.log"), "w", encoding="utf-8") as log_file, redirect_stdout(log_file):
+        result = run_evaluation(transcript, survey, n_sentences, n_overlap, max_concurrent,
+                                session_id=session_id, log_dir=log_dir)
+    return name, session_id, result
+
+
+def _prepare_shared_survey(survey_file):
+    """Copy and compile the survey once, so worker processes only read it."""
+    survey_filename = os.path.basename(survey_file)
+    target_path = os.path.join("data", "surveys", survey_filename)
+    if survey_file != target_path:
+        os.makedirs("data/surveys", exist_ok=True)
+        shutil.copy2(survey_file, target_path)
+    survey_data, _ = prepare_survey(os.path.splitext(survey_filename)[0])
+    return target_path if survey_data else None
+
+
+def run_batch_evaluation(rounds=1, workers=4, max_concurrent=1, use_cache=False):
+    sweep_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    shared_survey = _prepare_shared_survey(survey_path)
+    if shared_survey is None:
+        print("❌ Failed to prepare survey")
+        return
+
+    tasks = []
+    for round_number in range(1, rounds + 1):
+        for n_sentences in n_sentences_list:
+            for n_overlap in n_overlap_list:
+                # Skip when n_sentences equals n_overlap
+                if n_sentences == n_overlap:
+                    continue
+                tasks.append((n_sentences, n_overlap, round_number, sweep_id, transcript_path,
+                              shared_survey, max_concurrent, use_cache))
+
+    print(f"🚀 Starting sweep {sweep_id}: {len(tasks)} runs ({rounds} rounds) on {workers} workers")
     print("=" * 60)
-    
-    for n_sentences in n_sentences_list:
-        for n_overlap in n_overlap_list:
-            # Skip when n_sentences equals n_overlap
-            if n_sentences == n_overlap:
-                print(f"\n⏭️  Skipping: n_sentences={n_sentences}, n_overlap={n_overlap} (equal values)")
-                continue
-                
-            current_evaluation += 1
-            print(f"\n📊 Evaluation {current_evaluation}/{total_evaluations}: n_sentences={n_sentences}, n_overlap={n_overlap}")
-            print("-" * 40)
-            
-            # Run the evaluation
-            cmd = [sys.executable, "run_evaluation.py", str(n_sentences), str(n_overlap)]
+
+    results_path = os.path.join(app.config.evaluation_log_dir, "evaluation_results.jsonl")
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    start = time.time()
+    completed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_configuration, task): task for task in tasks}
+        for future in as_completed(futures):
+            n_sentences, n_overlap, round_number = futures[future][:3]
+            completed += 1
             try:
-                subprocess.run(cmd, check=True)
-                print(f"✅ Evaluation {current_evaluation} completed successfully")
-            except subprocess.CalledProcessError as e:
-                print(f"❌ Evaluation {current_evaluation} failed with error: {e}")
-            
-            # Small delay between evaluations
-            time.sleep(2)
-    
+                name, session_id, result = future.result()
+            except Exception as e:
+                print(f"❌ [{completed}/{len(tasks)}] S{n_sentences}_O{n_overlap} round {round_number} failed with error: {e}")
+                continue
+            if result is None:
+                print(f"❌ [{completed}/{len(tasks)}] {name} produced no result, see evaluation/sweeps/{sweep_id}/{name}/run.log")
+                continue
+
+            # Only this process writes the shared results store
+            result.update({"sweep_id": sweep_id, "round": round_number, "session_id": session_id})
+            with open(results_path, "a") as f:
+                f.write(json.dumps(result) + "\n")
+            print(f"✅ [{completed}/{len(tasks)}] {name}: accuracy {result.get('Accuracy', 'N/A')}, "
+                  f"rtt trimmed mean {result.get('rtt_trimmed_mean', 'N/A')}s")
+
     print("\n" + "=" * 60)
-    print("🎉 Batch evaluation completed!")
-    print("📈 Check 'evaluation/evaluation_results.jsonl' for all results")
+    print(f"🎉 Batch evaluation completed in {time.time() - start:.0f}s!")
+    print(f"📈 Check '{results_path}' for all results and evaluation/sweeps/{sweep_id}/ for per-run logs")
 
 if __name__ == "__main__":
-    run_batch_evaluation() 
\ No newline at end of file
+    rounds = int(sys.argv[1]) if len(sys.argv) >= 2 else 1
+    workers = int(sys.argv[2]) if len(sys.argv) >= 3 else 4
+    max_concurrent = int(sys.argv[3]) if len(sys.argv) >= 4 else 1
+    use_cache = len(sys.argv) >= 5 and sys.argv[4].lower() == "on"
+    run_batch_evaluation(rounds, workers, max_concurrent, use_cache)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark: runs run_evaluation against the mock API server.
+Usage: python run_benchmark.py [n_sentences] [n_overlap] [max_concurrent] [speed] [save]
+
+AI responses are replayed from the LLM response cache and delayed by latencies sampled
+from evaluation/log_chunks.jsonl (see mock_api_server.py), so runs cost nothing and are
+repeatable. Wall time, calls, tokens and accuracy are compared with the stored baseline
+in evaluation/benchmark_baseline.json; the script exits with status 1 on a regression.
+
+Examples:
+    python run_benchmark.py                 # n_sentences=10, n_overlap=2, sequential, recorded latency
+    python run_benchmark.py 12 2 4 0.1      # 4 concurrent chunks, ten times faster than recorded
+    python run_benchmark.py 12 2 4 0.1 save # Store this run as the new baseline
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+transcript_path = r"C:\LocalFiles\surveytool\data\recordings\transcripts\recording_20250719_2342.txt"
+survey_path = r"C:\LocalFiles\surveytool\test_files\survey_2_evalution.xlsx"
+
+baseline_path = "evaluation/benchmark_baseline.json"
+results_path = "evaluation/benchmark_results.jsonl"
+
+# Allowed change against the baseline before a metric counts as a regression
+REGRESSION_THRESHOLDS = {
+    "wall_seconds": 0.10,   # 10% slower
+    "calls": 0.0,           # Any extra AI call
+    "total_tokens": 0.02,   # 2% more tokens
+    "accuracy": -0.02,      # 2 points less accurate
+}
+
+
+def _free_port():
+    """Return a TCP port that is free right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_with_baseline(result, baseline):
+    """
+    Compare benchmark metrics with a baseline run.
+    
+    Args:
+        result (dict): Metrics of this run
+        baseline (dict): Metrics of the baseline run
+    
+    Returns:
+        list: Names of the metrics that regressed
+    """
+    regressions = []
+    print(f"\n{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}")
+    for metric, threshold in REGRESSION_THRESHOLDS.items():
+        old, new = baseline.get(metric), result.get(metric)
+        if old is None or new is None:
+            print(f"{metric:<16}{str(old):>12}{str(new):>12}{'':>10}")
+            continue
+        if metric == "accuracy":
+            change = new - old
+            regressed = change < threshold
+            change_text = f"{change:+.2f}"
+        else:
+            change = (new - old) / old if old else (1.0 if new else 0.0)
+            regressed = change > threshold
+            change_text = f"{change:+.1%}"
+        print(f"{metric:<16}{old:>12}{new:>12}{change_text:>10}{'  ❌' if regressed else ''}")
+        if regressed:
+            regressions.append(metric)
+    return regressions
+
+
+def run_benchmark(n_sentences=10, n_overlap=2, max_concurrent=1, speed=1.0, save_baseline=False):
+    """
+    Run the evaluation end to end against the mock API and compare it with the baseline.
+    
+    Args:
+        n_sentences: Number of sentences per chunk
+        n_overlap: Number of overlapping sentences between chunks
+        max_concurrent: Number of chunks sent to the AI at the same time
+        speed: Factor applied to the recorded latencies
+        save_baseline: Store this run as the baseline for its configuration
+    
+    Returns:
+        list: Names of the metrics that regressed against the baseline
+    """
+    # app.config only builds its clients without an API key when SURVEY_API_BASE_URL is set,
+    # so the port is chosen before importing anything from the app
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}/v1"
+    os.environ["SURVEY_API_BASE_URL"] = base_url
+    import app.config
+    from mock_api_server import start_mock_server
+    from run_evaluation import run_evaluation
+
+    server = start_mock_server(port, speed)
+    # The app modules share the sync client and build async clients from app.config,
+    # so this also covers an app imported earlier
+    app.config.client.base_url = base_url
+    app.config.api_base_url = base_url
+    # Every chunk has to reach the mock server; it replays the cache itself
+    app.config.llm_cache_enabled = False
+
+    configuration = f"S{n_sentences}_O{n_overlap}_C{max_concurrent}_x{speed}"
+    log_dir = os.path.join("evaluation", "benchmarks", f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{configuration}")
+    os.makedirs(log_dir, exist_ok=True)
+    print(f"🚀 Benchmarking {configuration} against the mock API on port {port}")
+
+    start = time.perf_counter()
+    with open(os.path.join(log_dir, "run.log"), "w", encoding="utf-8") as log_file, redirect_stdout(log_file):
+        row = run_evaluation(transcript_path, survey_path, n_sentences, n_overlap, max_concurrent,
+                             session_id=f"benchmark_{configuration}", log_dir=log_dir)
+    wall_seconds = time.perf_counter() - start
+    stats = server.snapshot()
+    server.shutdown()
+    if row is None:
+        print(f"❌ Evaluation failed, see {log_dir}/run.log")
+        return ["failed"]
+
+    result = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "configuration": configuration,
+        "wall_seconds": round(wall_seconds, 2),
+        "calls": stats["chat_calls"],
+        "replayed_calls": stats["replayed"],
+        "missing_calls": stats["missing"],
+        "total_tokens": stats["total_tokens"],
+        "simulated_seconds": round(stats["simulated_seconds"], 2),
+        "total_chunks": row.get("total_chunks"),
+        "accuracy": row.get("Accuracy")
+    }
+    with open(results_path, "a") as f:
+        f.write(json.dumps(result) + "\n")
+    print(f"✅ {result['calls']} calls ({result['missing_calls']} not recorded), {result['total_tokens']} tokens, "
+          f"accuracy {result['accuracy']}, {result['wall_seconds']}s wall time")
+    if result["missing_calls"]:
+        print("⚠️  Some prompts were never recorded and got empty answers; record them with a live run first")
+
+    baselines = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r") as f:
+            baselines = json.load(f)
+    regressions = []
+    if configuration in baselines:
+        regressions = compare_with_baseline(result, baselines[configuration])
+        print("\n❌ Regressions: " + ", ".join(regressions) if regressions else "\n✅ No regressions against the baseline")
+    else:
+        print(f"\nℹ️ No baseline for {configuration} yet")
+
+    if save_baseline:
+        baselines[configuration] = result
+        with open(baseline_path, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"💾 Saved as baseline in {baseline_path}")
+    return regressions
+
+if __name__ == "__main__":
+    n_sentences = int(sys.argv[1]) if len(sys.argv) >= 2 else 10
+    n_overlap = int(sys.argv[2]) if len(sys.argv) >= 3 else 2
+    max_concurrent = int(sys.argv[3]) if len(sys.argv) >= 4 else 1
+    speed = float(sys.argv[4]) if len(sys.argv) >= 5 else 1.0
+    save_baseline = len(sys.argv) >= 6 and sys.argv[5] == "save"
+    sys.exit(1 if run_benchmark(n_sentences, n_overlap, max_concurrent, speed, save_baseline) else 0)
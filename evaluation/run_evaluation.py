@@ -1,32 +1,33 @@
 #!/usr/bin/env python3
 """
 Standalone evaluation script that processes a transcript without the Streamlit UI.
-Usage: python run_evaluation.py [n_sentences] [n_overlap] [survey_path]
+Usage: python run_evaluation.py [n_sentences] [n_overlap] [survey_path] [max_concurrent]
 
 Examples:
     python run_evaluation.py                    # Uses defaults: n_sentences=10, n_overlap=2
     python run_evaluation.py 15                 # Uses n_sentences=15, n_overlap=2
     python run_evaluation.py 15 3               # Uses n_sentences=15, n_overlap=3
     python run_evaluation.py 15 3 "C:\\path\\to\\survey.xlsx"   # Uses custom survey file
+    python run_evaluation.py 15 3 "C:\\path\\to\\survey.xlsx" 4 # Sends up to 4 chunks concurrently
 """
 
 import sys
 import os
 import json
 import shutil
-from pathlib import Path
 
 # Add the app directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import the modules but we'll override their config values
 import app.config
-from app.survey import process_survey_excel
-from app.audio import chunk_transcription_by_sentences
-from app.main_workflow import prepare_survey, process_single_chunk
-from app.evaluation import evaluate_ai_answers, summarize_all_chunks
+from app.audio import iter_transcript_chunks, transcript_units
+from app.main_workflow import prepare_survey, process_single_chunk, process_chunks_concurrently, has_held_chunk, flush_held_chunk
+from app.evaluation import evaluate_ai_answers, summarize_all_chunks, backfill_total_chunks
+from app.answer import reset_answers
+from app.answer_store import get_answer_store
 
-def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2):
+def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2, max_concurrent=1, session_id="evaluation", log_dir=None):
     """
     Run the complete evaluation pipeline on a transcript.
     
@@ -35,16 +36,28 @@ def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2):
         survey_path: Full path to the survey Excel file
         n_sentences: Number of sentences per chunk
         n_overlap: Number of overlapping sentences between chunks
+        max_concurrent: Number of chunks sent to the AI at the same time (1 = sequential)
+        session_id: Answer store namespace for this run
+        log_dir: Directory for this run's chunk logs and results (default: config evaluation_log_dir)
+    
+    Returns:
+        dict: The run's row in evaluation_results.jsonl, or None if the run failed
     """
     # Override the config values for this run
     app.config.n_sentences = n_sentences
     app.config.n_overlap = n_overlap
+    if log_dir is not None:
+        app.config.evaluation_log_dir = log_dir
+    log_dir = app.config.evaluation_log_dir
+    chunk_log_path = os.path.join(log_dir, "log_chunks.jsonl")
+    results_path = os.path.join(log_dir, "evaluation_results.jsonl")
     
     print(f"🚀 Starting evaluation with parameters:")
     print(f"   - Transcript: {transcript_path}")
     print(f"   - Survey: {survey_path}")
     print(f"   - Sentences per chunk: {n_sentences}")
     print(f"   - Overlap sentences: {n_overlap}")
+    print(f"   - Concurrent chunks: {max_concurrent}")
     print()
     
     # Copy survey file to data/surveys directory if it's not already there
@@ -77,36 +90,67 @@ def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2):
         return
     
     # Step 3: Chunk the transcript
-    print(f"\n✂️  Step 3: Chunking transcript (n_sentences={n_sentences}, n_overlap={n_overlap})...")
-    chunks = chunk_transcription_by_sentences(transcript, n_sentences, n_overlap)
-    print(f"✅ Created {len(chunks)} chunks")
+    if app.config.chunking_mode == "tokens":
+        print(f"\n✂️  Step 3: Chunking transcript (token_budget={app.config.chunk_token_budget}, overlap_tokens={app.config.chunk_overlap_tokens})...")
+    else:
+        print(f"\n✂️  Step 3: Chunking transcript (n_sentences={n_sentences}, n_overlap={n_overlap})...")
+    chunk_iter = iter_transcript_chunks([transcript], session_id, transcript_units(transcript))
+    adaptive = app.config.adaptive_chunking and max_concurrent == 1
+    if adaptive:
+        # Each chunk is only cut once the previous one was processed and measured
+        chunks = []
+        print("✅ Chunks are sized while processing (adaptive chunking)")
+    else:
+        chunks = list(chunk_iter)
+        print(f"✅ Created {len(chunks)} chunks")
     
     # Step 4: Clear previous files
     print("\n🗑️  Clearing previous evaluation files...")
-    if os.path.exists("data/answers.json"):
-        os.remove("data/answers.json")
-        print("   - Removed data/answers.json")
-    if os.path.exists("evaluation/log_chunks.jsonl"):
-        os.remove("evaluation/log_chunks.jsonl") 
-        print("   - Removed evaluation/log_chunks.jsonl")
+    reset_answers(session_id)
+    print(f"   - Cleared stored answers of session '{session_id}'")
+    if os.path.exists(chunk_log_path):
+        os.remove(chunk_log_path) 
+        print(f"   - Removed {chunk_log_path}")
     
     # Step 5: Process each chunk
     print("\n🤖 Step 4: Processing chunks through AI...")
-    for i, chunk in enumerate(chunks):
-        print(f"\n   Processing chunk {i+1}/{len(chunks)}...")
-        df = process_single_chunk(
-            chunk_text=chunk,
-            chunk_number=i + 1,
-            total_chunks=len(chunks),
-            df=df,
-            survey_data=survey_data
-        )
-        print(f"   ✅ Chunk {i+1} completed")
+    if max_concurrent > 1:
+        df = process_chunks_concurrently(chunks, df, survey_data, max_concurrent, session_id=session_id)
+        print(f"   ✅ {len(chunks)} chunks completed")
+    else:
+        for i, chunk in enumerate(chunk_iter if adaptive else chunks):
+            if adaptive:
+                chunks.append(chunk)
+            total_chunks = "?" if adaptive else len(chunks)
+            print(f"\n   Processing chunk {i+1}/{total_chunks}...")
+            df = process_single_chunk(
+                chunk_text=chunk,
+                chunk_number=i + 1,
+                total_chunks=total_chunks,
+                df=df,
+                survey_data=survey_data,
+                session_id=session_id
+            )
+            print(f"   ✅ Chunk {i+1} completed")
+
+    total_chunks = len(chunks)
+    if chunks and has_held_chunk(session_id):
+        # Text the relevance gate held back from the last chunks while the total was unknown,
+        # sent and logged as one more chunk
+        total_chunks += 1
+        df = flush_held_chunk(total_chunks, "?" if adaptive else total_chunks, df, survey_data, session_id=session_id)
+    
+    if adaptive:
+        # Chunks were logged before the total was known
+        backfill_total_chunks(session_id, total_chunks)
+    
+    # Persist the final answers
+    get_answer_store(session_id).compact()
     
     # Step 6: Summarize chunks performance
     print("\n📊 Step 5: Summarizing chunk performance...")
     try:
-        summarize_all_chunks(n_sentences, n_overlap, len(chunks))
+        summarize_all_chunks(n_sentences, n_overlap, total_chunks, session_id)
         print("✅ Chunk performance summarized")
     except Exception as e:
         print(f"⚠️  Warning: Failed to summarize chunk performance: {e}")
@@ -114,13 +158,14 @@ def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2):
     
     # Step 7: Evaluate AI answers
     print("\n🎯 Step 6: Evaluating AI answers...")
-    evaluate_ai_answers(n_sentences, n_overlap)
+    evaluate_ai_answers(n_sentences, n_overlap, session_id)
     print("✅ Evaluation completed")
     
     # Step 8: Display results
     print("\n📈 Results:")
-    if os.path.exists("evaluation/evaluation_results.jsonl"):
-        with open("evaluation/evaluation_results.jsonl", "r") as f:
+    last_result = None
+    if os.path.exists(results_path):
+        with open(results_path, "r") as f:
             # Get the last line (most recent result)
             lines = f.readlines()
             if lines:
@@ -132,7 +177,8 @@ def run_evaluation(transcript_path, survey_path, n_sentences=10, n_overlap=2):
                 print(f"   - RTT trimmed mean: {last_result.get('rtt_trimmed_mean', 'N/A')}s")
                 print(f"   - Total retries: {last_result.get('total_retries', 'N/A')}")
     
-    print("\n✅ Evaluation complete! Check 'evaluation/evaluation_results.jsonl' for full results.")
+    print(f"\n✅ Evaluation complete! Check '{results_path}' for full results.")
+    return last_result
 
 def main():
     # Default values
@@ -153,8 +199,13 @@ def main():
     if len(sys.argv) >= 4:
         survey_path = sys.argv[3]
     
+    if len(sys.argv) >= 5:
+        max_concurrent = int(sys.argv[4])
+    else:
+        max_concurrent = 1  # Default: sequential
+    
     # Run the evaluation
-    run_evaluation(transcript_path, survey_path, n_sentences, n_overlap)
+    run_evaluation(transcript_path, survey_path, n_sentences, n_overlap, max_concurrent)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks of the local (non-API) hot paths on synthetic surveys and transcripts.
+Usage: python run_microbenchmarks.py [scale] [repeat] [save]
+
+Surveys of 25 to 5,000 questions and transcripts of 10 minutes to 3 hours are generated
+with a fixed seed, so every run measures the same work. Each function is timed at every
+size; the scaling exponent between the two largest sizes (1.0 = linear) catches
+superlinear behaviour, and every size is compared with the stored baseline in
+evaluation/microbenchmark_baseline.json. Results are appended with the git commit to
+evaluation/microbenchmark_results.jsonl; the script exits with status 1 on a regression.
+
+Examples:
+    python run_microbenchmarks.py              # Full scale, best of 5
+    python run_microbenchmarks.py quick        # Small sizes only, for a fast check
+    python run_microbenchmarks.py full 5 save  # Store this run as the new baseline
+"""
+
+import glob
+import itertools
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import timeit
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+
+import pandas as pd
+
+# Add the app directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Nothing here calls the API, but app.config builds its clients at import time and needs
+# an API key or a base URL; a local address that is never contacted avoids needing a key
+os.environ.setdefault("SURVEY_API_BASE_URL", "http://127.0.0.1:9/v1")
+
+import app.survey
+from app.audio import chunk_transcription_by_sentences
+from app.survey import process_survey_excel, format_survey_questions, hash_survey_file
+from app.main_workflow import build_chunk_prompt
+from app.answer import update_answers_file, update_answers_dataframe, reset_answers
+from ui.survey_app import (display_question_and_answer, extract_question_object, extract_answer_data,
+                           calculate_progress_data, create_excel_download)
+
+baseline_path = "evaluation/microbenchmark_baseline.json"
+results_path = "evaluation/microbenchmark_results.jsonl"
+
+# Sizes per scale: number of survey questions, and transcript length in minutes
+SCALES = {
+    "quick": {"questions": [25, 250], "minutes": [10, 30]},
+    "full": {"questions": [25, 250, 1000, 5000], "minutes": [10, 60, 180]},
+}
+# Largest scaling exponent between the two largest sizes (1.0 = linear)
+MAX_SCALING_EXPONENT = 1.3
+# Allowed slowdown against the baseline at any size
+REGRESSION_THRESHOLD = 0.25
+# Spoken words per minute in the synthetic transcripts
+WORDS_PER_MINUTE = 150
+# Answers in one chunk's update
+ANSWERS_PER_CHUNK = 20
+
+FIELDS = ["Household", "Housing", "Income", "Employment", "Health", "Education", "Transport", "Water", "Energy", "Food"]
+OPTIONS = ["Yes; No; Don't know", "Never; Rarely; Sometimes; Often; Always", "Owner; Tenant; Other"]
+WORDS = ("the house family work water school children money market field road rain harvest clinic "
+         "month year week price rent land cattle bus town village neighbour loan savings doctor "
+         "electricity cooking kitchen garden well pump shop teacher wages job season").split()
+
+
+# === Synthetic data ===
+def make_survey(n_questions, excel_name):
+    """Write a synthetic survey workbook to data/surveys/<excel_name>.xlsx."""
+    rng = random.Random(n_questions)
+    rows = []
+    for number in range(1, n_questions + 1):
+        kind = number % 3
+        rows.append({
+            "QuestionID": number,
+            "Field": FIELDS[number % len(FIELDS)],
+            "Question": "How often does the " + " ".join(rng.choices(WORDS, k=rng.randint(5, 14))) + "?",
+            "Type": ["Text", "Single choice", "Multiple choice"][kind],
+            "Options": None if kind == 0 else OPTIONS[number % len(OPTIONS)]
+        })
+    os.makedirs("data/surveys", exist_ok=True)
+    pd.DataFrame(rows).to_excel(f"data/surveys/{excel_name}.xlsx", index=False)
+
+
+def make_transcript(minutes):
+    """Build a synthetic interview transcript of about the given length."""
+    rng = random.Random(minutes)
+    sentences = []
+    words = 0
+    while words < minutes * WORDS_PER_MINUTE:
+        length = rng.randint(4, 24)
+        words += length
+        sentence = " ".join(rng.choices(WORDS, k=length)).capitalize()
+        sentences.append(sentence + rng.choice([".", ".", ".", "?", "!"]))
+    return " ".join(sentences)
+
+
+def make_answers(survey_data, certainty_offset=0):
+    """Build one valid AI answer per question, cycling the certainty."""
+    certainties = ["high", "medium", "low"]
+    answers = []
+    for number, question in enumerate(survey_data):
+        answers.append({
+            "question_id": question["id"],
+            "answer": [question["options"][0]] if question["type"] != "text" else "Twice a week",
+            "certainty": certainties[(number + certainty_offset) % 3],
+            "text field": "Mentioned near the start"
+        })
+    return answers
+
+
+def _clear_compiled_survey(excel_name):
+    """Drop the in-memory and pickled compiled survey so the next load parses the workbook."""
+    content_hash = hash_survey_file(f"data/surveys/{excel_name}.xlsx")
+    app.survey._compiled_by_hash.pop(content_hash, None)
+    for path in glob.glob(f"{app.survey.COMPILED_SURVEY_DIR}/{content_hash}.*"):
+        os.remove(path)
+
+
+# === Timing ===
+def time_call(func, repeat):
+    """
+    Time a call the way timeit does: enough loops per sample, best of several samples.
+    
+    Args:
+        func (callable): Function to time, called without arguments
+        repeat (int): Number of samples
+    
+    Returns:
+        float: Seconds per call of the fastest sample
+    """
+    timer = timeit.Timer(func)
+    # The functions under test print progress; keep that out of the report
+    with redirect_stdout(StringIO()):
+        number, _ = timer.autorange()
+        samples = timer.repeat(repeat, number)
+    return min(samples) / number
+
+
+def scaling_exponent(timings):
+    """
+    Scaling exponent between the two largest sizes: 1.0 is linear, 2.0 quadratic.
+    
+    Args:
+        timings (dict): Seconds per call keyed by size
+    
+    Returns:
+        float: Exponent, or None with fewer than two sizes
+    """
+    sizes = sorted(timings)
+    if len(sizes) < 2 or not timings[sizes[-2]] or not timings[sizes[-1]]:
+        return None
+    return math.log(timings[sizes[-1]] / timings[sizes[-2]]) / math.log(sizes[-1] / sizes[-2])
+
+
+def _git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# === Benchmarks ===
+def benchmark_transcript(minutes, repeat):
+    """Time the transcript-side functions on a transcript of the given length."""
+    transcript = make_transcript(minutes)
+    return {
+        "chunk_transcription_by_sentences": time_call(lambda: chunk_transcription_by_sentences(transcript, 12, 2), repeat)
+    }
+
+
+def benchmark_survey(n_questions, repeat):
+    """Time the survey-side functions on a survey with the given number of questions."""
+    excel_name = f"microbenchmark_{n_questions}"
+    session_id = f"microbenchmark_{n_questions}"
+    make_survey(n_questions, excel_name)
+    timings = {}
+    try:
+        def parse_cold():
+            _clear_compiled_survey(excel_name)
+            return process_survey_excel(excel_name)
+
+        timings["process_survey_excel (cold)"] = time_call(parse_cold, repeat)
+        timings["process_survey_excel (cached)"] = time_call(lambda: process_survey_excel(excel_name), repeat)
+        with redirect_stdout(StringIO()):
+            survey_data, df = process_survey_excel(excel_name)
+
+        timings["format_survey_questions"] = time_call(lambda: format_survey_questions(survey_data), repeat)
+
+        # Half of the survey answered, as in the middle of an interview
+        previous_answers = {
+            answer["question_id"]: {"answer": answer["answer"], "certainty": answer["certainty"],
+                                    "text field": answer["text field"], "source": "ai",
+                                    "last_updated": "2025-01-01 00:00:00"}
+            for answer in make_answers(survey_data[::2])
+        }
+        chunk_text = make_transcript(1)[:1500]
+        timings["build_chunk_prompt"] = time_call(lambda: build_chunk_prompt(chunk_text, survey_data, previous_answers), repeat)
+
+        # One chunk's answers per call; alternating certainties make every call write
+        with redirect_stdout(StringIO()):
+            reset_answers(session_id)
+            update_answers_file(make_answers(survey_data[::2]), "ai", session_id)
+        chunk_questions = survey_data[:ANSWERS_PER_CHUNK]
+        batches = itertools.cycle([make_answers(chunk_questions, 0), make_answers(chunk_questions, 1)])
+        timings["update_answers_file"] = time_call(lambda: update_answers_file(next(batches), "ai", session_id), repeat)
+        timings["update_answers_dataframe"] = time_call(lambda: update_answers_dataframe(df, next(batches), "ai"), repeat)
+
+        df = update_answers_dataframe(df, make_answers(survey_data[::2]), "ai")
+        timings["calculate_progress_data"] = time_call(lambda: calculate_progress_data(df), repeat)
+
+        def render_all():
+            # Every question of the survey, as on a full rerun without the HTML cache
+            for idx, row in df.iterrows():
+                container_class = f"{row['certainty']}-certainty" if pd.notna(row['certainty']) else 'unanswered'
+                display_question_and_answer(extract_question_object(idx, row), extract_answer_data(row), container_class)
+
+        timings["display_question_and_answer"] = time_call(render_all, repeat)
+        timings["create_excel_download"] = time_call(lambda: create_excel_download(df, excel_name), repeat)
+    finally:
+        with redirect_stdout(StringIO()):
+            reset_answers(session_id)
+        _clear_compiled_survey(excel_name)
+        for suffix in (".xlsx", ".json"):
+            if os.path.exists(f"data/surveys/{excel_name}{suffix}"):
+                os.remove(f"data/surveys/{excel_name}{suffix}")
+    return timings
+
+
+def run_microbenchmarks(scale="full", repeat=5, save_baseline=False):
+    """
+    Run every microbenchmark at every size of the scale and check it for regressions.
+    
+    Args:
+        scale (str): "quick" or "full"
+        repeat (int): Samples per measurement (the fastest one is kept)
+        save_baseline (bool): Store this run as the baseline
+    
+    Returns:
+        list: Descriptions of the regressions found
+    """
+    sizes = SCALES[scale]
+    results = {}  # benchmark -> {"unit": ..., "seconds": {size: seconds}}
+    print(f"🚀 Microbenchmarks ({scale}): {sizes['questions']} questions, {sizes['minutes']} minute transcripts")
+    for minutes in sizes["minutes"]:
+        print(f"⏱️ Transcript of {minutes} minutes...")
+        for name, seconds in benchmark_transcript(minutes, repeat).items():
+            results.setdefault(name, {"unit": "minutes", "seconds": {}})["seconds"][minutes] = seconds
+    for n_questions in sizes["questions"]:
+        print(f"⏱️ Survey of {n_questions} questions...")
+        for name, seconds in benchmark_survey(n_questions, repeat).items():
+            results.setdefault(name, {"unit": "questions", "seconds": {}})["seconds"][n_questions] = seconds
+
+    baselines = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, "r") as f:
+            baselines = json.load(f)
+    baseline = baselines.get(scale, {}).get("results", {})
+
+    regressions = []
+    print(f"\n{'benchmark':<34}{'size':>7}{'ms/call':>11}{'baseline':>11}{'change':>9}")
+    for name, result in results.items():
+        for size, seconds in result["seconds"].items():
+            old = baseline.get(name, {}).get("seconds", {}).get(str(size))
+            change_text = ""
+            flag = ""
+            if old:
+                change = (seconds - old) / old
+                change_text = f"{change:+.0%}"
+                if change > REGRESSION_THRESHOLD:
+                    regressions.append(f"{name} at {size} {result['unit']} is {change:.0%} slower")
+                    flag = "  ❌"
+            old_text = f"{old * 1000:.3f}" if old else "-"
+            print(f"{name:<34}{size:>7}{seconds * 1000:>11.3f}{old_text:>11}{change_text:>9}{flag}")
+        exponent = scaling_exponent(result["seconds"])
+        result["scaling_exponent"] = round(exponent, 2) if exponent is not None else None
+        if exponent is not None:
+            superlinear = exponent > MAX_SCALING_EXPONENT
+            print(f"{'':<34}{'scaling exponent':>18} {exponent:.2f}{'  ❌ superlinear' if superlinear else ''}")
+            if superlinear:
+                regressions.append(f"{name} scales with exponent {exponent:.2f} in {result['unit']}")
+
+    row = {
+        "timestamp": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "scale": scale,
+        "repeat": repeat,
+        "results": {name: {"unit": result["unit"], "scaling_exponent": result["scaling_exponent"],
+                           "seconds": {str(size): round(seconds, 6) for size, seconds in result["seconds"].items()}}
+                    for name, result in results.items()}
+    }
+    with open(results_path, "a") as f:
+        f.write(json.dumps(row) + "\n")
+
+    if regressions:
+        print("\n❌ Regressions:\n  " + "\n  ".join(regressions))
+    elif baseline:
+        print(f"\n✅ No regressions against the baseline from commit {baselines[scale].get('commit')}")
+    else:
+        print(f"\nℹ️ No baseline for the {scale} scale yet")
+
+    if save_baseline:
+        baselines[scale] = row
+        with open(baseline_path, "w") as f:
+            json.dump(baselines, f, indent=2)
+        print(f"💾 Saved as baseline in {baseline_path}")
+    return regressions
+
+if __name__ == "__main__":
+    scale = sys.argv[1] if len(sys.argv) >= 2 else "full"
+    repeat = int(sys.argv[2]) if len(sys.argv) >= 3 else 5
+    save_baseline = len(sys.argv) >= 4 and sys.argv[3] == "save"
+    sys.exit(1 if run_microbenchmarks(scale, repeat, save_baseline) else 0)
@@ -1,13 +1,15 @@
-import json
-import os
+import time
+import uuid
 from datetime import datetime
-import pandas as pd
 import streamlit as st
-from ui.survey_app import save_uploaded_survey, save_uploaded_audio, divide_and_sort_questions, extract_question_object, extract_answer_data, display_edit_window, create_excel_download, calculate_progress_data, create_progress_bar
-from app.main_workflow import prepare_survey, process_single_chunk
-from app.audio import process_audio_file, chunk_transcription_by_sentences
-from app.config import n_sentences, n_overlap
-from app.evaluation import evaluate_ai_answers, log_chunk, summarize_all_chunks
+from ui.survey_app import save_uploaded_survey, save_uploaded_audio, extract_question_object, extract_answer_data, display_edit_window, load_css, render_question_html, paginate_questions, available_export_formats, export_survey, EXPORT_FORMATS, calculate_progress_data, create_progress_bar
+from app.main_workflow import prepare_survey, reset_chunk_state
+from app.audio import stream_audio_transcript, iter_transcript_chunks
+from app.answer import reset_answers
+from app.config import questions_per_page
+from app.evaluation import log_render
+from app.survey_state import get_survey_state
+from app.jobs import ACTIVE_STATUSES, submit_chunk_job, get_job, cancel_job, forget_job, job_dataframe
 
 
 
@@ -17,9 +19,41 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load custom CSS from a separate file
-with open('ui/styles.css') as f:
-    st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    """
+    Poll a background job and show its progress without rerunning the whole page.
+    
+    Args:
+        job_id (str): Job ID from submit_chunk_job
+    """
+    job = get_job(job_id)
+    if job is None:
+        return
+    if job["status"] not in ACTIVE_STATUSES:
+        # Rerun the whole page once so the survey shows the final answers
+        st.rerun(scope="app")
+
+    df = job_dataframe(job_id)
+    st.markdown(create_progress_bar(calculate_progress_data(df)), unsafe_allow_html=True)
+    completed, total = job["completed_chunks"], job["total_chunks"]
+    if total is None:
+        # The number of chunks is only known once transcription has finished
+        st.info(f"🎙️ Transcribing audio and processing chunk {completed + 1}...")
+    else:
+        st.progress(completed / total if total else 1.0, text=f"🔄 Processing chunk {min(completed + 1, total)}/{total}...")
+    if st.button("⏹️ Stop processing", key=f"cancel_{job_id}"):
+        cancel_job(job_id)
+        st.info("Stopping after the current chunk...")
+
+    # Questions answered by the latest chunk
+    if job["changed_ids"]:
+        st.write(f"✅ Chunk {completed}/{total or '?'} updated {len(job['changed_ids'])} answers:")
+        for idx in job["changed_ids"]:
+            row = df.loc[idx]
+            container_class = "human-edited" if row['source'] == "human" else f"{row['certainty']}-certainty"
+            st.markdown(render_question_html(idx, row, container_class), unsafe_allow_html=True)
 
 
 def main():
@@ -31,79 +65,61 @@ def main():
         st.cache_resource.clear()
         st.rerun()
 
-    # Load custom CSS
-    with open('ui/styles.css') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
+    # Load custom CSS (read from disk once per server process)
+    st.markdown(f'<style>{load_css()}</style>', unsafe_allow_html=True)
+
+    # Reattach to a background job after a browser refresh (the job ID is kept in the URL)
+    if "job_id" not in st.session_state and st.query_params.get("job"):
+        restored_job = get_job(st.query_params["job"])
+        if restored_job is not None:
+            st.session_state["job_id"] = restored_job["id"]
+            st.session_state["session_id"] = restored_job["session_id"]
+            st.session_state["survey_data"] = restored_job["survey_data"]
+            st.session_state["survey_processed"] = True
+            st.session_state["current_survey_name"] = restored_job["metadata"].get("survey_name", "survey")
+            st.session_state["original_audio_id"] = restored_job["metadata"].get("audio_id")
+        else:
+            del st.query_params["job"]
 
     # Initialize session state
+    if "session_id" not in st.session_state:
+        # Scopes this interview's answers in the shared answer store
+        st.session_state["session_id"] = uuid.uuid4().hex
     if "survey_processed" not in st.session_state:
         st.session_state["survey_processed"] = False
     if "processed_audio_files" not in st.session_state:
         st.session_state["processed_audio_files"] = set()
     if "list_human_edit" not in st.session_state:
         st.session_state["list_human_edit"] = []
-    # Chunked processing session state
-    if "chunked_processing" not in st.session_state:
-        st.session_state["chunked_processing"] = False
-    if "current_chunks" not in st.session_state:
-        st.session_state["current_chunks"] = []
-    if "current_chunk_index" not in st.session_state:
-        st.session_state["current_chunk_index"] = 0
-    if "processing_audio_name" not in st.session_state:
-        st.session_state["processing_audio_name"] = ""
-    if "processing_file_extension" not in st.session_state:
-        st.session_state["processing_file_extension"] = ""
-    if "should_auto_continue" not in st.session_state:
-        st.session_state["should_auto_continue"] = False
-        
 
-        
-    # Handle chunked processing
-    if st.session_state["chunked_processing"]:
-        chunks = st.session_state["current_chunks"]
-        current_index = st.session_state["current_chunk_index"]
-        
-        if current_index < len(chunks):
-            # Process current chunk
-            with st.spinner(f"Processing chunk {current_index + 1}/{len(chunks)}..."):
-                st.session_state["df"] = process_single_chunk(
-                    chunks[current_index],
-                    current_index + 1,
-                    len(chunks),
-                    st.session_state["df"],
-                    st.session_state["survey_data"]
-                )
-                
-            # Move to next chunk
-            st.session_state["current_chunk_index"] += 1
-            
-            # Show progress
-            st.success(f'✅ Chunk {current_index + 1}/{len(chunks)} completed!')
-            
-            # Check if more chunks to process
-            if st.session_state["current_chunk_index"] < len(chunks):
-                st.info(f"🔄 Ready to process chunk {st.session_state['current_chunk_index'] + 1}/{len(chunks)}")
+    # Handle background chunk processing
+    job = get_job(st.session_state["job_id"]) if "job_id" in st.session_state else None
+    job_active = job is not None and job["status"] in ACTIVE_STATUSES
+    if job is not None:
+        # The job owns the answers while it runs; human edits are merged in from the answer store
+        st.session_state["df"] = job_dataframe(job["id"])
+        if job_active:
+            show_job_progress(job["id"])
+        else:
+            if job["status"] == "done":
+                st.success(f'🎉 All {job["total_chunks"]} chunks processed successfully!')
+            elif job["status"] == "cancelled":
+                st.warning(f'⏹️ Processing cancelled after {job["completed_chunks"]}/{job["total_chunks"] or "?"} chunks.')
             else:
-                # All chunks processed
-                st.success(f'🎉 All {len(chunks)} chunks processed successfully!')
-                st.session_state["chunked_processing"] = False
-                st.session_state["should_auto_continue"] = False  # Explicitly stop auto-continue
-                summarize_all_chunks(n_sentences, n_overlap, len(chunks))
-                evaluate_ai_answers(n_sentences, n_overlap)
-                # Mark this audio file as processed
-                if st.session_state.get('original_audio_id'):
-                    st.session_state["processed_audio_files"].add(st.session_state['original_audio_id'])
-        
-    # Auto-continue processing marker (will be handled at the bottom after showing survey)
-    chunks_len = len(st.session_state.get("current_chunks", []))
-    current_idx = st.session_state.get("current_chunk_index", 0)
-    is_chunking = st.session_state.get("chunked_processing", False)
-    
-    st.session_state["should_auto_continue"] = (
-        is_chunking and current_idx < chunks_len
-    )
-    
-
+                st.error(f'Processing failed: {job["error"]}')
+            # Mark this audio file as processed so it is not picked up again on the next rerun
+            if st.session_state.get('original_audio_id'):
+                st.session_state["processed_audio_files"].add(st.session_state['original_audio_id'])
+            # The final answers are in st.session_state["df"] now, the job record is no longer needed
+            forget_job(job["id"])
+            del st.session_state["job_id"]
+            if "job" in st.query_params:
+                del st.query_params["job"]
+    elif "job_id" in st.session_state:
+        # The job finished while this page was not polling and has been evicted since
+        if st.session_state.get('original_audio_id'):
+            st.session_state["processed_audio_files"].add(st.session_state['original_audio_id'])
+        del st.session_state["job_id"]
 
     # Create two columns for file uploaders
     col1, col2 = st.columns(2)
@@ -129,69 +145,73 @@ def main():
             
             # Check if we should process this audio file
             already_processed = audio_id in st.session_state["processed_audio_files"]
-            currently_processing = st.session_state["chunked_processing"]
             
-            if not already_processed and not currently_processing:
-                audio_name, file_extension = save_uploaded_audio(uploaded_audio)
+            if not already_processed and not job_active:
+                audio_name, file_extension, content_hash = save_uploaded_audio(uploaded_audio)
+                
+                # Transcription, chunking and extraction run as one pipeline in a background
+                # worker: chunk 1 is processed while later audio is still being transcribed
+                transcript_pieces = stream_audio_transcript(audio_name, file_extension, content_hash)
+                job_id = submit_chunk_job(
+                    iter_transcript_chunks(transcript_pieces, st.session_state["session_id"]),
+                    st.session_state["df"],
+                    st.session_state["survey_data"],
+                    st.session_state["session_id"],
+                    metadata={
+                        "survey_name": st.session_state.get("current_survey_name", "survey"),
+                        "audio_id": audio_id
+                    }
+                )
+                st.session_state["job_id"] = job_id
+                st.session_state["original_audio_id"] = audio_id  # Store original ID for tracking
+                st.query_params["job"] = job_id
                 
-                # Start chunked processing
-                with st.spinner("Transcribing audio and preparing chunks..."):
-                    # Transcribe audio
-                    transcript = process_audio_file(audio_name, file_extension)
-                    if transcript:
-                        
-                        # Create chunks
-                        chunks = chunk_transcription_by_sentences(transcript, n_sentences, n_overlap)
-                        
-                        # Set up session state for chunked processing
-                        st.session_state["current_chunks"] = chunks
-                        st.session_state["current_chunk_index"] = 0
-                        st.session_state["processing_audio_name"] = audio_name
-                        st.session_state["processing_file_extension"] = file_extension
-                        st.session_state["original_audio_id"] = audio_id  # Store original ID for tracking
-                        st.session_state["chunked_processing"] = True
-                        
-                        st.success(f"🎵 Audio transcribed! Created {len(chunks)} chunks. Starting processing...")
-                        st.rerun()
-                    else:
-                        st.error("Failed to transcribe audio")
-            elif audio_id in st.session_state["processed_audio_files"]:
+                st.success("🎵 Audio uploaded! Transcribing and processing chunks...")
+                st.rerun()
+            elif already_processed:
                 st.write("This audio file has already been processed.")
-            elif st.session_state["chunked_processing"]:
+            else:
                 st.info("Currently processing chunks. Please wait...")
         elif uploaded_audio and "df" not in st.session_state:
             st.error("Please upload a survey file first!")
 
     # Add a reset button
     if st.button("Reset Survey"):
-        if os.path.exists("data/answers.json"):
-            os.remove("data/answers.json")
-        for key in ["survey_processed", "processed_audio_files", "df", "survey_data", "current_survey_name", "excel_data", "list_human_edit", "chunked_processing", "current_chunks", "current_chunk_index", "processing_audio_name", "processing_file_extension", "should_auto_continue", "original_audio_id"]:
+        if "job_id" in st.session_state:
+            cancel_job(st.session_state["job_id"])
+        reset_answers(st.session_state["session_id"])
+        reset_chunk_state(st.session_state["session_id"])
+        # A cancelled job still finishes its current chunk under the old session ID; the next
+        # survey gets a new one so those answers never reach it
+        for key in ["session_id", "survey_processed", "processed_audio_files", "df", "survey_data", "current_survey_name", "list_human_edit", "job_id", "original_audio_id"]:
             if key in st.session_state:
                 del st.session_state[key]
+        if "job" in st.query_params:
+            del st.query_params["job"]
         st.rerun()
 
-    # Download Excel button (only show when data exists)
+    # Download button (only show when data exists)
     if "df" in st.session_state and not st.session_state["df"].empty:
         survey_name = st.session_state.get("current_survey_name", "survey")
-        filename = f"{survey_name}_answers.xlsx"
-        
-        # Create Excel data once per session (cached until data changes)
-        if "excel_data" not in st.session_state or st.session_state["excel_data"] is None:
-            st.session_state["excel_data"] = create_excel_download(st.session_state["df"], survey_name)
+        export_format = st.selectbox("Export format", available_export_formats(), key="export_format")
+        extension, mime = EXPORT_FORMATS[export_format]
         
-        # Single download button
+        # The file is built when the button is clicked and reused until the answers change
+        export_df = st.session_state["df"]
+        export_version = get_survey_state(export_df).version
         st.download_button(
-            label="📊 Download Excel", 
-            data=st.session_state["excel_data"],
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            label=f"📊 Download {export_format}", 
+            data=lambda: export_survey(export_df, export_format, export_version, survey_name),
+            file_name=f"{survey_name}_answers.{extension}",
+            mime=mime
         )
 
     if "df" not in st.session_state:
         st.write("No survey loaded yet. Please upload a survey file and then an audio file.")
         return
     else:
+        render_start = time.perf_counter()
+        
         # Calculate and display progress bar
         progress_data = calculate_progress_data(st.session_state["df"])
         progress_html = create_progress_bar(progress_data)
@@ -202,13 +222,15 @@ def main():
         # Create two columns for questions
         left_col, right_col = st.columns(2)
         
-        # Split and sort questions into answered and unanswered based on certainty
-        answered_questions, unanswered_questions = divide_and_sort_questions(st.session_state["df"])
+        # Answered and unanswered question IDs, kept sorted by the survey state as answers arrive
+        df = st.session_state["df"]
+        survey_state = get_survey_state(df)
+        rendered = 0
         
         # Display answered questions
         with left_col:
-            st.subheader("Answered:")
-            for idx, row in answered_questions.iterrows():
+            st.subheader(f"Answered ({len(survey_state.answered)}):")
+            for idx, row in df.loc[paginate_questions(survey_state.answered, "answered", questions_per_page)].iterrows():
                 question = extract_question_object(idx, row)
                 answer_data = extract_answer_data(row)
                 
@@ -218,28 +240,29 @@ def main():
                 else:
                     container_class = f"{row['certainty']}-certainty"
                 
-                display_edit_window(question, answer_data, container_class, idx)
+                display_edit_window(question, answer_data, container_class, idx, render_question_html(idx, row, container_class))
+                rendered += 1
 
         # Display unanswered questions
         with right_col:
-            st.subheader("Unanswered:")
-            for idx, row in unanswered_questions.iterrows():
+            st.subheader(f"Unanswered ({len(survey_state.unanswered)}):")
+            for idx, row in df.loc[paginate_questions(survey_state.unanswered, "unanswered", questions_per_page)].iterrows():
                 question = extract_question_object(idx, row)
                 answer_data = extract_answer_data(row)
 
-                display_edit_window(question, answer_data, 'unanswered', idx)
+                display_edit_window(question, answer_data, 'unanswered', idx, render_question_html(idx, row, 'unanswered'))
+                rendered += 1
+        
+        # Render time of the survey section, to check it stays flat as surveys grow
+        render_ms = (time.perf_counter() - render_start) * 1000
+        st.caption(f"⏱️ Rendered {rendered} of {len(st.session_state['df'])} questions in {render_ms:.0f} ms")
+        log_render({
+            "timestamp": datetime.now().isoformat(),
+            "total_questions": len(st.session_state["df"]),
+            "rendered_questions": rendered,
+            "render_ms": round(render_ms, 1)
+        })
 
-    # Handle auto-continue processing at the end (after showing survey results)
-    should_continue = st.session_state.get("should_auto_continue", False)
-    
-    if should_continue:
-        st.write("🔄 Auto-continuing to next chunk...")
-        st.session_state["should_auto_continue"] = False  # Reset flag
-        import time
-        time.sleep(2)  # Give user time to see the results
-        st.rerun()
-    else:
-        st.write("⏹️ Processing complete or stopped.")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
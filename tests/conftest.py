@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Run against the repository root, like the evaluation scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app.config builds the API clients at import; tests never reach the real API
+os.environ.setdefault("SURVEY_API_BASE_URL", "http://127.0.0.1:9/v1")
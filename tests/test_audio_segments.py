@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+import app.audio as audio
+import app.config as config
+
+
+# === plan_segments ===
+def test_short_recording_is_one_segment():
+    assert audio.plan_segments(300, [(100, 101)], max_seconds=600) == [(0.0, 300)]
+
+
+def test_cut_in_middle_of_last_silence_before_limit():
+    silences = [(200, 202), (500, 504), (700, 702)]
+    segments = audio.plan_segments(1000, silences, max_seconds=600)
+    assert segments == [(0.0, 502.0), (502.0, 1000)]
+
+
+def test_silences_in_first_quarter_are_ignored():
+    # A cut at 100s would make a very short segment, so the cut is hard at the limit
+    segments = audio.plan_segments(1000, [(99, 101)], max_seconds=600, overlap_seconds=1.0)
+    assert segments == [(0.0, 601.0), (599.0, 1000)]
+
+
+def test_segments_cover_recording_within_limit():
+    silences = [(t, t + 1) for t in range(90, 3600, 170)]
+    segments = audio.plan_segments(3600, silences, max_seconds=600, overlap_seconds=1.0)
+    assert segments[0][0] == 0.0 and segments[-1][1] == 3600
+    for (_, end), (start, _) in zip(segments, segments[1:]):
+        assert start <= end
+    assert all(end - start <= 600 + 2 for start, end in segments)
+
+
+# === remove_boundary_overlap ===
+def test_repeated_words_across_cut_are_removed():
+    previous = "We moved to the city last year, and then"
+    following = "and then, we found a flat near school."
+    assert audio.remove_boundary_overlap(previous, following) == "we found a flat near school."
+
+
+def test_text_without_overlap_is_unchanged():
+    following = "We found a flat near school."
+    assert audio.remove_boundary_overlap("It was a long year.", following) == following
+
+
+def test_single_repeated_word_is_kept():
+    # One shared word is as likely to be a coincidence as a repeat
+    assert audio.remove_boundary_overlap("I said yes", "yes of course") == "yes of course"
+
+
+# === iter_segment_transcripts against a stub endpoint ===
+SEGMENT_TEXTS = [
+    "My name is Sam and I live with my aunt",
+    "with my aunt in a small flat. I go to school",
+    "I go to school every day and work on weekends.",
+]
+
+
+class StubTranscriptionHandler(BaseHTTPRequestHandler):
+    """Answers /audio/transcriptions with the text of the uploaded segment."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        index = int(re.search(rb"SEGMENT:(\d+)", body).group(1))
+        self.server.requests.append(index)
+        time.sleep(self.server.delays.get(index, 0.0))
+        payload = json.dumps({"text": SEGMENT_TEXTS[index]}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_endpoint(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubTranscriptionHandler)
+    server.requests = []
+    server.delays = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(audio, "client", OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1"))
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """Replace the ffmpeg calls with a 1500s recording whose segments are small marker files."""
+    def cut_segment(file_path, start, end, output_path):
+        index = int(re.search(r"segment_(\d+)", output_path).group(1))
+        with open(output_path, "wb") as f:
+            f.write(f"SEGMENT:{index}".encode("utf-8"))
+
+    monkeypatch.setattr(audio, "probe_duration", lambda file_path: 1500.0)
+    monkeypatch.setattr(audio, "detect_silences", lambda *args: [(580, 584), (1150, 1152)])
+    monkeypatch.setattr(audio, "cut_segment", cut_segment)
+    monkeypatch.setattr(config, "segment_max_seconds", 600)
+    monkeypatch.setattr(config, "max_concurrent_transcriptions", 1)
+
+
+def test_segments_are_transcribed_and_stitched_in_order(stub_endpoint, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(config, "max_concurrent_transcriptions", 3)
+    # The first segment is slowest, so later segments finish first
+    stub_endpoint.delays[0] = 0.2
+    timings = []
+    pieces = list(audio.iter_segment_transcripts("recording.m4a", timings))
+
+    assert sorted(stub_endpoint.requests) == [0, 1, 2]
+    # Silence cuts share no audio, so words repeated across them were really said twice
+    assert pieces == SEGMENT_TEXTS
+    assert [timing["segment"] for timing in timings] == [1, 2, 3]
+    assert [(timing["start"], timing["end"]) for timing in timings] == [(0.0, 582.0), (582.0, 1151.0), (1151.0, 1500.0)]
+
+
+def test_words_repeated_across_hard_cuts_are_removed(stub_endpoint, fake_ffmpeg, monkeypatch):
+    monkeypatch.setattr(audio, "detect_silences", lambda *args: [])
+    monkeypatch.setattr(config, "segment_overlap_seconds", 1.0)
+    timings = []
+    pieces = list(audio.iter_segment_transcripts("recording.m4a", timings))
+
+    assert pieces == [
+        "My name is Sam and I live with my aunt",
+        "in a small flat. I go to school",
+        "every day and work on weekends.",
+    ]
+    assert [(timing["start"], timing["end"]) for timing in timings] == [(0.0, 601.0), (599.0, 1201.0), (1199.0, 1500.0)]
+
+
+def test_stopping_early_skips_remaining_segments(stub_endpoint, fake_ffmpeg):
+    # The second segment is still in flight when the consumer stops
+    stub_endpoint.delays[1] = 0.3
+    pieces = audio.iter_segment_transcripts("recording.m4a")
+    assert next(pieces) == SEGMENT_TEXTS[0]
+    pieces.close()
+    assert sorted(stub_endpoint.requests) == [0, 1]
@@ -1,10 +1,25 @@
-import json
+import math
+import threading
 from datetime import datetime
 import pandas as pd
-import os
 import streamlit as st
 from io import BytesIO
-from app.answer import update_answers_file, update_answers_dataframe
+from openpyxl import Workbook
+from app.answer import update_answers_file, apply_answers_batch
+from app.audio import save_audio_stream
+from app.survey_state import get_survey_state
+
+# Rendered question HTML keyed by (question ID, container class, question version, answer version).
+# Module state survives reruns, so unchanged questions are never re-rendered.
+_question_html_cache = {}
+QUESTION_HTML_CACHE_SIZE = 5000
+
+# === Stylesheet ===
+@st.cache_resource
+def load_css(path='ui/styles.css'):
+    """Read the stylesheet once per server process instead of on every rerun."""
+    with open(path) as f:
+        return f.read()
 
 # === Survey file uploader ===
 def save_uploaded_survey(uploaded_file):
@@ -27,7 +42,7 @@ def save_uploaded_survey(uploaded_file):
 
 # === Audio file uploader ===
 def save_uploaded_audio(uploaded_audio):
-    """Save an uploaded audio file to the data/recordings directory with a timestamped name."""
+    """Save an uploaded audio file to the data/recordings directory with a timestamped name and return its content hash."""
     if uploaded_audio is not None:
         # Get the original file extension
         original_extension = uploaded_audio.name.split('.')[-1].lower()
@@ -36,20 +51,19 @@ def save_uploaded_audio(uploaded_audio):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
         audio_name = f"recording_{timestamp}"
         
-        # Save the file with original extension
+        # Save the file with original extension, hashing the content while it streams to disk
         file_path = f'data/recordings/{audio_name}.{original_extension}'
-        with open(file_path, "wb") as f:
-            f.write(uploaded_audio.getvalue())
+        uploaded_audio.seek(0)
+        content_hash = save_audio_stream(uploaded_audio, file_path)
         
         print(f"File saved as {audio_name}.{original_extension}")
-        return audio_name, original_extension
+        return audio_name, original_extension, content_hash
 
 # === Divide and sort questions ===
 def divide_and_sort_questions(df):
     """Divide questions into answered and unanswered"""
-    answered_questions = df[df['certainty'].notna()].sort_values(by='QuestionID')
-    unanswered_questions = df[df['certainty'].isna()].sort_values(by='QuestionID')
-    return answered_questions, unanswered_questions
+    state = get_survey_state(df)
+    return df.loc[state.answered], df.loc[state.unanswered]
 
 
 # === sub-function for displaying questions ===
@@ -67,8 +81,10 @@ def extract_question_object(idx, row):
 # === sub-function for displaying answers ===
 def extract_answer_data(row):
     """Create an answer data object"""
+    # Rows from iterrows carry missing answers as NaN, which is truthy
+    answer = row['answer']
     answer_data = {
-        'answer': row['answer'],
+        'answer': None if pd.api.types.is_scalar(answer) and pd.isna(answer) else answer,
         'certainty': row['certainty'],
         'text field': row['text_field'] if pd.notna(row['text_field']) else ''
     }
@@ -130,6 +146,83 @@ def display_question_and_answer(question, answer_data, container_class):
     """
 
 
+# === Memoized question rendering ===
+def answer_version(row):
+    """
+    Build a version string that changes whenever a question's displayed answer changes.
+    
+    Args:
+        row (pd.Series): DataFrame row of the question
+    
+    Returns:
+        str: Version of the answer shown for the question
+    """
+    return "|".join(str(row[column]) for column in ('last_updated', 'source', 'certainty', 'answer', 'text_field'))
+
+
+def question_version(row):
+    """
+    Build a version string of the question itself (text, field, type and options).
+    
+    Args:
+        row (pd.Series): DataFrame row of the question
+    
+    Returns:
+        str: Version of the question text shown
+    """
+    return "|".join(str(row.get(column)) for column in ('Field', 'Question', 'Type', 'Options'))
+
+
+def render_question_html(idx, row, container_class):
+    """
+    Get the HTML of a question and its answer, rendering it only when the question or answer changed.
+    
+    Args:
+        idx: Question ID
+        row (pd.Series): DataFrame row of the question
+        container_class (str): CSS class for styling
+    
+    Returns:
+        str: HTML formatted string for displaying the question and answer
+    """
+    # Every input of the rendered HTML is part of the key, so a question ID shared by
+    # another survey or session can never return this question's HTML
+    key = (idx, container_class, question_version(row), answer_version(row))
+    html = _question_html_cache.get(key)
+    if html is None:
+        if len(_question_html_cache) >= QUESTION_HTML_CACHE_SIZE:
+            _question_html_cache.clear()
+        html = display_question_and_answer(extract_question_object(idx, row), extract_answer_data(row), container_class)
+        _question_html_cache[key] = html
+    return html
+
+
+def paginate_questions(question_ids, key, page_size):
+    """
+    Show a page selector for a list of questions and return the IDs on the selected page.
+    
+    Args:
+        question_ids (list): Ordered question IDs to page through
+        key (str): Unique key for the page selector
+        page_size (int): Number of questions per page
+    
+    Returns:
+        list: Question IDs on the selected page
+    """
+    n_pages = max(1, math.ceil(len(question_ids) / page_size))
+    if n_pages == 1:
+        return question_ids
+    
+    # The list can shrink between reruns (e.g. when questions get answered)
+    page_key = f"page_{key}"
+    if st.session_state.get(page_key, 1) > n_pages:
+        st.session_state[page_key] = n_pages
+    page = st.number_input(f"Page (1-{n_pages})", min_value=1, max_value=n_pages, step=1, key=page_key)
+    
+    start = (page - 1) * page_size
+    return question_ids[start:start + page_size]
+
+
 # === sub-function for Save changes button ===
 def save_changes(question_id, question_type):
     """
@@ -159,18 +252,14 @@ def save_changes(question_id, question_type):
         }
         
         # Update the answers file
-        update_answers_file([new_answer], "human")
+        update_answers_file([new_answer], "human", st.session_state.get("session_id"))
         
         # Add to human edit list only if not already there (keep unique)
         if question_id not in st.session_state["list_human_edit"]:
             st.session_state["list_human_edit"].append(question_id)
 
         # Update the DataFrame in session state
-        st.session_state["df"] = update_answers_dataframe(st.session_state["df"], [new_answer], "human")
-        
-        # Clear cached Excel data so it gets regenerated with new data
-        if "excel_data" in st.session_state:
-            st.session_state["excel_data"] = None
+        st.session_state["df"], _ = apply_answers_batch(st.session_state["df"], [new_answer], "human")
         
         # Collapse the expander after saving
         expander_key = f"expander_{question_id}"
@@ -182,19 +271,28 @@ def save_changes(question_id, question_type):
         st.error(f"Error saving changes: {e}")
         return False
 
-def display_edit_window(question, answer_data, container_class, qid):
+def _set_editor_open(expander_key, is_open):
+    """Open or close the edit section of a question."""
+    st.session_state[expander_key] = is_open
+
+
+def display_edit_window(question, answer_data, container_class, qid, html=None):
     """
     Display a question with expandable edit section.
     
+    The edit widgets are only built for questions being edited; a closed
+    editor costs a single button.
+    
     Args:
         question (dict): Question object with id, field, question, type, and options
         answer_data (dict): Answer object with answer, certainty, and text field
         container_class (str): CSS class for styling
         qid: Question ID for unique widget keys
+        html (str): Pre-rendered question HTML from render_question_html (default: render now)
     """
     # Display the main question using existing function
     st.markdown(
-        display_question_and_answer(question, answer_data, container_class),
+        html or display_question_and_answer(question, answer_data, container_class),
         unsafe_allow_html=True
     )
     
@@ -203,8 +301,12 @@ def display_edit_window(question, answer_data, container_class, qid):
     if expander_key not in st.session_state:
         st.session_state[expander_key] = False
     
+    if not st.session_state[expander_key]:
+        st.button("✏️ Edit Answer", key=f"edit_{qid}", on_click=_set_editor_open, args=(expander_key, True))
+        return
+    
     # Add expandable edit section
-    with st.expander("✏️ Edit Answer", expanded=st.session_state[expander_key]):
+    with st.expander("✏️ Edit Answer", expanded=True):
         
         # Show different input types based on question type
         if question['type'] == 'single choice':
@@ -254,12 +356,61 @@ def display_edit_window(question, answer_data, container_class, qid):
                 st.rerun()  # Force app to refresh and show updated data
             else:
                 st.error("Failed to save changes!")
+        st.button("✖️ Close", key=f"close_{qid}", on_click=_set_editor_open, args=(expander_key, False))
+
+# === Download functions ===
+EXPORT_FORMATS = {
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# Export files keyed by (survey state version, format); only the newest few are kept
+_export_cache = {}
+_export_cache_lock = threading.Lock()
+EXPORT_CACHE_SIZE = 8
+
+
+def available_export_formats():
+    """Return the export formats usable in this environment (Parquet needs pyarrow)."""
+    try:
+        import pyarrow  # noqa: F401
+        return list(EXPORT_FORMATS)
+    except ImportError:
+        return [name for name in EXPORT_FORMATS if name != "Parquet"]
+
+
+def _export_value(value):
+    """Convert a cell value to something every export format can store."""
+    if isinstance(value, list):
+        return "; ".join(str(item) for item in value)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def export_frame(df):
+    """
+    Prepare the survey DataFrame for export, with list answers joined like the survey options.
+    
+    Args:
+        df (pd.DataFrame): The survey DataFrame to export
+        
+    Returns:
+        pd.DataFrame: Copy of df with plain scalar values
+    """
+    export_df = df.copy()
+    export_df['answer'] = [_export_value(value) for value in export_df['answer']]
+    return export_df
+
 
-# === Download function ===
 def create_excel_download(df, survey_name="survey"):
     """
     Create an Excel file from the DataFrame for download.
     
+    Uses openpyxl's write-only mode, which streams rows to the file instead of
+    building the whole workbook in memory.
+    
     Args:
         df (pd.DataFrame): The survey DataFrame to export
         survey_name (str): Name of the survey for the filename
@@ -268,54 +419,70 @@ def create_excel_download(df, survey_name="survey"):
         bytes: Excel file data as bytes
     """
     try:
-        # Create a BytesIO buffer to hold the Excel data
-        buffer = BytesIO()
-        
-        # Create Excel writer object
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            # Write the main data
-            df.to_excel(writer, sheet_name='Survey_Results', index=True)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Survey_Results')
+        sheet.append([df.index.name] + list(df.columns))
+        for row in df.itertuples(name=None):
+            sheet.append([_export_value(value) for value in row])
         
         # Return the Excel data as bytes
-        buffer.seek(0)
+        buffer = BytesIO()
+        workbook.save(buffer)
         return buffer.getvalue()
         
     except Exception as e:
-        st.error(f"Error creating Excel file: {e}")
+        print(f"Error creating Excel file: {e}")
         return None
 
 
+def export_survey(df, export_format, version, survey_name="survey"):
+    """
+    Export the survey DataFrame, reusing the file built for the same answer version.
+    
+    Args:
+        df (pd.DataFrame): The survey DataFrame to export
+        export_format (str): "Excel", "CSV" or "Parquet"
+        version (int): Version stamp of the DataFrame's survey state
+        survey_name (str): Name of the survey for the filename
+        
+    Returns:
+        bytes: File data as bytes
+    """
+    key = (version, export_format)
+    with _export_cache_lock:
+        data = _export_cache.get(key)
+    if data is not None:
+        return data
+    
+    if export_format == "Excel":
+        data = create_excel_download(df, survey_name)
+    elif export_format == "CSV":
+        data = export_frame(df).to_csv(index=True).encode("utf-8")
+    else:
+        buffer = BytesIO()
+        export_frame(df).to_parquet(buffer, index=True)
+        data = buffer.getvalue()
+    
+    with _export_cache_lock:
+        if len(_export_cache) >= EXPORT_CACHE_SIZE:
+            _export_cache.pop(next(iter(_export_cache)))
+        _export_cache[key] = data
+    return data
+
+
 def calculate_progress_data(df):
     """
     Calculate the distribution of questions by certainty level.
     
+    Reads the incrementally maintained survey state instead of filtering the DataFrame.
+    
     Args:
         df (pd.DataFrame): The survey DataFrame
         
     Returns:
         dict: Dictionary with counts and percentages for each certainty level
     """
-    total_questions = len(df)
-    
-    # Count questions by certainty level
-    high_count = len(df[df['certainty'] == 'high'])
-    medium_count = len(df[df['certainty'] == 'medium'])
-    low_count = len(df[df['certainty'] == 'low'])
-    unanswered_count = len(df[df['certainty'].isna()])
-    
-    # Calculate percentages
-    high_pct = (high_count / total_questions) * 100 if total_questions > 0 else 0
-    medium_pct = (medium_count / total_questions) * 100 if total_questions > 0 else 0
-    low_pct = (low_count / total_questions) * 100 if total_questions > 0 else 0
-    unanswered_pct = (unanswered_count / total_questions) * 100 if total_questions > 0 else 0
-    
-    return {
-        'total': total_questions,
-        'high': {'count': high_count, 'percentage': high_pct},
-        'medium': {'count': medium_count, 'percentage': medium_pct},
-        'low': {'count': low_count, 'percentage': low_pct},
-        'unanswered': {'count': unanswered_count, 'percentage': unanswered_pct}
-    }
+    return get_survey_state(df).progress_data()
 
 
 def create_progress_bar(progress_data):